@@ -17,7 +17,7 @@ class UserAdmin(BaseUserAdmin):
 
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
-        ('Personal info', {'fields': ('first_name', 'last_name', 'role', 'balance')}), # Added balance here
+        ('Personal info', {'fields': ('first_name', 'last_name', 'role', 'balance', 'question_allowance')}), # Added balance here
         ('Role-specific info', {'fields': ('major', 'department', 'bio')}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
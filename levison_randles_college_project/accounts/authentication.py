@@ -0,0 +1,52 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+
+from .token_cache import get_token_user
+from .signed_tokens import ACCESS, TokenError, decode_token, user_from_claims
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for DRF's TokenAuthentication that resolves the token through
+    a local LRU and the shared cache before falling back to the authtoken/user join.
+    Cache entries are invalidated on logout, token deletion/rotation and changes to a
+    user's role, staff flags or active state (see accounts.signals).
+    """
+
+    def authenticate_credentials(self, key):
+        user = get_token_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        # DRF keeps the token as request.auth; only its key is needed downstream (e.g. logout).
+        return (user, key)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Stateless alternative to token auth: `Authorization: Bearer <access token>`, where the
+    token is a short-lived signed access token from SignedTokenObtainView / SignedTokenRefreshView.
+    The user is built from the token's claims (id, role, is_staff), so authenticating and
+    role-based permission checks don't load the User row. Revocation uses a small cache deny-list.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            claims = decode_token(auth[1].decode(), ACCESS)
+        except (TokenError, UnicodeError) as e:
+            raise exceptions.AuthenticationFailed(str(e))
+        user = user_from_claims(claims)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, claims)
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,39 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the iteration count taken from settings.PASSWORD_HASH_ITERATIONS.
+
+    Changing the setting needs no migration: a stored hash with a different iteration count
+    is still verified with its own count, and Django's check_password() then re-hashes it
+    with the new cost (a single `password` column UPDATE) on the user's next successful login.
+    """
+    # Same algorithm name as the stock hasher, so existing hashes keep verifying and
+    # switching between the two classes never forces a rehash on its own.
+    algorithm = 'pbkdf2_sha256'
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+# Password checks are CPU-bound. Under ASGI, sync views all run on one shared thread
+# (thread_sensitive), so a password check there would hold up every other sync request.
+# The login views are async instead and check passwords on this dedicated pool, where
+# hashlib releases the GIL and checks run in parallel. Its size bounds how many run at
+# once, so a login spike queues here instead of taking every core away from the site.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'LOGIN_MAX_CONCURRENT_HASHES', None) or os.cpu_count() or 1,
+    thread_name_prefix='password-check',
+)
+
+
+def in_password_check_pool(func):
+    """Wraps `func` (which checks a password, and may query the database) as an awaitable run on the pool."""
+    return database_sync_to_async(func, thread_sensitive=False, executor=_hash_executor)
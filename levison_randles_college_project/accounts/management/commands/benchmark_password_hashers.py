@@ -0,0 +1,51 @@
+import time
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures password verification, the CPU cost of a login, for every hasher in "
+        "PASSWORD_HASHERS and optionally for candidate PBKDF2 iteration counts. "
+        "Reports logins/sec on one core; multiply by the cores serving logins for capacity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=2.0, help="Time spent measuring each hasher.")
+        parser.add_argument(
+            '--pbkdf2-iterations', type=int, nargs='*', default=[],
+            help="Also measure PBKDF2-SHA256 at these iteration counts, e.g. 260000 600000 1000000."
+        )
+
+    def handle(self, *args, **options):
+        password = 'correct horse battery staple'
+        self.stdout.write(f"{'hasher':<48} {'ms/login':>9} {'logins/sec/core':>16}")
+
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as e: # Hasher's optional library isn't installed
+                self.stdout.write(f"{hasher.algorithm:<48} skipped: {e}")
+                continue
+            label = f"{hasher.algorithm} ({type(hasher).__name__})"
+            self.report(label, lambda: hasher.verify(password, encoded), options['seconds'])
+
+        pbkdf2 = PBKDF2PasswordHasher()
+        for iterations in options['pbkdf2_iterations']:
+            encoded = pbkdf2.encode(password, pbkdf2.salt(), iterations=iterations)
+            self.report(f"pbkdf2_sha256 @ {iterations} iterations", lambda: pbkdf2.verify(password, encoded), options['seconds'])
+
+    def report(self, label, verify, seconds):
+        verify() # Warm up
+        count = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while True:
+            verify()
+            count += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+        per_login = (now - start) / count
+        self.stdout.write(f"{label:<48} {per_login * 1000:9.2f} {1 / per_login:16.1f}")
@@ -0,0 +1,72 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import AbstractUser
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark of User.save on the balance and last_login hot paths: the old "
+        "clean() + full-row write versus the current targeted save. Runs inside a transaction "
+        "that is rolled back, so no data is changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        try:
+            with transaction.atomic():
+                user = User.objects.create(
+                    email='benchmark.user@example.com', first_name='Bench', last_name='Mark', role='student'
+                )
+                user = User.objects.get(pk=user.pk) # Loaded from the DB, as in the request paths
+
+                def legacy_balance_save():
+                    # What User.save used to do for save(update_fields=['balance']) callers,
+                    # plus the full-row write a plain save() produced.
+                    user.balance += Decimal('0.01')
+                    user.clean()
+                    AbstractUser.save(user)
+
+                def balance_save():
+                    user.balance += Decimal('0.01')
+                    user.save(update_fields=['balance'])
+
+                def last_login_save():
+                    user.last_login = timezone.now()
+                    user.save(update_fields=['last_login'])
+
+                for label, func in (
+                    ("legacy clean() + full-row save", legacy_balance_save),
+                    ("save(update_fields=['balance'])", balance_save),
+                    ("save(update_fields=['last_login'])", last_login_save),
+                ):
+                    self.report(label, func, iterations)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def report(self, label, func, iterations):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        sql = queries.captured_queries[-1]['sql'] if queries.captured_queries else ''
+        columns_written = sql.split(' WHERE ')[0].count('=')
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        per_save_us = (time.perf_counter() - start) / iterations * 1e6
+
+        self.stdout.write(f"{label:<38} {per_save_us:8.1f} us/save   columns written: {columns_written}")
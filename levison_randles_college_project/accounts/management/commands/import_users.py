@@ -0,0 +1,64 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.user_import import DEFAULT_CHUNK_SIZE, UserImporter, write_error_report, write_result
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-creates users from a CSV with the registration fields as columns "
+        "(email, password, first_name, last_name, role, major, department, bio). "
+        "Passwords are hashed in a process pool and users are inserted in batches. "
+        "Invalid rows are skipped and listed in the error report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="CSV file to import, or '-' for stdin.")
+        parser.add_argument('--errors', help="Write rejected rows to this CSV file. Defaults to stderr.")
+        parser.add_argument('--result', help="Also write the outcome as JSON to this file, once the import has finished.")
+        parser.add_argument(
+            '--delete-csv', action='store_true',
+            help="Delete csv_file once the import has finished with it, whatever the outcome (it holds plaintext passwords)."
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Password hashing processes. Defaults to the number of CPUs; 1 hashes in-process."
+        )
+
+    def handle(self, *args, **options):
+        importer = UserImporter(chunk_size=options['chunk_size'], workers=options['workers'])
+        try:
+            if options['csv_file'] == '-':
+                result = importer.run(sys.stdin)
+            else:
+                # utf-8-sig so files saved by spreadsheet programs (with a BOM) read cleanly.
+                with open(options['csv_file'], newline='', encoding='utf-8-sig') as f:
+                    result = importer.run(f)
+        except Exception as e:
+            # Whatever went wrong, a background job must not be left reporting "running".
+            if options['result']:
+                write_result({'created': 0, 'failed': 0, 'errors': [], 'detail': str(e)}, options['result'])
+            if isinstance(e, (OSError, ValueError)):
+                raise CommandError(str(e))
+            raise
+        finally:
+            if options['delete_csv'] and options['csv_file'] != '-':
+                try:
+                    os.remove(options['csv_file'])
+                except FileNotFoundError:
+                    pass
+
+        if result['errors']:
+            if options['errors']:
+                with open(options['errors'], 'w', newline='', encoding='utf-8') as out:
+                    write_error_report(result['errors'], out)
+            else:
+                write_error_report(result['errors'], self.stderr)
+        if options['result']:
+            write_result(result, options['result'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} users; {result['failed']} rows rejected."
+        ))
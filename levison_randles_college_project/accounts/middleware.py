@@ -0,0 +1,80 @@
+import asyncio
+import copy
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddleware
+from channels.middleware import BaseMiddleware
+from channels.sessions import CookieMiddleware, SessionMiddleware
+from django.contrib.auth.models import AnonymousUser
+
+from .token_cache import aget_token_user
+
+# Clients that can't set headers on a WebSocket (browsers) may send the token as the
+# subprotocol pair ["token", "<key>"]. The consumer must then accept with this subprotocol.
+TOKEN_SUBPROTOCOL = 'token'
+
+# Concurrent lookups of the same token share one in-flight resolution, so a burst of
+# reconnects (e.g. after a deploy) costs one cache/DB lookup per token, not one per socket.
+_in_flight = {}
+
+
+async def _resolve_token_user(token_key):
+    task = _in_flight.get(token_key)
+    if task is None:
+        task = asyncio.ensure_future(aget_token_user(token_key))
+        _in_flight[token_key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(token_key, None))
+    # shield() so one client dropping mid-handshake doesn't cancel the lookup for the others.
+    user = await asyncio.shield(task)
+    # Every awaiter gets the same result; each socket gets its own User instance, so state a
+    # consumer sets on scope['user'] (cached attributes, a refresh) never leaks to another.
+    return copy.copy(user) if user is not None else None
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections by DRF auth token, taken from the `token`
+    query-string parameter or the ["token", "<key>"] subprotocol pair.
+    The user is resolved through the same cache as CachedTokenAuthentication and shares
+    its invalidation; only a hit in its in-process tier avoids a thread hop. Without a token no user is set, and the session
+    middleware inside it authenticates the socket instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token_key, subprotocol = self.get_token(scope)
+        if token_key:
+            scope = dict(scope)
+            user = await _resolve_token_user(token_key)
+            scope['user'] = user if user is not None and user.is_active else AnonymousUser()
+            if subprotocol:
+                scope['auth_subprotocol'] = subprotocol
+        return await super().__call__(scope, receive, send)
+
+    @staticmethod
+    def get_token(scope):
+        """Returns (token_key, subprotocol_to_accept_with) from the connection scope."""
+        subprotocols = scope.get('subprotocols') or []
+        if TOKEN_SUBPROTOCOL in subprotocols:
+            index = subprotocols.index(TOKEN_SUBPROTOCOL)
+            if index + 1 < len(subprotocols):
+                return subprotocols[index + 1], TOKEN_SUBPROTOCOL
+
+        query = parse_qs(scope.get('query_string', b'').decode())
+        token_keys = query.get('token')
+        if token_keys:
+            return token_keys[0], None
+        return None, None
+
+
+class SessionAuthMiddleware(AuthMiddleware):
+    """channels' AuthMiddleware, except that a user already on the scope is kept and the session is never read."""
+
+    async def __call__(self, scope, receive, send):
+        if 'user' in scope:
+            return await self.inner(scope, receive, send)
+        return await super().__call__(scope, receive, send)
+
+
+def TokenAuthMiddlewareStack(inner):
+    # The token, when present, decides: it is resolved first and the session lookup is skipped.
+    return TokenAuthMiddleware(CookieMiddleware(SessionMiddleware(SessionAuthMiddleware(inner))))
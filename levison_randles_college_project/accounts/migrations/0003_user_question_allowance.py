@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='question_allowance',
+            field=models.PositiveIntegerField(default=0, help_text="Number of questions the user can still ask. Topped up by 'question_allowance' purchases.", verbose_name='question allowance'),
+        ),
+    ]
@@ -50,14 +50,33 @@ class User(AbstractUser):
         help_text=_("User's internal balance.")
     )
 
+    question_allowance = models.PositiveIntegerField(
+        _("question allowance"),
+        default=0,
+        help_text=_("Number of questions the user can still ask. Topped up by 'question_allowance' purchases.")
+    )
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'role'] # email is already covered by USERNAME_FIELD
 
     def __str__(self):
         return self.email
 
+    # Fields whose values depend on the role; see normalize_role_fields.
+    ROLE_SPECIFIC_FIELDS = frozenset({'role', 'major', 'department', 'bio'})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save() can write only the columns that changed.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def clean(self):
         super().clean()
+        self.normalize_role_fields()
+
+    def normalize_role_fields(self):
         # Ensure role-specific fields are only populated for the correct role
         if self.role == 'student':
             self.department = None
@@ -71,7 +90,59 @@ class User(AbstractUser):
             self.department = None
             self.bio = None
 
+    def get_changed_fields(self):
+        """
+        Names of fields whose current value differs from the one read from the database.
+        Fields that were deferred at load time but have since been loaded have no baseline,
+        so they count as changed; fields still deferred are never included.
+        """
+        loaded = getattr(self, '_loaded_values', {})
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred and (
+                field.attname not in loaded or getattr(self, field.attname) != loaded[field.attname]
+            )
+        ]
 
     def save(self, *args, **kwargs):
-        self.clean() # Call clean to enforce role-specific field constraints
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # Targeted saves (balance changes, last_login on every login) skip clean() entirely,
+            # unless they write the role-specific fields or the email it normalizes.
+            update_fields = set(update_fields)
+            if update_fields & self.ROLE_SPECIFIC_FIELDS:
+                self.normalize_role_fields()
+                update_fields |= self.ROLE_SPECIFIC_FIELDS # Fields cleared by normalization must be written too
+            if 'email' in update_fields:
+                self.email = self.__class__.objects.normalize_email(self.email)
+            kwargs['update_fields'] = update_fields
+        else:
+            self.clean() # Call clean to enforce role-specific field constraints
+            if not self._state.adding and hasattr(self, '_loaded_values') and not kwargs.get('force_insert'):
+                # Full saves of a loaded user write only the columns that actually changed
+                # (an empty list makes Django skip the query altogether).
+                kwargs['update_fields'] = self.get_changed_fields()
         super().save(*args, **kwargs)
+        # What is in the database now is the baseline for the next save.
+        self._remember_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # The refreshed columns hold the database's values again. Without this, setting one
+        # back to its originally loaded value would look unchanged and never be written.
+        self._remember_loaded_values(fields)
+
+    def _remember_loaded_values(self, fields=None):
+        """Records the current values of `fields` (default: every loaded field) as matching the database."""
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            **getattr(self, '_loaded_values', {}),
+            **{
+                field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields
+                if field.attname not in deferred and (
+                    fields is None or field.name in fields or field.attname in fields
+                )
+            },
+        }
@@ -66,6 +66,19 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
+class UserImportRowSerializer(RegisterSerializer):
+    """
+    Validates one row of a bulk user import (see accounts.user_import).
+    Same rules as registration, except email uniqueness, which the importer
+    checks for a whole chunk of rows in one query instead of one query per row.
+    """
+    class Meta(RegisterSerializer.Meta):
+        extra_kwargs = {
+            **RegisterSerializer.Meta.extra_kwargs,
+            'email': {'validators': []},
+        }
+
+
 class UserSerializer(serializers.ModelSerializer):
     # Role-specific fields made read-only here, they are managed via registration or profile update logic
     major = serializers.CharField(read_only=True, allow_null=True)
@@ -76,8 +89,42 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'email', 'first_name', 'last_name', 'role',
                   'major', 'department', 'bio', 'balance', # Added balance
-                  'is_active', 'date_joined', 'last_login')
-        read_only_fields = ('is_active', 'date_joined', 'last_login', 'id', 'balance') # Made balance read-only
+                  'question_allowance', 'is_active', 'date_joined', 'last_login')
+        read_only_fields = ('is_active', 'date_joined', 'last_login', 'id', 'balance', 'question_allowance') # Made balance read-only
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    Compact, public representation of a user for nesting in other resources
+    (course teachers, chat senders, tip parties...). Never exposes private fields like balance.
+
+    Representations are memoized per request (or per root serializer when there is no request),
+    so a user appearing on every message of a chat page is serialized once.
+    """
+    MEMO_ATTR = '_user_summaries'
+
+    class Meta:
+        model = User
+        fields = ('id', 'first_name', 'last_name', 'role')
+        read_only_fields = fields
+
+    def _memo(self):
+        request = self.context.get('request')
+        holder = request if request is not None else self.context
+        if isinstance(holder, dict):
+            return holder.setdefault(self.MEMO_ATTR, {})
+        memo = getattr(holder, self.MEMO_ATTR, None)
+        if memo is None:
+            memo = {}
+            setattr(holder, self.MEMO_ATTR, memo)
+        return memo
+
+    def to_representation(self, instance):
+        memo = self._memo()
+        data = memo.get(instance.pk)
+        if data is None:
+            data = memo[instance.pk] = super().to_representation(instance)
+        return data
+
 
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
     # Allows updating common fields and role-specific fields
@@ -121,3 +168,7 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
         # The model's save() method which calls clean() will handle None-ing out
         # fields not relevant to the role.
         return super().update(instance, validated_data)
+
+
+class SignedTokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField(help_text="A refresh token from the signed token login or a previous refresh.")
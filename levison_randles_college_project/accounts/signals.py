@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .token_cache import invalidate_token, invalidate_user_tokens, SNAPSHOT_FIELDS
+from .signed_tokens import publish_user_claims, revoke_user
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    # Deferred to commit so a concurrent request can't re-cache the pre-change row.
+    # The key is bound now: it is the primary key, which Django clears after a delete.
+    token_key = instance.key
+    transaction.on_commit(lambda: invalidate_token(token_key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_tokens(sender, instance, update_fields=None, **kwargs):
+    # Saves that don't touch cached fields (e.g. save(update_fields=['balance'])) leave the cache alone.
+    if update_fields is not None and not set(update_fields) & set(SNAPSHOT_FIELDS):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user_tokens(user_id))
+    # Signed access tokens can't be deleted; publishing the new role/staff/active state
+    # makes tokens carrying different claims fail until the client refreshes.
+    transaction.on_commit(lambda: publish_user_claims(instance))
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    # Signed tokens of a deleted user would otherwise stay valid until they expire.
+    user_id = instance.pk
+    transaction.on_commit(lambda: revoke_user(user_id))
@@ -0,0 +1,120 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+User = get_user_model()
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+SALT = 'accounts.signed_tokens'
+
+DEFAULTS = {
+    'ACCESS_TTL': 5 * 60,
+    'REFRESH_TTL': 14 * 24 * 60 * 60,
+}
+
+
+def _setting(name):
+    return getattr(settings, 'SIGNED_TOKENS', {}).get(name, DEFAULTS[name])
+
+
+class TokenError(Exception):
+    """Raised for a token that is malformed, tampered with, expired, revoked or stale."""
+
+
+def _revoked_key(jti):
+    return f'accounts:signed:revoked:{jti}'
+
+
+def _claims_key(user_id):
+    return f'accounts:signed:claims:{user_id}'
+
+
+def issue_token(user, token_type):
+    ttl = _setting('ACCESS_TTL' if token_type == ACCESS else 'REFRESH_TTL')
+    claims = {
+        'typ': token_type,
+        'jti': uuid.uuid4().hex,
+        'exp': int(time.time()) + ttl,
+        'uid': user.pk,
+        'role': user.role,
+        'staff': user.is_staff,
+        'active': user.is_active,
+    }
+    return signing.dumps(claims, salt=SALT, compress=True)
+
+
+def issue_token_pair(user):
+    return {
+        'access': issue_token(user, ACCESS),
+        'refresh': issue_token(user, REFRESH),
+        'access_expires_in': _setting('ACCESS_TTL'),
+    }
+
+
+def decode_token(token, token_type):
+    """
+    Verifies the signature, type and expiry of a token and checks it against the deny-list.
+    Costs one shared-cache round trip and no database queries.
+    """
+    try:
+        claims = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        raise TokenError("Invalid token.")
+    if claims.get('typ') != token_type:
+        raise TokenError(f"Expected a {token_type} token.")
+    if claims['exp'] <= time.time():
+        raise TokenError("Token has expired.")
+
+    revoked_key, claims_key = _revoked_key(claims['jti']), _claims_key(claims['uid'])
+    found = cache.get_many([revoked_key, claims_key])
+    if revoked_key in found:
+        raise TokenError("Token has been revoked.")
+    # If the user's role, staff flag or active state changed after an access token was issued
+    # (or the user was deleted), its claims are stale: the client must refresh, which re-reads
+    # the user row.
+    current = found.get(claims_key)
+    if token_type == ACCESS and current is not None and current != [claims['role'], claims['staff'], claims.get('active', True)]:
+        raise TokenError("Token claims are out of date. Please refresh.")
+    return claims
+
+
+def revoke(claims):
+    """Deny-lists a token until it would have expired anyway, so the list stays small."""
+    remaining = int(claims['exp'] - time.time())
+    if remaining > 0:
+        cache.set(_revoked_key(claims['jti']), True, remaining)
+
+
+def claim(claims):
+    """
+    Deny-lists a token like revoke(), atomically: returns True only for the one caller that
+    listed it. A refresh token is used once this way, however many requests race to use it.
+    """
+    remaining = int(claims['exp'] - time.time())
+    return remaining > 0 and cache.add(_revoked_key(claims['jti']), True, remaining)
+
+
+def publish_user_claims(user):
+    """Records a user's current role/staff/active state so older tokens with other values are rejected."""
+    cache.set(_claims_key(user.pk), [user.role, user.is_staff, user.is_active], _setting('REFRESH_TTL'))
+
+
+def revoke_user(user_id):
+    """Rejects every token of a deleted user: no token's claims match these."""
+    cache.set(_claims_key(user_id), [None, None, False], _setting('REFRESH_TTL'))
+
+
+def user_from_claims(claims):
+    """
+    A User instance carrying only the claims; every other field is deferred and loads on access.
+    Permission checks on role/is_staff therefore need no database query.
+    """
+    return User.from_db(DEFAULT_DB_ALIAS, ['id', 'is_staff', 'is_active', 'role'], [
+        claims['uid'], claims['staff'], claims.get('active', True), claims['role'],
+    ])
@@ -1,3 +1,510 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from django.contrib.auth.hashers import check_password, get_hasher
+from .authentication import CachedTokenAuthentication
+from .middleware import TokenAuthMiddlewareStack
+from courses.models import Course, Enrollment
+from courses.serializers import CourseSerializer, EnrollmentSerializer
+from messaging.models import ChatMessage, ChatRoom
+from messaging.serializers import ChatMessageSerializer, ChatRoomSerializer
+from transactions.models import Tip
+from transactions.serializers import TipDetailSerializer
+from . import signed_tokens
+from .token_cache import local_cache
+from .models import User
+from .serializers import UserSummarySerializer
+from .user_import import UserImporter, import_job_status
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PasswordLoginTests(TransactionTestCase):
+    # TransactionTestCase: passwords are checked on the password-check pool's own threads
+    # and database connections, which can't see a TestCase's uncommitted data.
+
+    def setUp(self):
+        self.user = User(email='student@example.com', role='student')
+        self.user.set_password('s3cret-pass')
+        self.user.save()
+        self.client = APIClient()
+
+    def test_login_checks_the_password_off_the_request_thread(self):
+        threads = []
+        check_password = User.check_password
+
+        def recording_check(user, raw_password):
+            threads.append(threading.current_thread().name)
+            return check_password(user, raw_password)
+
+        with mock.patch.object(User, 'check_password', recording_check):
+            response = self.client.post(
+                '/api/accounts/login/', {'username': 'student@example.com', 'password': 's3cret-pass'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['token'], Token.objects.get(user=self.user).key)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('password-check'))
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.post('/api/accounts/login/', {'username': 'student@example.com', 'password': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.json())
+        self.assertFalse(Token.objects.exists())
+
+    def test_malformed_body_is_rejected(self):
+        response = self.client.post('/api/accounts/login/', '{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_signed_token_login(self):
+        response = self.client.post(
+            '/api/accounts/token/', {'username': 'student@example.com', 'password': 's3cret-pass'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_id'], self.user.pk)
+        self.assertIn('access', response.json())
+
+    def test_login_upgrades_older_hashes(self):
+        old_hashes = [
+            get_hasher('pbkdf2_sha256').encode('s3cret-pass', 'oldsalt', iterations=500), # Before a cost increase
+            get_hasher('pbkdf2_sha1').encode('s3cret-pass', 'oldsalt'),
+        ]
+        for old_hash in old_hashes:
+            User.objects.filter(pk=self.user.pk).update(password=old_hash)
+            response = self.client.post(
+                '/api/accounts/login/', {'username': 'student@example.com', 'password': 's3cret-pass'}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            stored = User.objects.get(pk=self.user.pk).password
+            self.assertTrue(stored.startswith('pbkdf2_sha256$1000$'), stored)
+            self.assertTrue(check_password('s3cret-pass', stored))
+
+    def test_login_is_a_drf_view(self):
+        response = self.client.get('/api/accounts/login/')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response.json(), {'detail': 'Method "GET" not allowed.'})
+        response = self.client.options('/api/accounts/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Login')
+
+
+class UserSaveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(email='student@example.com', role='student', first_name='Sam', major='Maths')
+
+    def setUp(self):
+        self.user = User.objects.get(email='student@example.com')
+
+    def test_full_save_writes_only_changed_columns(self):
+        self.user.first_name = 'Samuel'
+        with self.assertNumQueries(1) as queries:
+            self.user.save()
+        sql = queries.captured_queries[0]['sql']
+        self.assertIn('"first_name"', sql)
+        self.assertNotIn('"major"', sql)
+        with self.assertNumQueries(0):
+            self.user.save()
+
+    def test_role_change_clears_role_specific_fields(self):
+        self.user.role = 'teacher'
+        self.user.save()
+        self.assertIsNone(User.objects.get(pk=self.user.pk).major)
+
+    def test_reverting_to_the_loaded_value_after_a_refresh_is_written(self):
+        User.objects.filter(pk=self.user.pk).update(first_name='Changed elsewhere')
+        self.user.refresh_from_db()
+        self.user.first_name = 'Sam'
+        self.user.save()
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Sam')
+
+    def test_partial_refresh_only_resets_the_refreshed_fields(self):
+        User.objects.filter(pk=self.user.pk).update(first_name='Changed elsewhere', major='Physics')
+        self.user.last_name = 'Local'
+        self.user.refresh_from_db(fields=['first_name'])
+        self.user.first_name = 'Sam'
+        self.user.save()
+        stored = User.objects.get(pk=self.user.pk)
+        self.assertEqual((stored.first_name, stored.last_name, stored.major), ('Sam', 'Local', 'Physics'))
+
+    def test_reverting_after_a_save_is_written(self):
+        self.user.first_name = 'Temporary'
+        self.user.save()
+        self.user.first_name = 'Sam'
+        self.user.save()
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Sam')
+
+
+IMPORT_CSV = """email,password,first_name,last_name,role,major,department,bio
+new1@example.com,pw-one-123,Ada,One,student,Maths,,
+NEW2@Example.com,pw-two-123,Bea,Two,teacher,,Physics,Teaches physics
+taken@example.com,pw-three-123,Cy,Three,student,,,
+new1@example.com,pw-four-123,Di,Four,student,,,
+bad@example.com,pw-five-123,Ed,Five,janitor,,,
+,pw-six-123,Fi,Six,student,,,
+"""
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class UserImporterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(email='taken@example.com', role='student')
+
+    def test_valid_rows_are_created_and_invalid_rows_reported(self):
+        result = UserImporter(chunk_size=2, workers=1).run(io.StringIO(IMPORT_CSV))
+        self.assertEqual((result['created'], result['failed']), (2, 4))
+        self.assertEqual(
+            {error['line']: set(error['errors']) for error in result['errors']},
+            {4: {'email'}, 5: {'email'}, 6: {'role'}, 7: {'email'}},
+        )
+        teacher = User.objects.get(email='NEW2@example.com') # Domain normalized
+        self.assertEqual((teacher.role, teacher.department), ('teacher', 'Physics'))
+        self.assertTrue(User.objects.get(email='new1@example.com').check_password('pw-one-123'))
+
+    def test_missing_columns_are_rejected_before_any_row(self):
+        with self.assertRaisesMessage(ValueError, 'password'):
+            UserImporter(workers=1).run(io.StringIO("email,first_name,last_name,role\nx@example.com,X,Y,student\n"))
+
+    def test_command_writes_the_result_and_error_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(f'{tmp}/users.csv', 'w') as f:
+                f.write(IMPORT_CSV)
+            call_command(
+                'import_users', f'{tmp}/users.csv', '--workers', '1',
+                '--errors', f'{tmp}/errors.csv', '--result', f'{tmp}/result.json', stdout=io.StringIO(),
+            )
+            with open(f'{tmp}/result.json') as f:
+                self.assertEqual(json.load(f)['created'], 2)
+            with open(f'{tmp}/errors.csv') as f:
+                self.assertEqual(f.readline().strip(), 'line,email,field,message')
+
+    def test_command_deletes_the_upload_and_reports_any_failure(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for error, raised in ((ValueError("bad file"), CommandError), (RuntimeError("crashed"), RuntimeError)):
+                with open(f'{tmp}/users.csv', 'w') as f:
+                    f.write(IMPORT_CSV)
+                with mock.patch.object(UserImporter, 'run', side_effect=error), self.assertRaises(raised):
+                    call_command(
+                        'import_users', f'{tmp}/users.csv', '--delete-csv', '--result', f'{tmp}/result.json',
+                        stdout=io.StringIO(),
+                    )
+                self.assertFalse(os.path.exists(f'{tmp}/users.csv'))
+                with open(f'{tmp}/result.json') as f:
+                    self.assertEqual(json.load(f)['detail'], str(error))
+
+            with open(f'{tmp}/users.csv', 'w') as f:
+                f.write(IMPORT_CSV)
+            call_command('import_users', f'{tmp}/users.csv', '--workers', '1', '--delete-csv',
+                         stdout=io.StringIO(), stderr=io.StringIO())
+            self.assertFalse(os.path.exists(f'{tmp}/users.csv'))
+
+
+class UserImportViewTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.enterContext(override_settings(USER_IMPORT_DIR=self.tmp.name))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(email='admin@example.com', role='teacher', is_staff=True))
+
+    @mock.patch('accounts.user_import.subprocess.Popen')
+    def test_upload_is_stored_and_imported_in_the_background(self, popen):
+        upload = SimpleUploadedFile('users.csv', IMPORT_CSV.encode(), content_type='text/csv')
+        response = self.client.post('/api/accounts/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        command = popen.call_args.args[0]
+        self.assertEqual(command[2:4], ['import_users', f'{self.tmp.name}/{job_id}/upload.csv'])
+        with open(command[3]) as f:
+            self.assertEqual(f.read(), IMPORT_CSV)
+        self.assertFalse(User.objects.filter(email='new1@example.com').exists())
+
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json(), {'status': 'running'})
+        with open(f'{self.tmp.name}/{job_id}/result.json', 'w') as f:
+            json.dump({'created': 2, 'failed': 0, 'errors': []}, f)
+        self.assertEqual(self.client.get(status_url).json()['status'], 'done')
+
+    @mock.patch('accounts.user_import.subprocess.Popen')
+    def test_running_imports_are_capped(self, popen):
+        def upload():
+            file = SimpleUploadedFile('users.csv', IMPORT_CSV.encode(), content_type='text/csv')
+            return self.client.post('/api/accounts/import/', {'file': file}, format='multipart')
+
+        with self.settings(USER_IMPORT_MAX_JOBS=1):
+            job_id = upload().json()['job_id']
+            self.assertEqual(upload().status_code, 429)
+            with open(f'{self.tmp.name}/{job_id}/result.json', 'w') as f:
+                json.dump({'created': 2, 'failed': 0, 'errors': []}, f)
+            self.assertEqual(upload().status_code, 202)
+        self.assertEqual(popen.call_count, 2)
+
+    @mock.patch('accounts.user_import.subprocess.Popen')
+    def test_import_without_a_result_fails_after_the_timeout(self, popen):
+        file = SimpleUploadedFile('users.csv', IMPORT_CSV.encode(), content_type='text/csv')
+        job_id = self.client.post('/api/accounts/import/', {'file': file}, format='multipart').json()['job_id']
+        long_ago = time.time() - 7 * 60 * 60
+        os.utime(f'{self.tmp.name}/{job_id}', (long_ago, long_ago))
+        self.assertEqual(import_job_status(job_id)['status'], 'failed')
+
+    def test_unknown_job_is_not_found(self):
+        self.assertIsNone(import_job_status('0' * 32))
+        self.assertEqual(self.client.get(f'/api/accounts/import/{"0" * 8}-0000-0000-0000-{"0" * 12}/').status_code, 404)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='student@example.com', role='student', balance=Decimal('5.00'))
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self, key=None):
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key or self.token.key)
+        return user
+
+    def assertRejected(self, key=None):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(key)
+
+    def test_lookups_are_served_from_the_local_then_the_shared_cache(self):
+        with self.assertNumQueries(1):
+            user = self.authenticate()
+        self.assertEqual((user.pk, user.role), (self.user.pk, 'student'))
+        with self.assertNumQueries(0):
+            self.authenticate()
+        local_cache.clear() # As in another process
+        with self.assertNumQueries(0):
+            self.authenticate()
+        # Uncached fields load from the database when read.
+        with self.assertNumQueries(1):
+            self.assertEqual(user.balance, Decimal('5.00'))
+
+    def test_logout_invalidates_the_token(self):
+        self.authenticate()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post('/api/accounts/logout/').status_code, 204)
+        self.assertRejected()
+
+    def test_rotating_the_token_invalidates_the_old_key(self):
+        old_key = self.token.key
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+            rotated = Token.objects.create(user=self.user)
+        self.assertRejected(old_key)
+        self.assertEqual(self.authenticate(rotated.key).pk, self.user.pk)
+
+    def test_deactivating_the_user_invalidates_their_tokens(self):
+        self.authenticate()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertRejected()
+
+    def test_role_change_is_seen_at_once(self):
+        self.assertEqual(self.authenticate().role, 'student')
+        self.user.role = 'teacher'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['role'])
+        self.assertEqual(self.authenticate().role, 'teacher')
+
+    def test_saves_of_uncached_fields_keep_the_cache(self):
+        self.authenticate()
+        self.user.balance = Decimal('6.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['balance'])
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+
+class TokenAuthMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='student@example.com', role='student')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        async def app(scope, receive, send):
+            scope['connected_as'].append(scope['user'])
+
+        self.stack = TokenAuthMiddlewareStack(app)
+
+    async def connect(self, query_string=b''):
+        connected_as = []
+        scope = {
+            'type': 'websocket', 'query_string': query_string, 'headers': [], 'subprotocols': [],
+            'connected_as': connected_as,
+        }
+        await self.stack(scope, None, None)
+        return connected_as[0]
+
+    async def test_token_user_skips_the_session_lookup(self):
+        with mock.patch('channels.auth.get_user', side_effect=AssertionError("session read")):
+            user = await self.connect(f'token={self.token.key}'.encode())
+        self.assertEqual(user.pk, self.user.pk)
+
+    async def test_cached_token_is_resolved_without_a_thread_hop(self):
+        query_string = f'token={self.token.key}'.encode()
+        await self.connect(query_string) # Cold: one hop into get_token_user()
+        with mock.patch('accounts.token_cache.database_sync_to_async', side_effect=AssertionError("thread hop")):
+            user = await self.connect(query_string)
+        self.assertEqual(user.pk, self.user.pk)
+
+    async def test_unknown_token_is_anonymous(self):
+        with mock.patch('channels.auth.get_user', side_effect=AssertionError("session read")):
+            user = await self.connect(b'token=nope')
+        self.assertFalse(user.is_authenticated)
+
+    async def test_without_a_token_the_session_decides(self):
+        user = await self.connect()
+        self.assertFalse(user.is_authenticated)
+
+    async def test_concurrent_sockets_get_their_own_user_instances(self):
+        query_string = f'token={self.token.key}'.encode()
+        first, second = await asyncio.gather(self.connect(query_string), self.connect(query_string))
+        self.assertEqual(first.pk, second.pk)
+        self.assertIsNot(first, second)
+
+
+class SignedTokenTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='student@example.com', role='student')
+        cls.room = ChatRoom.objects.create(room_type='group', name='Study group')
+        cls.room.participants.add(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.tokens = signed_tokens.issue_token_pair(self.user)
+
+    def refresh(self, token):
+        return self.client.post('/api/accounts/token/refresh/', {'refresh': token}, format='json')
+
+    def get_room_messages(self):
+        return self.client.get(
+            f'/api/messaging/rooms/{self.room.pk}/messages/', HTTP_AUTHORIZATION=f'Bearer {self.tokens["access"]}'
+        )
+
+    def test_room_participants_are_checked_without_loading_the_user(self):
+        with self.assertNumQueries(3): # The room, the participants check, the messages
+            response = self.get_room_messages()
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_token_is_used_once(self):
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 200)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+    def test_claiming_a_refresh_token_is_atomic(self):
+        claims = signed_tokens.decode_token(self.tokens['refresh'], signed_tokens.REFRESH)
+        self.assertTrue(signed_tokens.claim(claims))
+        self.assertFalse(signed_tokens.claim(claims))
+
+    def test_role_changes_need_a_refresh(self):
+        self.user.role = 'teacher'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_room_messages().status_code, 401)
+        response = self.refresh(self.tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        claims = signed_tokens.decode_token(response.json()['access'], signed_tokens.ACCESS)
+        self.assertEqual(signed_tokens.user_from_claims(claims).role, 'teacher')
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_room_messages().status_code, 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).delete()
+        with self.assertRaises(signed_tokens.TokenError):
+            signed_tokens.decode_token(self.tokens['access'], signed_tokens.ACCESS)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+
+class UserSummarySerializerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(
+            email='alice@example.com', first_name='Alice', role='student', balance=Decimal('9.00')
+        )
+        cls.bob = User.objects.create(email='bob@example.com', first_name='Bob', role='teacher', balance=Decimal('7.00'))
+        cls.room = ChatRoom.objects.create(room_type='dm')
+        cls.room.participants.add(cls.alice, cls.bob)
+        cls.messages = [
+            ChatMessage.objects.create(room=cls.room, sender=sender, content=str(i))
+            for i, sender in enumerate([cls.alice, cls.bob, cls.alice, cls.alice])
+        ]
+
+    def request(self):
+        return APIRequestFactory().get('/')
+
+    def test_each_user_is_serialized_once_per_request(self):
+        messages = ChatMessage.objects.select_related('sender').order_by('pk')
+        with mock.patch.object(
+            ModelSerializer, 'to_representation', autospec=True, side_effect=ModelSerializer.to_representation
+        ) as to_representation:
+            data = ChatMessageSerializer(messages, many=True, context={'request': self.request()}).data
+        summaries = [message['sender_details'] for message in data]
+        self.assertEqual([summary['first_name'] for summary in summaries], ['Alice', 'Bob', 'Alice', 'Alice'])
+        nested = [call for call in to_representation.call_args_list if isinstance(call.args[0], UserSummarySerializer)]
+        self.assertEqual(len(nested), 2)
+
+    def test_memo_does_not_outlive_the_request(self):
+        def sender_name(context):
+            message = ChatMessage.objects.select_related('sender').get(pk=self.messages[0].pk)
+            return ChatMessageSerializer(message, context=context).data['sender_details']['first_name']
+
+        self.assertEqual(sender_name({'request': self.request()}), 'Alice')
+        User.objects.filter(pk=self.alice.pk).update(first_name='Alicia')
+        self.assertEqual(sender_name({'request': self.request()}), 'Alicia')
+        # Without a request, the memo lives on the root serializer's context.
+        self.assertEqual(sender_name({}), 'Alicia')
+
+    def test_nested_users_never_include_private_fields(self):
+        tip = Tip.objects.create(tipper=self.alice, tippee=self.bob, amount=Decimal('1.00'))
+        course = Course.objects.create(title='Algebra', description='...', teacher=self.bob, is_published=True)
+        enrollment = Enrollment.objects.create(student=self.alice, course=course)
+        context = {'request': self.request()}
+        summaries = [
+            TipDetailSerializer(tip, context=context).data['tipper'],
+            TipDetailSerializer(tip, context=context).data['tippee'],
+            ChatMessageSerializer(self.messages[0], context=context).data['sender_details'],
+            *ChatRoomSerializer(self.room, context=context).data['participant_details'],
+            CourseSerializer(course, context=context).data['teacher_details'],
+            EnrollmentSerializer(enrollment, context=context).data['student_details'],
+        ]
+        for summary in summaries:
+            self.assertEqual(set(summary), {'id', 'first_name', 'last_name', 'role'})
@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+# Only the fields needed to authorize a request are cached. The user instance handed to
+# views is built with every other field deferred: reading e.g. `balance` loads it fresh
+# from the database, and save() only writes the snapshot fields, never stale copies of the rest.
+# The password hash is deliberately never cached.
+# Kept in the model's field order, which Model.from_db() expects for a partial row.
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'email', 'first_name', 'last_name', 'role', 'is_active', 'is_staff', 'is_superuser'}
+)
+
+# Cache settings, all overridable from settings.AUTH_TOKEN_CACHE.
+# LOCAL_TTL is kept short because a per-process entry can't be invalidated from other
+# processes; SHARED_TTL can be longer since the shared entry is deleted on every change.
+DEFAULTS = {
+    'LOCAL_TTL': 5,
+    'LOCAL_MAXSIZE': 10000,
+    'SHARED_TTL': 60,
+}
+
+
+def _setting(name):
+    return getattr(settings, 'AUTH_TOKEN_CACHE', {}).get(name, DEFAULTS[name])
+
+
+class LocalLRUCache:
+    """A small thread-safe LRU with per-entry expiry, used as the in-process first tier."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRUCache(maxsize=_setting('LOCAL_MAXSIZE'))
+
+
+def _cache_key(token_key):
+    # Raw tokens are credentials; keep them out of the shared cache's key space.
+    return 'accounts:token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def snapshot(user):
+    return tuple(getattr(user, field) for field in SNAPSHOT_FIELDS)
+
+
+def user_from_snapshot(values):
+    """Builds a fresh User instance per request so no mutable object is shared between requests."""
+    return User.from_db(DEFAULT_DB_ALIAS, SNAPSHOT_FIELDS, values)
+
+
+def _remember(key, values):
+    local_cache.set(key, values, _setting('LOCAL_TTL'))
+
+
+def get_token_user(token_key):
+    """
+    Returns the (possibly inactive) user for a token key, or None if the token doesn't exist.
+    Looks in the local LRU, then the shared cache, then the database.
+    """
+    key = _cache_key(token_key)
+    values = local_cache.get(key)
+    if values is None:
+        values = cache.get(key)
+        if values is None:
+            try:
+                token = Token.objects.select_related('user').only(
+                    'key', *(f'user__{field}' for field in SNAPSHOT_FIELDS)
+                ).get(key=token_key)
+            except Token.DoesNotExist:
+                return None
+            values = snapshot(token.user)
+            cache.set(key, values, _setting('SHARED_TTL'))
+        _remember(key, values)
+    return user_from_snapshot(values)
+
+
+async def aget_token_user(token_key):
+    """
+    Async variant of get_token_user, for ASGI consumers and middleware. Only a hit in the
+    local LRU is answered on the event loop. Anything else takes one thread hop into
+    get_token_user(): the ORM's async methods and the shared cache's (LocMemCache has no
+    async implementation of its own) would each run in a thread anyway, so one hop beats
+    up to three.
+    """
+    values = local_cache.get(_cache_key(token_key))
+    if values is not None:
+        return user_from_snapshot(values)
+    return await database_sync_to_async(get_token_user)(token_key)
+
+
+def invalidate_token(token_key):
+    key = _cache_key(token_key)
+    local_cache.delete(key)
+    cache.delete(key)
+
+
+def invalidate_user_tokens(user_id):
+    for token_key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(token_key)
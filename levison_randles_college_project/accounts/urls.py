@@ -1,8 +1,19 @@
 from django.urls import path
-from .views import RegisterView, UserProfileView, LoginView # Import LoginView
+from .views import (
+    RegisterView, UserProfileView, LoginView, LogoutView, # Import LoginView
+    SignedTokenObtainView, SignedTokenRefreshView, SignedTokenRevokeView,
+    UserImportView, UserImportStatusView,
+)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='account_register'),
     path('login/', LoginView.as_view(), name='account_login'), # Added login path
+    path('logout/', LogoutView.as_view(), name='account_logout'),
+    # Stateless signed-token auth mode (alternative to the DRF auth token above)
+    path('token/', SignedTokenObtainView.as_view(), name='account_token_obtain'),
+    path('token/refresh/', SignedTokenRefreshView.as_view(), name='account_token_refresh'),
+    path('token/revoke/', SignedTokenRevokeView.as_view(), name='account_token_revoke'),
     path('profile/', UserProfileView.as_view(), name='account_profile'),
+    path('import/', UserImportView.as_view(), name='account_import'), # Staff only
+    path('import/<uuid:job_id>/', UserImportStatusView.as_view(), name='account_import_status'),
 ]
@@ -0,0 +1,245 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .serializers import UserImportRowSerializer
+
+User = get_user_model()
+
+DEFAULT_CHUNK_SIZE = 500
+
+IMPORT_COLUMNS = ('email', 'password', 'first_name', 'last_name', 'role', 'major', 'department', 'bio')
+
+
+def _init_worker():
+    # Workers started with the 'spawn' method (macOS, Windows) begin with no configured
+    # Django; make_password needs settings.PASSWORD_HASHERS. Harmless after 'fork'.
+    django.setup()
+
+
+def _flatten_errors(errors):
+    """Turns serializer.errors into {field: "message; message"} for the error report."""
+    flat = {}
+    for field, messages in errors.items():
+        if isinstance(messages, (list, tuple)):
+            flat[field] = "; ".join(str(message) for message in messages)
+        else:
+            flat[field] = str(messages)
+    return flat
+
+
+class UserImporter:
+    """
+    Creates users in bulk from a CSV with the registration fields as columns
+    (email, password, first_name, last_name, role, major, department, bio).
+
+    Rows are read and validated a chunk at a time, so memory stays flat however long the
+    file is. Each chunk costs one query for email uniqueness and one bulk INSERT; password
+    hashing, which dominates (PBKDF2 is CPU-bound by design), is spread over a process pool.
+    Invalid rows are collected in the error report and never abort the rest of the import.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+        self.chunk_size = chunk_size
+        # workers=None uses every CPU; 0 or 1 hashes in this process (no pool).
+        self.workers = os.cpu_count() if workers is None else workers
+
+    def run(self, text_stream):
+        """
+        Imports every row of `text_stream` (a text-mode file object).
+        Returns {'created': int, 'failed': int, 'errors': [{'line', 'email', 'errors'}]}.
+        """
+        reader = csv.DictReader(text_stream)
+        missing = {'email', 'password', 'first_name', 'last_name', 'role'} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"CSV is missing required columns: {', '.join(sorted(missing))}.")
+
+        result = {'created': 0, 'failed': 0, 'errors': []}
+        seen_emails = set()
+        executor = None
+        if self.workers and self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        try:
+            rows = ((reader.line_num, row) for row in reader)
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self._import_chunk(chunk, seen_emails, executor, result)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        result['failed'] = len(result['errors'])
+        return result
+
+    def _import_chunk(self, chunk, seen_emails, executor, result):
+        valid = []
+        for line, row in chunk:
+            # Blank cells mean "not given", like an omitted key in a registration request.
+            data = {key: value.strip() for key, value in row.items() if key in IMPORT_COLUMNS and value and value.strip()}
+            serializer = UserImportRowSerializer(data=data)
+            if not serializer.is_valid():
+                self._reject(result, line, row, _flatten_errors(serializer.errors))
+                continue
+            attrs = serializer.validated_data
+            attrs['email'] = User.objects.normalize_email(attrs['email'])
+            if attrs['email'] in seen_emails:
+                self._reject(result, line, row, {'email': "Duplicate email earlier in this file."})
+                continue
+            seen_emails.add(attrs['email'])
+            valid.append((line, row, attrs))
+
+        # One query for the whole chunk instead of a UniqueValidator query per row.
+        existing = set(User.objects.filter(
+            email__in=[attrs['email'] for _, _, attrs in valid]
+        ).values_list('email', flat=True))
+        pending = []
+        for line, row, attrs in valid:
+            if attrs['email'] in existing:
+                self._reject(result, line, row, {'email': "A user with this email address already exists."})
+            else:
+                pending.append((line, row, attrs))
+        if not pending:
+            return
+
+        passwords = [attrs.pop('password') for _, _, attrs in pending]
+        if executor is not None:
+            hashed = list(executor.map(make_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4))))
+        else:
+            hashed = [make_password(password) for password in passwords]
+
+        users = []
+        for (line, row, attrs), password in zip(pending, hashed):
+            user = User(password=password, **attrs)
+            user.normalize_role_fields() # bulk_create bypasses save(), which would normally do this
+            users.append(user)
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            result['created'] += len(users)
+        except IntegrityError:
+            # Someone registered one of these emails since the uniqueness check. Fall back to
+            # row-by-row inserts for this chunk so only the conflicting rows are rejected.
+            for (line, row, attrs), user in zip(pending, users):
+                try:
+                    with transaction.atomic():
+                        User.objects.bulk_create([user])
+                    result['created'] += 1
+                except IntegrityError:
+                    self._reject(result, line, row, {'email': "A user with this email address already exists."})
+
+    @staticmethod
+    def _reject(result, line, row, errors):
+        result['errors'].append({'line': line, 'email': row.get('email'), 'errors': errors})
+
+
+def write_error_report(errors, out):
+    """Writes the import's rejected rows as CSV: line, email, field, message."""
+    writer = csv.writer(out)
+    writer.writerow(['line', 'email', 'field', 'message'])
+    for error in errors:
+        for field, message in error['errors'].items():
+            writer.writerow([error['line'], error['email'], field, message])
+
+
+# Imports started over the API run as `import_users` processes, one directory per job
+# under settings.USER_IMPORT_DIR: the uploaded CSV (deleted by the import as soon as it has
+# been read, since it holds plaintext passwords), the process's log, the error report and,
+# once the import has finished, result.json.
+def import_job_dir(job_id):
+    return Path(settings.USER_IMPORT_DIR) / str(job_id)
+
+
+class ImportBusyError(Exception):
+    """Raised by start_import_job() when settings.USER_IMPORT_MAX_JOBS imports are already running."""
+
+
+def _running_job_dirs():
+    root = Path(settings.USER_IMPORT_DIR)
+    if not root.is_dir():
+        return []
+    return [job_dir for job_dir in root.iterdir() if job_dir.is_dir() and _job_is_running(job_dir)]
+
+
+def _job_is_running(job_dir):
+    # A job without a result that has been going for longer than USER_IMPORT_JOB_TIMEOUT
+    # died without writing one (e.g. it was killed); it no longer counts as running.
+    if (job_dir / 'result.json').exists():
+        return False
+    return time.time() - job_dir.stat().st_mtime < settings.USER_IMPORT_JOB_TIMEOUT
+
+
+def start_import_job(upload):
+    """
+    Stores `upload` (an uploaded CSV file) and starts importing it in a separate
+    `import_users` process, so neither the hashing pool nor the import runs in the web
+    server. Returns the job ID for import_job_status(). Raises ImportBusyError if
+    settings.USER_IMPORT_MAX_JOBS imports are running already.
+    """
+    if len(_running_job_dirs()) >= settings.USER_IMPORT_MAX_JOBS:
+        raise ImportBusyError("Too many imports are running. Try again once one has finished.")
+    job_id = uuid.uuid4()
+    job_dir = import_job_dir(job_id)
+    job_dir.mkdir(mode=0o700, parents=True)
+    # Owner-only: the file holds plaintext passwords until the import has read it.
+    with open(os.open(job_dir / 'upload.csv', os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    try:
+        with open(job_dir / 'import.log', 'wb') as log:
+            subprocess.Popen(
+                [
+                    sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'import_users',
+                    str(job_dir / 'upload.csv'), '--delete-csv', '--workers', str(settings.USER_IMPORT_WORKERS),
+                    '--errors', str(job_dir / 'errors.csv'), '--result', str(job_dir / 'result.json'),
+                ],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                start_new_session=True, # Outlives the request and a server restart
+            )
+    except Exception as e:
+        os.remove(job_dir / 'upload.csv')
+        write_result({'created': 0, 'failed': 0, 'errors': [], 'detail': f"Could not start the import: {e}"},
+                     job_dir / 'result.json')
+        raise
+    return job_id
+
+
+def import_job_status(job_id):
+    """
+    {'status': 'running'} until the import finishes, then its result (see UserImporter.run)
+    with 'status': 'done', or 'failed' plus a 'detail' if the file couldn't be imported at
+    all or the import stopped without a result. None if there is no such job.
+    """
+    job_dir = import_job_dir(job_id)
+    if not job_dir.is_dir():
+        return None
+    try:
+        with open(job_dir / 'result.json', encoding='utf-8') as f:
+            result = json.load(f)
+    except FileNotFoundError:
+        if _job_is_running(job_dir):
+            return {'status': 'running'}
+        return {'status': 'failed', 'detail': "The import stopped without a result; see import.log in its job directory."}
+    return {'status': 'failed' if 'detail' in result else 'done', **result}
+
+
+def write_result(result, path):
+    """Writes the import's result as JSON, in one rename so a reader never sees a partial file."""
+    partial = f'{path}.partial'
+    with open(partial, 'w', encoding='utf-8') as out:
+        json.dump(result, out)
+    os.replace(partial, path)
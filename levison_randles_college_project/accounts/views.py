@@ -1,7 +1,19 @@
+import inspect
+
+from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 from rest_framework import generics, permissions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from .serializers import RegisterSerializer, UserSerializer, UserProfileUpdateSerializer
+from . import signed_tokens
+from .hashers import in_password_check_pool
+from .serializers import (
+    RegisterSerializer, SignedTokenRefreshSerializer, UserSerializer, UserProfileUpdateSerializer,
+)
+from .user_import import ImportBusyError, import_job_status, start_import_job
 
 User = get_user_model()
 
@@ -24,8 +36,9 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        # Returns the currently authenticated user
-        return self.request.user
+        # Returns the currently authenticated user, loaded fresh: request.user may be a
+        # cached auth snapshot (see accounts.token_cache) and this view shows and saves every field.
+        return User.objects.get(pk=self.request.user.pk)
 
     def get_serializer_class(self):
         """
@@ -50,23 +63,164 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     def perform_update(self, serializer):
         serializer.save()
 
-from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.authtoken.models import Token
 
 class LoginView(ObtainAuthToken):
     """
     View for user login.
     Authenticates a user and returns an auth token, user ID, email, and role.
+
+    This is DRF's ObtainAuthToken made async: a sync view would check the password on the
+    thread every sync request shares under ASGI, while here the check waits on the
+    password-check pool (see accounts.hashers) without blocking anything. Everything else
+    (authentication, throttling, content negotiation, exception handling) is DRF's own.
     """
-    def post(self, request, *args, **kwargs):
-        serializer = self.serializer_class(data=request.data,
-                                           context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data['user']
+    async def dispatch(self, request, *args, **kwargs):
+        # APIView.dispatch, with the sync parts on a worker thread and the handler awaited.
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await database_sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response): # Only post() is async; options() and the 405 are not
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        await in_password_check_pool(serializer.is_valid)(raise_exception=True)
+        return Response(await database_sync_to_async(self.login)(serializer.validated_data['user']))
+
+    def login(self, user):
+        """The response body for the authenticated `user`."""
         token, created = Token.objects.get_or_create(user=user)
-        return Response({
+        return {
             'token': token.key,
             'user_id': user.pk,
             'email': user.email,
             'role': user.role  # Assuming 'role' is a field on your custom User model
-        })
+        }
+
+
+class LogoutView(generics.GenericAPIView):
+    """
+    View for user logout.
+    Deletes the user's auth token, which also evicts it from the auth token cache.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+
+class SignedTokenObtainView(LoginView):
+    """
+    Login for the stateless auth mode.
+    Authenticates a user and returns a short-lived signed access token and a refresh token.
+    Send the access token as `Authorization: Bearer <token>`.
+    """
+    def login(self, user):
+        return {
+            **signed_tokens.issue_token_pair(user),
+            'user_id': user.pk,
+            'email': user.email,
+            'role': user.role,
+        }
+
+class SignedTokenRefreshView(generics.GenericAPIView):
+    """
+    Exchanges a refresh token for a new access/refresh pair.
+    The old refresh token is revoked (rotation). The user row is re-read here, so role or
+    active-state changes are picked up at the latest one access-token lifetime later.
+    """
+    serializer_class = SignedTokenRefreshSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            claims = signed_tokens.decode_token(serializer.validated_data['refresh'], signed_tokens.REFRESH)
+        except signed_tokens.TokenError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = User.objects.filter(pk=claims['uid'], is_active=True).first()
+        if user is None:
+            return Response({'detail': 'User inactive or deleted.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Each refresh token is exchanged once: of concurrent requests with the same token,
+        # only the one that claims it gets a new pair.
+        if not signed_tokens.claim(claims):
+            return Response({'detail': 'Token has been revoked.'}, status=status.HTTP_401_UNAUTHORIZED)
+        signed_tokens.publish_user_claims(user)
+        return Response(signed_tokens.issue_token_pair(user))
+
+class SignedTokenRevokeView(generics.GenericAPIView):
+    """
+    Logout for the stateless auth mode.
+    Revokes the given refresh token and, if the request is authenticated with one, the current access token.
+    """
+    serializer_class = SignedTokenRefreshSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            claims = signed_tokens.decode_token(serializer.validated_data['refresh'], signed_tokens.REFRESH)
+        except signed_tokens.TokenError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        signed_tokens.revoke(claims)
+        if isinstance(request.auth, dict) and request.auth.get('typ') == signed_tokens.ACCESS:
+            signed_tokens.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+
+class UserImportView(generics.GenericAPIView):
+    """
+    Bulk user import for staff (e.g. a new intake of students).
+    POST a multipart form with a `file` CSV of registration fields. The file is stored and
+    imported in the background by the `import_users` command; the response (202) links to
+    UserImportStatusView, which reports how many users were created plus every rejected
+    row with its errors once the import has finished. Rejected rows never stop the rest of
+    the file from being imported. While settings.USER_IMPORT_MAX_JOBS imports are running,
+    new ones are refused with 429.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': "Upload the CSV as the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job_id = start_import_job(upload)
+        except ImportBusyError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        return Response(
+            {'job_id': job_id, 'status': 'running', 'status_url': reverse('account_import_status', args=[job_id])},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class UserImportStatusView(generics.GenericAPIView):
+    """Progress and, when finished, the outcome of an import started through UserImportView."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = import_job_status(job_id)
+        if job is None:
+            return Response({'detail': "No such import."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import Course, Enrollment
+from .models import Course, Enrollment, WaitlistEntry, SessionAttendance
+from .enrollment_service import sync_seat_counts
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('title', 'teacher', 'is_published', 'created_at', 'updated_at')
+    list_display = ('title', 'teacher', 'is_published', 'capacity', 'seats_taken', 'created_at', 'updated_at')
     list_filter = ('is_published', 'teacher')
     search_fields = ('title', 'description', 'teacher__email', 'teacher__first_name', 'teacher__last_name')
     autocomplete_fields = ['teacher'] # Assuming UserAdmin has search_fields configured
@@ -11,7 +12,9 @@ class CourseAdmin(admin.ModelAdmin):
     fieldsets = (
         (None, {'fields': ('title', 'description', 'teacher')}),
         ('Details', {'fields': ('syllabus', 'is_published')}),
+        ('Capacity', {'fields': ('capacity', 'seats_taken')}),
     )
+    readonly_fields = ('seats_taken',)
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
@@ -23,3 +26,40 @@ class EnrollmentAdmin(admin.ModelAdmin):
     # To make student and course fields searchable for autocomplete,
     # ensure their respective UserAdmin and CourseAdmin have search_fields defined.
     # For UserAdmin, we already configured this in the accounts app.
+
+    # Enrollments edited here bypass the enrollment service, so recount the affected seats.
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        course_ids = {obj.course_id}
+        if change and 'course' in form.changed_data:
+            course_ids.add(form.initial['course']) # Moved from another course
+        sync_seat_counts(course_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        sync_seat_counts([obj.course_id])
+
+    def delete_queryset(self, request, queryset):
+        course_ids = set(queryset.values_list('course_id', flat=True))
+        super().delete_queryset(request, queryset)
+        sync_seat_counts(course_ids)
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'created_at')
+    list_filter = ('course',)
+    search_fields = ('student__email', 'course__title')
+    autocomplete_fields = ['student', 'course']
+
+@admin.register(SessionAttendance)
+class SessionAttendanceAdmin(admin.ModelAdmin):
+    # Maintained by the rollup_attendance command; read-only here.
+    list_display = ('student', 'live_session', 'join_count', 'total_seconds', 'first_joined_at', 'last_left_at')
+    search_fields = ('student__email', 'live_session__title')
+    list_select_related = ('student', 'live_session__course')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AttendanceEvent, AttendanceRollupCheckpoint, SessionAttendance, SessionAttendanceSummary
+
+logger = logging.getLogger(__name__)
+
+# A class starting or ending connects or disconnects every student within seconds, so
+# events are buffered and inserted together: one INSERT per batch instead of one per socket.
+WRITER_BATCH_SIZE = 200
+WRITER_FLUSH_DELAY = 2.0 # Seconds an event may wait for a batch to fill
+ROLLUP_BATCH_SIZE = 5000
+# Events younger than this are left for the next run. Event IDs are allocated at insert
+# but become visible at commit, so a concurrently inserting writer could still add rows
+# with IDs below the newest visible one; the checkpoint must not move past those.
+ROLLUP_SETTLE_SECONDS = 60
+
+
+class AttendanceWriter:
+    """
+    Buffers attendance events in the event loop and writes them with bulk_create, either
+    when WRITER_BATCH_SIZE events are waiting or WRITER_FLUSH_DELAY after the first one.
+    Recording never waits for the database unless it fills a batch.
+
+    The buffer lives in the worker process, so events still buffered when it is killed
+    are lost; a graceful shutdown or an idle period flushes them. A failed write is logged
+    and its events go back to the front of the buffer for the next flush.
+    """
+
+    def __init__(self, batch_size=WRITER_BATCH_SIZE, flush_delay=WRITER_FLUSH_DELAY):
+        self.batch_size = batch_size
+        self.flush_delay = flush_delay
+        self.pending = []
+        self.flush_task = None
+
+    async def record(self, live_session_id, student_id, kind, duration_seconds=None):
+        self.pending.append(AttendanceEvent(
+            live_session_id=live_session_id,
+            student_id=student_id,
+            kind=kind,
+            occurred_at=timezone.now(),
+            duration_seconds=duration_seconds,
+        ))
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        elif self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        await self.flush()
+
+    async def flush(self):
+        events, self.pending = self.pending, []
+        if not events:
+            return
+        try:
+            await database_sync_to_async(AttendanceEvent.objects.bulk_create)(events)
+        except Exception:
+            logger.exception("Writing %d attendance events failed; they will be retried.", len(events))
+            self.pending[:0] = events
+            if self.flush_task is None or self.flush_task.done() or self.flush_task is asyncio.current_task():
+                self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def wait_for_flush(self):
+        """Waits until the scheduled flush has run, without cancelling it if the caller is cancelled."""
+        task = self.flush_task
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            await asyncio.shield(task)
+
+
+attendance_writer = AttendanceWriter()
+
+
+def rollup_attendance(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Folds attendance events appended since the last run into SessionAttendance and
+    SessionAttendanceSummary, a batch at a time. Each batch is one transaction covering
+    the rollups and the checkpoint, so a failed run simply resumes where it stopped and
+    no event is counted twice. Returns the number of events processed.
+    """
+    processed = 0
+    cutoff = timezone.now() - timedelta(seconds=ROLLUP_SETTLE_SECONDS)
+    while True:
+        with transaction.atomic():
+            # The row lock keeps two concurrent runs from folding in the same events.
+            checkpoint, _ = AttendanceRollupCheckpoint.objects.select_for_update().get_or_create(pk=1)
+            events = []
+            for event in AttendanceEvent.objects.filter(pk__gt=checkpoint.last_event_id).order_by('pk')[:batch_size]:
+                if event.occurred_at >= cutoff:
+                    break # Stop at the first unsettled event; nothing after it is folded in yet
+                events.append(event)
+            if not events:
+                return processed
+            _fold_events(events)
+            checkpoint.last_event_id = events[-1].pk
+            checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+        processed += len(events)
+
+
+def _fold_events(events):
+    keys = {(event.live_session_id, event.student_id) for event in events}
+    session_ids = {session_id for session_id, _ in keys}
+
+    # Existing rollups for the batch's sessions, two queries; narrowed to the batch's pairs.
+    attendance = {
+        (row.live_session_id, row.student_id): row
+        for row in SessionAttendance.objects.filter(live_session_id__in=session_ids)
+        if (row.live_session_id, row.student_id) in keys
+    }
+    summaries = SessionAttendanceSummary.objects.in_bulk(session_ids)
+    existing_attendance = list(attendance.values())
+    existing_summaries = list(summaries.values())
+
+    new_attendance = []
+    for session_id, student_id in keys - attendance.keys():
+        row = SessionAttendance(live_session_id=session_id, student_id=student_id)
+        attendance[session_id, student_id] = row
+        new_attendance.append(row)
+    new_summaries = []
+    for session_id in session_ids - summaries.keys():
+        summaries[session_id] = SessionAttendanceSummary(live_session_id=session_id)
+        new_summaries.append(summaries[session_id])
+
+    for row in new_attendance:
+        summaries[row.live_session_id].attendee_count += 1
+    for event in events:
+        row = attendance[event.live_session_id, event.student_id]
+        summary = summaries[event.live_session_id]
+        if event.kind == AttendanceEvent.JOIN:
+            row.join_count += 1
+            summary.join_count += 1
+            if row.first_joined_at is None or event.occurred_at < row.first_joined_at:
+                row.first_joined_at = event.occurred_at
+        else:
+            seconds = event.duration_seconds or 0
+            row.total_seconds += seconds
+            summary.total_seconds += seconds
+            if row.last_left_at is None or event.occurred_at > row.last_left_at:
+                row.last_left_at = event.occurred_at
+
+    SessionAttendance.objects.bulk_create(new_attendance)
+    SessionAttendance.objects.bulk_update(
+        existing_attendance,
+        ['join_count', 'total_seconds', 'first_joined_at', 'last_left_at'],
+    )
+    now = timezone.now()
+    for summary in existing_summaries:
+        summary.updated_at = now # bulk_update doesn't apply auto_now
+    SessionAttendanceSummary.objects.bulk_create(new_summaries)
+    SessionAttendanceSummary.objects.bulk_update(
+        existing_summaries,
+        ['attendee_count', 'join_count', 'total_seconds', 'updated_at'],
+    )
@@ -1,8 +1,11 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.utils import timezone
 from django.contrib.auth.models import AnonymousUser # For type hinting if user is not authenticated
-from .models import LiveSession, Enrollment # Import necessary models
+from .models import Course, LiveSession, Enrollment # Import necessary models
+from .notifications import course_group_name, user_group_name
+from .attendance import attendance_writer
 
 class SignalingConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -30,7 +33,11 @@ class SignalingConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
+        await self.accept(subprotocol=self.scope.get('auth_subprotocol')) # Echo the token subprotocol if used
+        if self.user.role == 'student':
+            # Buffered and written in batches; see courses.attendance.
+            self.connected_at = timezone.now()
+            await attendance_writer.record(self.live_session.pk, self.user.pk, 'join')
         print(f"User {self.user} connected to room {self.room_id} (LiveSession status: {self.live_session.status}), group {self.room_group_name}")
 
     @database_sync_to_async
@@ -77,6 +84,12 @@ class SignalingConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             print(f"User {self.scope.get('user')} disconnected from room {self.room_id}")
+        if hasattr(self, 'connected_at'):
+            duration = int((timezone.now() - self.connected_at).total_seconds())
+            await attendance_writer.record(self.live_session.pk, self.user.pk, 'leave', duration_seconds=duration)
+            # A graceful shutdown disconnects every socket; waiting here keeps the worker
+            # alive until the buffered events are written. Sockets leaving together share one flush.
+            await attendance_writer.wait_for_flush()
 
     async def receive(self, text_data):
         """
@@ -119,3 +132,56 @@ class SignalingConsumer(AsyncWebsocketConsumer):
     # @database_sync_to_async # This was the old example method
     # def is_user_allowed(self, user, room_id):
     # ... (previous example content) ...
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    One socket per signed-in client for course events (live sessions starting and ending).
+
+    On connect the socket joins a group per course the user takes (students) or teaches
+    (teachers), plus the user's own group. A state change is published once to its course
+    group and the channel layer fans it out, so clients no longer poll the REST API.
+    Enrolling or unenrolling while connected updates the course groups through the user's
+    group (see courses.notifications.update_course_subscriptions).
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user', AnonymousUser())
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.groups_joined = {user_group_name(self.user.pk)}
+        self.groups_joined.update(course_group_name(course_id) for course_id in await self.get_course_ids(self.user))
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept(subprotocol=self.scope.get('auth_subprotocol')) # Echo the token subprotocol if used
+
+    @database_sync_to_async
+    def get_course_ids(self, user):
+        if user.role == 'teacher':
+            return list(Course.objects.filter(teacher=user).values_list('pk', flat=True))
+        if user.role == 'student':
+            return list(Enrollment.objects.filter(student=user).values_list('course_id', flat=True))
+        return []
+
+    async def disconnect(self, close_code):
+        for group in getattr(self, 'groups_joined', ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        pass # Server-to-client only
+
+    async def course_event(self, event):
+        # Already JSON-encoded by the publisher, once for every recipient.
+        await self.send(text_data=event['payload'])
+
+    async def subscriptions_update(self, event):
+        for course_id in event['subscribe']:
+            group = course_group_name(course_id)
+            self.groups_joined.add(group)
+            await self.channel_layer.group_add(group, self.channel_name)
+        for course_id in event['unsubscribe']:
+            group = course_group_name(course_id)
+            self.groups_joined.discard(group)
+            await self.channel_layer.group_discard(group, self.channel_name)
@@ -0,0 +1,237 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Course, Enrollment, WaitlistEntry
+from .notifications import update_course_subscriptions
+
+User = get_user_model()
+
+# Pairs are validated and inserted this many at a time, keeping each IN (...) list and
+# INSERT statement a reasonable size however long the registrar feed is.
+DEFAULT_BATCH_SIZE = 1000
+
+
+class EnrollmentError(Exception):
+    """
+    Raised when an enrollment cannot be made. `code` identifies the reason
+    so views can map it to a response status.
+    """
+    def __init__(self, detail, code):
+        super().__init__(detail)
+        self.detail = detail
+        self.code = code
+
+
+def sync_seat_counts(course_ids):
+    """
+    Recounts Course.seats_taken from the enrollments, in one UPDATE. Used after writes that
+    don't go through the per-seat claim (bulk imports, the admin).
+    """
+    enrolled = Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course').annotate(
+        total=Count('*')
+    ).values('total')
+    Course.objects.filter(pk__in=course_ids).update(
+        seats_taken=Coalesce(Subquery(enrolled, output_field=IntegerField()), 0)
+    )
+
+
+class EnrollmentService:
+    """
+    Enrolls and unenrolls students, enforcing course capacity with a waitlist.
+
+    Seats: Course.seats_taken is a counter, changed only under that course's row lock, so
+    concurrent registrations can never overfill a course. The waitlist is first come, first
+    served: while anyone is queued, new registrants join the back of the queue, and a seat
+    freed by an unenrollment (or a capacity increase) goes to the front of the queue in
+    the same transaction that freed it.
+
+    Bulk: every check is set-based. Per batch, one query loads the students, one the
+    courses and one the existing enrollments among the pairs, and the new rows go in with
+    a single bulk INSERT ... ON CONFLICT DO NOTHING on the (student, course) unique key.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def enroll(self, student, course, waitlist=True):
+        """
+        Enrolls `student` in `course` if a seat is free and nobody is queued for it, and
+        returns the Enrollment. Otherwise returns the student's WaitlistEntry, or raises
+        EnrollmentError('course_full') when `waitlist` is False.
+        """
+        with transaction.atomic():
+            locked = self._lock_course(course.pk)
+            queued = WaitlistEntry.objects.filter(course_id=course.pk).exists()
+            if not queued and (locked.capacity is None or locked.seats_taken < locked.capacity):
+                try:
+                    with transaction.atomic():
+                        enrollment = Enrollment.objects.create(student=student, course=course)
+                except IntegrityError:
+                    raise EnrollmentError("This student is already enrolled in this course.", 'already_enrolled')
+                Course.objects.filter(pk=course.pk).update(seats_taken=F('seats_taken') + 1)
+                update_course_subscriptions(student.pk, subscribe=[course.pk])
+                return enrollment
+
+            if Enrollment.objects.filter(student=student, course=course).exists():
+                raise EnrollmentError("This student is already enrolled in this course.", 'already_enrolled')
+            if not waitlist:
+                raise EnrollmentError("This course is full.", 'course_full')
+            # Joins the back of the queue; any free seats go to the students ahead first.
+            entry, _ = WaitlistEntry.objects.get_or_create(course=course, student=student)
+            self._promote(locked)
+            return Enrollment.objects.filter(student=student, course=course).first() or entry
+
+    def unenroll(self, enrollment):
+        """Deletes an enrollment and hands its seat to the next waitlisted student, in one transaction."""
+        with transaction.atomic():
+            locked = self._lock_course(enrollment.course_id)
+            deleted, _ = Enrollment.objects.filter(pk=enrollment.pk).delete()
+            if deleted:
+                Course.objects.filter(pk=enrollment.course_id, seats_taken__gt=0).update(
+                    seats_taken=F('seats_taken') - 1
+                )
+                locked.seats_taken = max(locked.seats_taken - 1, 0)
+                update_course_subscriptions(enrollment.student_id, unsubscribe=[enrollment.course_id])
+                self._promote(locked)
+
+    def promote_waitlist(self, course_id):
+        """
+        Fills a course's free seats from the front of its waitlist, in one bulk insert.
+        Returns the promoted students' IDs.
+        """
+        with transaction.atomic():
+            return self._promote(self._lock_course(course_id))
+
+    @staticmethod
+    def _lock_course(course_id):
+        # Every seat change of a course runs under this row lock, so a freed seat is always
+        # handed to the front of the waitlist before anyone else can claim it. Only this
+        # course's row is locked; other courses are unaffected.
+        return Course.objects.select_for_update().only('capacity', 'seats_taken').get(pk=course_id)
+
+    def _promote(self, course):
+        """Promotes from `course`'s waitlist; the caller holds the course row lock."""
+        entries = WaitlistEntry.objects.filter(course_id=course.pk).order_by('created_at', 'id')
+        if course.capacity is not None:
+            free = course.capacity - course.seats_taken
+            if free <= 0:
+                return []
+            entries = entries[:free]
+        entries = list(entries.values_list('pk', 'student_id'))
+        if not entries:
+            return []
+
+        already_enrolled = set(Enrollment.objects.filter(
+            course_id=course.pk, student_id__in=[student_id for _, student_id in entries]
+        ).values_list('student_id', flat=True))
+        promoted = [student_id for _, student_id in entries if student_id not in already_enrolled]
+        # ignore_conflicts: enrollments made outside the lock (bulk imports, paid access)
+        # may still collide; the recount below keeps seats_taken exact either way.
+        Enrollment.objects.bulk_create(
+            [Enrollment(student_id=student_id, course_id=course.pk) for student_id in promoted],
+            ignore_conflicts=True,
+        )
+        WaitlistEntry.objects.filter(pk__in=[pk for pk, _ in entries]).delete()
+        sync_seat_counts([course.pk])
+        for student_id in promoted:
+            update_course_subscriptions(student_id, subscribe=[course.pk])
+        return promoted
+
+    def bulk_enroll(self, pairs, by_user=None):
+        """
+        Enrolls each (student_id, course_id) pair. `by_user` limits a teacher to their own
+        courses; staff and registrar imports (by_user=None) may enroll in any course.
+        Bulk enrollment is an administrative override: it does not stop at capacity, but
+        seat counts are brought up to date afterwards.
+
+        Returns {'created': [[student, course], ...], 'duplicates': [...],
+                 'rejected': [{'student', 'course', 'reason'}, ...]}.
+        """
+        result = {'created': [], 'duplicates': [], 'rejected': []}
+        # Repeats within the request count as duplicates of their first occurrence.
+        seen = set()
+        unique_pairs = []
+        for pair in pairs:
+            pair = (int(pair[0]), int(pair[1]))
+            if pair in seen:
+                result['duplicates'].append(list(pair))
+            else:
+                seen.add(pair)
+                unique_pairs.append(pair)
+
+        for start in range(0, len(unique_pairs), self.batch_size):
+            self._enroll_batch(unique_pairs[start:start + self.batch_size], by_user, result)
+        return result
+
+    def _enroll_batch(self, pairs, by_user, result):
+        student_ids = {student_id for student_id, _ in pairs}
+        course_ids = {course_id for _, course_id in pairs}
+
+        students = dict(
+            User.objects.filter(pk__in=student_ids, is_active=True).values_list('pk', 'role')
+        )
+        courses = {
+            pk: (is_published, teacher_id)
+            for pk, is_published, teacher_id in Course.objects.filter(pk__in=course_ids).order_by().values_list(
+                'pk', 'is_published', 'teacher_id'
+            )
+        }
+        # A superset of the existing pairs (every student x every course in the batch),
+        # narrowed down to the actual pairs in Python.
+        existing = set(
+            Enrollment.objects.filter(student_id__in=student_ids, course_id__in=course_ids).order_by().values_list(
+                'student_id', 'course_id'
+            )
+        )
+        restrict_to_teacher = by_user is not None and not by_user.is_staff
+
+        new_pairs = []
+        for student_id, course_id in pairs:
+            reason = None
+            if students.get(student_id) != 'student':
+                reason = "No active student with this ID."
+            elif course_id not in courses:
+                reason = "No course with this ID."
+            elif not courses[course_id][0]:
+                reason = "Cannot enroll in an unpublished course."
+            elif restrict_to_teacher and courses[course_id][1] != by_user.pk:
+                reason = "You can only enroll students in courses you teach."
+
+            if reason:
+                result['rejected'].append({'student': student_id, 'course': course_id, 'reason': reason})
+            elif (student_id, course_id) in existing:
+                result['duplicates'].append([student_id, course_id])
+            else:
+                new_pairs.append((student_id, course_id))
+
+        if not new_pairs:
+            return
+        # ignore_conflicts covers enrollments made concurrently since the check above;
+        # those are still reported as created, since the pair is enrolled either way.
+        with transaction.atomic():
+            Enrollment.objects.bulk_create(
+                [Enrollment(student_id=student_id, course_id=course_id) for student_id, course_id in new_pairs],
+                ignore_conflicts=True,
+            )
+            # Enrolled students no longer wait for those courses. Like `existing` above, the
+            # entries are read by a students x courses superset and narrowed in Python: one
+            # OR'd condition per pair would exceed SQLite's expression depth limit at ~1000 pairs.
+            enrolled = set(new_pairs)
+            waitlisted = [
+                pk for pk, student_id, course_id in WaitlistEntry.objects.filter(
+                    student_id__in={student_id for student_id, _ in new_pairs},
+                    course_id__in={course_id for _, course_id in new_pairs},
+                ).values_list('pk', 'student_id', 'course_id')
+                if (student_id, course_id) in enrolled
+            ]
+            if waitlisted:
+                WaitlistEntry.objects.filter(pk__in=waitlisted).delete()
+            sync_seat_counts({course_id for _, course_id in new_pairs})
+            courses_by_student = {}
+            for student_id, course_id in new_pairs:
+                courses_by_student.setdefault(student_id, []).append(course_id)
+            for student_id, course_ids in courses_by_student.items():
+                update_course_subscriptions(student_id, subscribe=course_ids)
+        result['created'].extend([list(pair) for pair in new_pairs])
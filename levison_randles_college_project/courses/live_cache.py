@@ -0,0 +1,34 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# The "live now" feed is polled every few seconds by every student in class, so each
+# user's feed is cached under the current live-sessions version. Starting, ending,
+# creating or deleting a session moves the version on, making every cached feed stale
+# at once; the short timeout bounds how long an enrollment change takes to show up.
+LIVE_VERSION_KEY = 'courses:live:version'
+LIVE_FEED_TIMEOUT = 30
+
+
+def live_version():
+    version = cache.get(LIVE_VERSION_KEY)
+    if version is None:
+        cache.add(LIVE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(LIVE_VERSION_KEY)
+    return version
+
+
+def invalidate_live_sessions():
+    """Marks every cached feed stale once the surrounding transaction commits."""
+    transaction.on_commit(lambda: cache.set(LIVE_VERSION_KEY, time.time_ns(), None))
+
+
+def get_live_feed(user, build):
+    """Returns the cached feed for `user`, calling `build()` to produce it on a miss."""
+    key = f'courses:live:{live_version()}:{user.pk}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, LIVE_FEED_TIMEOUT)
+    return data
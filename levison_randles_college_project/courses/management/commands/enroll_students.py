@@ -0,0 +1,40 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.enrollment_service import DEFAULT_BATCH_SIZE, EnrollmentService
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-enrolls students from a registrar feed: a CSV with 'student' and 'course' ID columns. "
+        "Already-enrolled pairs are reported as duplicates; invalid pairs are listed with a reason "
+        "and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="CSV file to load, or '-' for stdin.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            if options['csv_file'] == '-':
+                pairs = self.read_pairs(sys.stdin)
+            else:
+                with open(options['csv_file'], newline='', encoding='utf-8-sig') as f:
+                    pairs = self.read_pairs(f)
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Could not read enrollments: {e}")
+
+        result = EnrollmentService(batch_size=options['batch_size']).bulk_enroll(pairs)
+        for rejected in result['rejected']:
+            self.stderr.write(f"student {rejected['student']}, course {rejected['course']}: {rejected['reason']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Enrolled {len(result['created'])}; {len(result['duplicates'])} already enrolled; "
+            f"{len(result['rejected'])} rejected."
+        ))
+
+    @staticmethod
+    def read_pairs(stream):
+        return [(int(row['student']), int(row['course'])) for row in csv.DictReader(stream)]
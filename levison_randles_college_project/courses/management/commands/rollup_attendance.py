@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.attendance import ROLLUP_BATCH_SIZE, rollup_attendance
+
+
+class Command(BaseCommand):
+    help = (
+        "Folds live-session attendance events recorded since the last run into the per-session "
+        "and per-student attendance rollups. Incremental and safe to run as often as wanted, "
+        "e.g. every minute from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        processed = rollup_attendance(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} attendance events."))
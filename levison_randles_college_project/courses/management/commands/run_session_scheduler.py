@@ -0,0 +1,32 @@
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.core.management.base import BaseCommand
+
+from courses.scheduler import SessionScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the live-session scheduler: reminds courses of upcoming scheduled sessions and starts "
+        "(or announces) them when due. Run a single instance; it sleeps until the next due session."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--auto-start', action='store_true', default=None,
+            help="Start due sessions automatically (default: settings.LIVE_SESSION_AUTO_START)."
+        )
+
+    def handle(self, *args, **options):
+        scheduler = SessionScheduler(auto_start=options['auto_start'])
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            # Events would only reach sockets inside this process, i.e. none.
+            self.stderr.write(self.style.WARNING(
+                "CHANNEL_LAYERS uses the in-memory layer, which is not shared with the ASGI server: "
+                "clients will not be notified. Configure a shared layer such as channels_redis."
+            ))
+        mode = "starting" if scheduler.auto_start else "announcing"
+        self.stdout.write(f"Session scheduler running, {mode} due sessions. Ctrl-C to stop.")
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_livesession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['title'], name='course_published_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['teacher', 'is_published'], name='course_teacher_published_idx'),
+        ),
+        # The teacher FK's own index goes only once the composite index leading with teacher exists.
+        migrations.AlterField(
+            model_name='course',
+            name='teacher',
+            field=models.ForeignKey(db_index=False, help_text='The teacher offering this course.', limit_choices_to={'role': 'teacher'}, on_delete=django.db.models.deletion.CASCADE, related_name='courses_taught', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
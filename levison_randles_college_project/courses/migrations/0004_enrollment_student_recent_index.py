@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_visibility_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'enrolled_at'], name='enrollment_student_recent_idx'),
+        ),
+        # The student FK's own index goes only once the composite index leading with student exists.
+        migrations.AlterField(
+            model_name='enrollment',
+            name='student',
+            field=models.ForeignKey(db_index=False, help_text='The student enrolled in the course.', limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_seats_taken(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    enrolled = Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course').annotate(
+        total=Count('*')
+    ).values('total')
+    Course.objects.update(seats_taken=Coalesce(Subquery(enrolled, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_enrollment_student_recent_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum number of enrolled students. Leave empty for unlimited.', null=True, verbose_name='capacity'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of enrolled students. Maintained by the enrollment service.', verbose_name='seats taken'),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='joined at')),
+                ('course', models.ForeignKey(db_index=False, help_text='The course the student is waiting for.', on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='courses.course')),
+                ('student', models.ForeignKey(help_text='The waiting student.', limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Waitlist Entry',
+                'verbose_name_plural': 'Waitlist Entries',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['course', 'created_at', 'id'], name='waitlist_course_queue_idx')],
+                'constraints': [models.UniqueConstraint(fields=('course', 'student'), name='waitlist_unique_course_student')],
+            },
+        ),
+        migrations.RunPython(backfill_seats_taken, migrations.RunPython.noop),
+    ]
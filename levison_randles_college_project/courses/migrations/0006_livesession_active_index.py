@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_course_capacity_and_waitlist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livesession',
+            index=models.Index(condition=models.Q(('status__in', ('pending', 'live'))), fields=['course', 'status'], name='livesession_active_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_livesession_active_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceRollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SessionAttendanceSummary',
+            fields=[
+                ('live_session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='attendance_summary', serialize=False, to='courses.livesession')),
+                ('attendee_count', models.PositiveIntegerField(default=0, verbose_name='students attended')),
+                ('join_count', models.PositiveIntegerField(default=0, verbose_name='joins')),
+                ('total_seconds', models.PositiveIntegerField(default=0, verbose_name='time attended (seconds)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Session Attendance Summary',
+                'verbose_name_plural': 'Session Attendance Summaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='AttendanceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('join', 'Joined'), ('leave', 'Left')], max_length=5, verbose_name='kind')),
+                ('occurred_at', models.DateTimeField(verbose_name='occurred at')),
+                ('duration_seconds', models.PositiveIntegerField(blank=True, null=True, verbose_name='duration (seconds)')),
+                ('live_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_events', to='courses.livesession')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Attendance Event',
+                'verbose_name_plural': 'Attendance Events',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SessionAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('join_count', models.PositiveIntegerField(default=0, verbose_name='times joined')),
+                ('total_seconds', models.PositiveIntegerField(default=0, verbose_name='time attended (seconds)')),
+                ('first_joined_at', models.DateTimeField(blank=True, null=True, verbose_name='first joined at')),
+                ('last_left_at', models.DateTimeField(blank=True, null=True, verbose_name='last left at')),
+                ('live_session', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attendance', to='courses.livesession')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_attendance', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Session Attendance',
+                'verbose_name_plural': 'Session Attendance',
+                'ordering': ['live_session', 'student'],
+                'constraints': [models.UniqueConstraint(fields=('live_session', 'student'), name='attendance_unique_session_student')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:40
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_live_session_attendance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livesession',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=60, help_text='Planned length; scheduled sessions of a course may not overlap.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(480)], verbose_name='duration (minutes)'),
+        ),
+        migrations.AddField(
+            model_name='livesession',
+            name='scheduled_for',
+            field=models.DateTimeField(blank=True, help_text='When the session is planned to start. Unscheduled sessions are started by hand.', null=True, verbose_name='scheduled for'),
+        ),
+        migrations.AddIndex(
+            model_name='livesession',
+            index=models.Index(fields=['course', 'scheduled_for'], name='livesession_schedule_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livesession',
+            index=models.Index(fields=['status', 'scheduled_for'], name='livesession_due_idx'),
+        ),
+        # After livesession_schedule_idx exists, which makes the FK's own index redundant.
+        migrations.AlterField(
+            model_name='livesession',
+            name='course',
+            field=models.ForeignKey(db_index=False, help_text='The course this live session belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='live_sessions', to='courses.course'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_livesession_schedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='livesession',
+            name='livesession_active_idx',
+        ),
+        migrations.AddIndex(
+            model_name='livesession',
+            index=models.Index(condition=models.Q(('status', 'ended'), _negated=True), fields=['course', 'status'], name='livesession_active_idx'),
+        ),
+    ]
@@ -1,7 +1,76 @@
 from django.db import models
+from django.db.models import BooleanField, Count, DateTimeField, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils.translation import gettext_lazy as _
 
+from levison_randles_college_project.state_machine import StateMachine
+
+class CourseQuerySet(models.QuerySet):
+    """
+    The one place that decides which courses a user may see, and how a course list is loaded.
+    Each role's filter is written to match one of Course's indexes:
+    - anonymous users and students: is_published, ordered by title -> title WHERE is_published
+    - teachers: their own unpublished courses UNION the above -> (teacher, is_published) and the above
+    - staff: everything
+    """
+
+    def published(self):
+        return self.filter(is_published=True)
+
+    def visible_to(self, user):
+        if not user.is_authenticated:
+            return self.published()
+        if user.is_staff:
+            return self.all()
+        if user.role == 'teacher':
+            # Not one OR'd WHERE clause, which SQLite answers with a scan: two disjoint branches,
+            # each read from its own index, combined with UNION ALL. The IDs are a subquery so
+            # the result stays an ordinary queryset that can be annotated and ordered.
+            own_drafts = self.filter(teacher=user, is_published=False).order_by().values('pk')
+            published = self.published().order_by().values('pk')
+            return self.filter(pk__in=own_drafts.union(published, all=True))
+        return self.published()
+
+    def for_listing(self):
+        """Loads everything CourseSerializer renders, so serializing the list issues no queries."""
+        # A correlated COUNT (served by the enrollment course_id index) rather than JOIN + GROUP BY,
+        # which would stop the course indexes from providing the title ordering.
+        enrolled_count = Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course').annotate(
+            total=Count('*')
+        ).values('total')
+        return self.select_related('teacher').annotate(
+            enrolled_students_count=Coalesce(Subquery(enrolled_count), 0)
+        )
+
+    def with_enrollment_of(self, user):
+        """
+        Annotates `is_enrolled` and `enrolled_at` for `user` on every course, in the same query.
+        Both are lookups on the unique (student, course) index.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_enrolled=Value(False, output_field=BooleanField()),
+                enrolled_at=Value(None, output_field=DateTimeField()),
+            )
+        enrollment = Enrollment.objects.filter(course=OuterRef('pk'), student=user)
+        return self.annotate(
+            is_enrolled=Exists(enrollment),
+            enrolled_at=Subquery(enrollment.values('enrolled_at')[:1]),
+        )
+
+    def enrolled_by(self, student):
+        """
+        A student's courses, most recently enrolled first, with the same annotations as
+        with_enrollment_of(). Read off the (student, enrolled_at) enrollment index.
+        """
+        return self.filter(enrolled_students__student=student).annotate(
+            is_enrolled=Value(True, output_field=BooleanField()),
+            enrolled_at=F('enrolled_students__enrolled_at'),
+        ).order_by('-enrolled_at')
+
+
 class Course(models.Model):
     title = models.CharField(_("title"), max_length=200)
     description = models.TextField(_("description"))
@@ -10,6 +79,7 @@ class Course(models.Model):
         on_delete=models.CASCADE, # Or models.SET_NULL if a course can exist without a teacher
         related_name='courses_taught',
         limit_choices_to={'role': 'teacher'},
+        db_index=False, # Covered by course_teacher_published_idx, which leads with teacher
         help_text=_("The teacher offering this course.")
     )
     syllabus = models.TextField(_("syllabus"), blank=True, help_text=_("Course syllabus or outline."))
@@ -18,16 +88,55 @@ class Course(models.Model):
         default=False,
         help_text=_("Whether the course is visible to students.")
     )
+    capacity = models.PositiveIntegerField(
+        _("capacity"),
+        null=True,
+        blank=True,
+        help_text=_("Maximum number of enrolled students. Leave empty for unlimited.")
+    )
+    seats_taken = models.PositiveIntegerField(
+        _("seats taken"),
+        default=0,
+        editable=False,
+        help_text=_("Number of enrolled students. Maintained by the enrollment service.")
+    )
     created_at = models.DateTimeField(_("created at"), auto_now_add=True)
     updated_at = models.DateTimeField(_("updated at"), auto_now=True)
 
+    objects = CourseQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # seats_taken is only changed through conditional F() updates by the enrollment
+        # service. A full-row save (e.g. publishing) must not write back a stale copy.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'seats_taken'
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def seats_available(self):
+        """Free seats, or None for a course without a capacity limit."""
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.seats_taken, 0)
+
     class Meta:
         verbose_name = _("Course")
         verbose_name_plural = _("Courses")
         ordering = ['title']
+        indexes = [
+            # Published catalog in its default order (see CourseQuerySet). Partial rather than
+            # composite on (is_published, title): it only holds catalog rows, and SQLite can only
+            # match `WHERE is_published` (how Django writes is_published=True) to an index condition.
+            models.Index(fields=['title'], condition=Q(is_published=True), name='course_published_title_idx'),
+            # A teacher's own courses, by publication state.
+            models.Index(fields=['teacher', 'is_published'], name='course_teacher_published_idx'),
+        ]
 
 class Enrollment(models.Model):
     student = models.ForeignKey(
@@ -35,6 +144,7 @@ class Enrollment(models.Model):
         on_delete=models.CASCADE,
         related_name='enrollments',
         limit_choices_to={'role': 'student'},
+        db_index=False, # Covered by the (student, course) unique index and enrollment_student_recent_idx
         help_text=_("The student enrolled in the course.")
     )
     course = models.ForeignKey(
@@ -53,8 +163,122 @@ class Enrollment(models.Model):
         verbose_name_plural = _("Enrollments")
         unique_together = ('student', 'course') # Ensures a student can only enroll once in the same course
         ordering = ['-enrolled_at']
+        indexes = [
+            # A student's enrollments, newest first ("my courses").
+            models.Index(fields=['student', 'enrolled_at'], name='enrollment_student_recent_idx'),
+        ]
+
+class WaitlistEntryQuerySet(models.QuerySet):
+    def with_position(self):
+        """
+        Annotates queue_position (see WaitlistEntry.position) in the same query: one
+        correlated count per entry, each a range of waitlist_course_queue_idx.
+        """
+        ahead = WaitlistEntry.objects.filter(course_id=OuterRef('course_id')).filter(
+            Q(created_at__lt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), pk__lt=OuterRef('pk'))
+        ).order_by().values('course_id').annotate(total=Count('*')).values('total')
+        return self.annotate(queue_position=Coalesce(Subquery(ahead), 0) + 1)
+
+
+class WaitlistEntry(models.Model):
+    """A student waiting for a seat in a full course. Served first come, first served."""
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='waitlist',
+        db_index=False, # Covered by waitlist_course_queue_idx, which leads with course
+        help_text=_("The course the student is waiting for.")
+    )
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries',
+        limit_choices_to={'role': 'student'},
+        help_text=_("The waiting student.")
+    )
+    created_at = models.DateTimeField(_("joined at"), auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.student} waiting for {self.course}"
+
+    objects = WaitlistEntryQuerySet.as_manager()
+
+    @property
+    def position(self):
+        """1-based place in the queue; WaitlistEntry.objects.with_position() loads it for many entries."""
+        if getattr(self, 'queue_position', None) is not None:
+            return self.queue_position
+        return WaitlistEntry.objects.filter(course_id=self.course_id).filter(
+            Q(created_at__lt=self.created_at) | Q(created_at=self.created_at, pk__lt=self.pk)
+        ).count() + 1
+
+    class Meta:
+        verbose_name = _("Waitlist Entry")
+        verbose_name_plural = _("Waitlist Entries")
+        ordering = ['created_at', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'student'], name='waitlist_unique_course_student'),
+        ]
+        indexes = [
+            # Next students in line for a course (promotion reads this in order).
+            models.Index(fields=['course', 'created_at', 'id'], name='waitlist_course_queue_idx'),
+        ]
 
 import uuid
+from datetime import timedelta
+
+# Upper bound on a scheduled session's length. Besides keeping schedules sane, it bounds
+# the overlap check to an index range: only sessions scheduled to start less than this
+# long before a new one can still be running when it starts.
+MAX_SESSION_MINUTES = 8 * 60
+
+
+class LiveSessionQuerySet(models.QuerySet):
+    """Which live sessions a user may see; see CourseQuerySet for the course equivalent."""
+
+    # Pending or live. Spelled as "not ended" rather than status IN (...): SQLite can only
+    # match a partial index condition against a query parameter by equality, so with the
+    # statuses as parameters an IN never qualifies for livesession_active_idx.
+    ACTIVE_CONDITION = ~Q(status='ended')
+
+    def active(self):
+        # Exactly livesession_active_idx's condition, so the partial index applies.
+        return self.filter(self.ACTIVE_CONDITION)
+
+    def visible_to(self, user):
+        if not user.is_authenticated:
+            return self.none()
+        if user.is_staff:
+            return self.all()
+        if user.role == 'teacher':
+            return self.filter(course__teacher=user)
+        if user.role == 'student':
+            # Semi-joined with the student's enrollments in the same query.
+            return self.filter(
+                course_id__in=Enrollment.objects.filter(student=user).values('course_id')
+            ).active()
+        return self.none()
+
+    def for_listing(self):
+        """Loads everything LiveSessionSerializer renders."""
+        return self.select_related('course', 'created_by')
+
+    def overlapping(self, course_id, start, duration_minutes):
+        """
+        The course's pending or live sessions whose scheduled time overlaps
+        [start, start + duration_minutes). Read as one range of livesession_schedule_idx.
+        """
+        end = start + timedelta(minutes=duration_minutes)
+        candidates = self.filter(
+            course_id=course_id,
+            scheduled_for__lt=end,
+            scheduled_for__gt=start - timedelta(minutes=MAX_SESSION_MINUTES),
+        ).active()
+        return [
+            session for session in candidates
+            if session.scheduled_for + timedelta(minutes=session.duration_minutes) > start
+        ]
+
 
 class LiveSession(models.Model):
     STATUS_CHOICES = [
@@ -67,6 +291,7 @@ class LiveSession(models.Model):
         Course,
         on_delete=models.CASCADE,
         related_name='live_sessions',
+        db_index=False, # Covered by livesession_schedule_idx, which leads with course
         help_text=_("The course this live session belongs to.")
     )
     title = models.CharField(_("title"), max_length=200, help_text=_("Title of the live session (e.g., Week 5 Lecture)."))
@@ -85,6 +310,18 @@ class LiveSession(models.Model):
         default='pending',
         help_text=_("Current status of the live session.")
     )
+    scheduled_for = models.DateTimeField(
+        _("scheduled for"),
+        null=True,
+        blank=True,
+        help_text=_("When the session is planned to start. Unscheduled sessions are started by hand.")
+    )
+    duration_minutes = models.PositiveSmallIntegerField(
+        _("duration (minutes)"),
+        default=60,
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_SESSION_MINUTES)],
+        help_text=_("Planned length; scheduled sessions of a course may not overlap.")
+    )
     started_at = models.DateTimeField(_("started at"), null=True, blank=True)
     ended_at = models.DateTimeField(_("ended at"), null=True, blank=True)
     created_by = models.ForeignKey(
@@ -98,6 +335,14 @@ class LiveSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LiveSessionQuerySet.as_manager()
+
+    # pending -> live -> ended, each a conditional UPDATE (see StateMachine).
+    status_machine = StateMachine({
+        'start': (('pending',), 'live'),
+        'end': (('live',), 'ended'),
+    })
+
     def __str__(self):
         return f"{self.title} for {self.course.title} ({self.status})"
 
@@ -105,3 +350,117 @@ class LiveSession(models.Model):
         verbose_name = _("Live Session")
         verbose_name_plural = _("Live Sessions")
         ordering = ['-created_at']
+        indexes = [
+            # Only pending/live sessions, by course: the "live now" feed. Ended sessions,
+            # the vast majority over time, never enter this index.
+            models.Index(
+                fields=['course', 'status'],
+                condition=LiveSessionQuerySet.ACTIVE_CONDITION,
+                name='livesession_active_idx',
+            ),
+            # A course's schedule in time order: the overlap check reads a range of it.
+            models.Index(fields=['course', 'scheduled_for'], name='livesession_schedule_idx'),
+            # Pending sessions by start time: the scheduler reads the next due ones from here.
+            models.Index(fields=['status', 'scheduled_for'], name='livesession_due_idx'),
+        ]
+
+
+class AttendanceEvent(models.Model):
+    """
+    A student joining or leaving a live session's room. Append-only: written in batches by
+    courses.attendance.AttendanceWriter and never updated. Reports read the rollups
+    (SessionAttendance, SessionAttendanceSummary) instead of scanning these rows.
+    """
+    JOIN = 'join'
+    LEAVE = 'leave'
+    KIND_CHOICES = [
+        (JOIN, _('Joined')),
+        (LEAVE, _('Left')),
+    ]
+
+    live_session = models.ForeignKey(
+        LiveSession,
+        on_delete=models.CASCADE,
+        related_name='attendance_events',
+    )
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='attendance_events',
+    )
+    kind = models.CharField(_("kind"), max_length=5, choices=KIND_CHOICES)
+    occurred_at = models.DateTimeField(_("occurred at"))
+    # Set on leave events: how long that connection was open. The socket knows when it
+    # connected, so the rollup never has to pair a leave with its join.
+    duration_seconds = models.PositiveIntegerField(_("duration (seconds)"), null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.student} {self.kind} {self.live_session} at {self.occurred_at}"
+
+    class Meta:
+        verbose_name = _("Attendance Event")
+        verbose_name_plural = _("Attendance Events")
+        ordering = ['id'] # Append order; the rollup consumes events by ID
+
+
+class SessionAttendance(models.Model):
+    """Rolled-up attendance of one student in one live session."""
+    live_session = models.ForeignKey(
+        LiveSession,
+        on_delete=models.CASCADE,
+        related_name='attendance',
+        db_index=False, # Covered by attendance_unique_session_student, which leads with live_session
+    )
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='session_attendance',
+    )
+    join_count = models.PositiveIntegerField(_("times joined"), default=0)
+    total_seconds = models.PositiveIntegerField(_("time attended (seconds)"), default=0)
+    first_joined_at = models.DateTimeField(_("first joined at"), null=True, blank=True)
+    last_left_at = models.DateTimeField(_("last left at"), null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.student} in {self.live_session}: {self.total_seconds}s"
+
+    class Meta:
+        verbose_name = _("Session Attendance")
+        verbose_name_plural = _("Session Attendance")
+        ordering = ['live_session', 'student']
+        constraints = [
+            models.UniqueConstraint(fields=['live_session', 'student'], name='attendance_unique_session_student'),
+        ]
+
+
+class SessionAttendanceSummary(models.Model):
+    """Rolled-up attendance totals of a live session."""
+    live_session = models.OneToOneField(
+        LiveSession,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='attendance_summary',
+    )
+    attendee_count = models.PositiveIntegerField(_("students attended"), default=0)
+    join_count = models.PositiveIntegerField(_("joins"), default=0)
+    total_seconds = models.PositiveIntegerField(_("time attended (seconds)"), default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Attendance of {self.live_session_id}: {self.attendee_count} students"
+
+    class Meta:
+        verbose_name = _("Session Attendance Summary")
+        verbose_name_plural = _("Session Attendance Summaries")
+
+
+class AttendanceRollupCheckpoint(models.Model):
+    """
+    Single row recording the last AttendanceEvent ID folded into the rollups, so each run
+    of the rollup only reads events appended since the previous one.
+    """
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Attendance rolled up to event {self.last_event_id}"
@@ -0,0 +1,67 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+import json
+
+
+def course_group_name(course_id):
+    """Channel layer group of every notification socket subscribed to a course."""
+    return f'course_{course_id}_events'
+
+
+def user_group_name(user_id):
+    """Channel layer group of a user's notification sockets (one per open tab/device)."""
+    return f'user_{user_id}_events'
+
+
+def _send(group, message):
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(group, message)
+
+
+def _send_on_commit(group, message):
+    # Notifications are best effort: robust, so a channel layer outage is logged (by
+    # django.db.backends.base) instead of failing the already-committed request, and
+    # the remaining on-commit callbacks still run.
+    transaction.on_commit(lambda: _send(group, message), robust=True)
+
+
+def publish_session_event(live_session, event_type=None):
+    """
+    Pushes a live session's new state to everyone subscribed to its course: one group
+    send per transition, however many students are listening. Sent after commit, so
+    nobody is told about a change that was rolled back. `event_type` defaults to the
+    session's status; the scheduler also sends 'starting_soon' and 'due'.
+    """
+    event = {
+        'type': f'live_session.{event_type or live_session.status}',
+        'session': {
+            'id': live_session.pk,
+            'course': live_session.course_id,
+            'title': live_session.title,
+            'room_id': str(live_session.room_id),
+            'status': live_session.status,
+            'scheduled_for': live_session.scheduled_for,
+            'started_at': live_session.started_at,
+            'ended_at': live_session.ended_at,
+        },
+    }
+    # Encoded here, once, rather than by every receiving socket.
+    payload = json.dumps(event, cls=DjangoJSONEncoder)
+    _send_on_commit(course_group_name(live_session.course_id), {'type': 'course.event', 'payload': payload})
+
+
+def update_course_subscriptions(user_id, subscribe=(), unsubscribe=()):
+    """
+    Tells a user's open notification sockets to join or leave course groups after an
+    (un)enrollment, or after a teacher creates a course.
+    """
+    subscribe, unsubscribe = list(subscribe), list(unsubscribe)
+    if subscribe or unsubscribe:
+        _send_on_commit(user_group_name(user_id), {
+            'type': 'subscriptions.update',
+            'subscribe': subscribe,
+            'unsubscribe': unsubscribe,
+        })
@@ -33,9 +33,10 @@ class IsCourseOwner(BasePermission):
 
         # Write permissions are only allowed to the teacher of the course.
         # Ensure user is authenticated before checking role and ownership.
+        # Compare ids so neither the course's teacher nor the requesting user row is loaded.
         return request.user.is_authenticated and \
                request.user.role == 'teacher' and \
-               obj.teacher == request.user
+               obj.teacher_id == request.user.pk
 
 class IsEnrollmentOwnerOrCourseTeacher(BasePermission):
     """
@@ -56,7 +57,7 @@ class IsEnrollmentOwnerOrCourseTeacher(BasePermission):
             return True
 
         # Student owns the enrollment (can view, delete their own enrollment)
-        if request.user.role == 'student' and obj.student == request.user:
+        if request.user.role == 'student' and obj.student_id == request.user.pk:
             return True
 
         # Teacher owns the course to which the student is enrolled
@@ -111,4 +112,14 @@ class IsLiveSessionOwnerAndTeacher(BasePermission):
             return False
         # Check if the authenticated user is the one who created the live session.
         # Assumes 'obj' is a LiveSession instance which has a 'created_by' field.
-        return obj.created_by == request.user
+        return obj.created_by_id == request.user.pk
+
+class IsTeacherOrStaff(BasePermission):
+    """
+    Allows access to teachers and staff (e.g. registrars), such as for bulk enrollment.
+    Which courses a teacher may act on is checked by the view or service.
+    """
+    message = "You must be a teacher or staff member to perform this action."
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and (request.user.role == 'teacher' or request.user.is_staff)
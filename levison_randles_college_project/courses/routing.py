@@ -5,4 +5,6 @@ websocket_urlpatterns = [
     # Path for live signaling for a specific room_id
     # Example: ws/live/some-uuid-room-id/
     re_path(r'ws/live/(?P<room_id>[^/]+)/$', consumers.SignalingConsumer.as_asgi()),
+    # Per-user course notifications (live sessions starting/ending), replaces polling live-now
+    re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
 ]
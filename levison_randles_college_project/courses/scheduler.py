@@ -0,0 +1,123 @@
+import heapq
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .live_cache import invalidate_live_sessions
+from .models import LiveSession
+from .notifications import publish_session_event
+
+REMIND = 'remind'
+START = 'start'
+
+
+class SystemClock:
+    def now(self):
+        return timezone.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SessionScheduler:
+    """
+    Reminds students of scheduled live sessions and starts (or announces) them when due.
+
+    Upcoming work is held in a heap ordered by due time, and the process sleeps until the
+    earliest item, not on a fixed tick. The database is only read to refill the heap, once
+    per `refresh_interval`, as one range of livesession_due_idx: pending sessions scheduled
+    within the next `horizon`. Items that fall due together are handled in bulk: one query
+    to re-check them, one UPDATE to start them.
+
+    With `auto_start` (settings.LIVE_SESSION_AUTO_START) due sessions go live on their own;
+    otherwise the course is told the session is due and the teacher starts it. Sessions
+    overdue by more than `stale_after` when first seen are left alone.
+
+    Pass a clock with now() and sleep() to drive it from tests.
+    """
+
+    def __init__(self, clock=None, auto_start=None, reminder_lead=timedelta(minutes=10),
+                 horizon=timedelta(hours=1), refresh_interval=timedelta(minutes=1),
+                 stale_after=timedelta(minutes=15)):
+        self.clock = clock or SystemClock()
+        self.auto_start = getattr(settings, 'LIVE_SESSION_AUTO_START', False) if auto_start is None else auto_start
+        self.reminder_lead = reminder_lead
+        self.horizon = horizon
+        self.refresh_interval = refresh_interval
+        self.stale_after = stale_after
+        self.heap = [] # (due_at, kind, session_id, scheduled_for)
+        self.queued = set() # (kind, session_id, scheduled_for) ever pushed, so refreshes don't repeat work
+        self.next_refresh = None
+
+    def refresh(self, now):
+        sessions = LiveSession.objects.filter(
+            status='pending',
+            scheduled_for__gte=now - self.stale_after,
+            scheduled_for__lte=now + self.horizon,
+        ).values_list('pk', 'scheduled_for')
+        for session_id, scheduled_for in sessions:
+            self.push(REMIND, session_id, scheduled_for, scheduled_for - self.reminder_lead)
+            self.push(START, session_id, scheduled_for, scheduled_for)
+        # Forget items too old to be loaded again.
+        self.queued = {item for item in self.queued if item[2] >= now - self.stale_after}
+        self.next_refresh = now + self.refresh_interval
+
+    def push(self, kind, session_id, scheduled_for, due_at):
+        if (kind, session_id, scheduled_for) not in self.queued:
+            self.queued.add((kind, session_id, scheduled_for))
+            heapq.heappush(self.heap, (due_at, kind, session_id, scheduled_for))
+
+    def run_pending(self):
+        """Handles everything due now. Returns how many seconds to sleep until the next wake-up."""
+        now = self.clock.now()
+        if self.next_refresh is None or now >= self.next_refresh:
+            self.refresh(now)
+
+        due = {REMIND: {}, START: {}}
+        while self.heap and self.heap[0][0] <= now:
+            _, kind, session_id, scheduled_for = heapq.heappop(self.heap)
+            due[kind][session_id] = scheduled_for
+        if due[REMIND]:
+            self.send_reminders(due[REMIND])
+        if due[START]:
+            self.start_sessions(due[START], now)
+
+        wake_at = min(self.heap[0][0], self.next_refresh) if self.heap else self.next_refresh
+        return max((wake_at - self.clock.now()).total_seconds(), 0)
+
+    def run(self, iterations=None):
+        while iterations is None or iterations > 0:
+            self.clock.sleep(self.run_pending())
+            if iterations is not None:
+                iterations -= 1
+
+    def still_scheduled(self, due):
+        """Those of `due` ({session_id: scheduled_for}) still pending at the same time, in one query."""
+        return [
+            session for session in LiveSession.objects.filter(pk__in=due, status='pending')
+            if session.scheduled_for == due[session.pk] # Rescheduled sessions were queued again by a refresh
+        ]
+
+    def send_reminders(self, due):
+        for session in self.still_scheduled(due):
+            publish_session_event(session, 'starting_soon')
+
+    def start_sessions(self, due, now):
+        sessions = self.still_scheduled(due)
+        if not sessions:
+            return
+        if not self.auto_start:
+            for session in sessions:
+                publish_session_event(session, 'due')
+            return
+
+        started = LiveSession.status_machine.apply_to(
+            LiveSession.objects.filter(pk__in=[session.pk for session in sessions]), 'start', started_at=now
+        )
+        if started:
+            invalidate_live_sessions()
+            # Only the rows this UPDATE started: a teacher may have started one by hand meanwhile.
+            for session in LiveSession.objects.filter(pk__in=due, status='live', started_at=now):
+                publish_session_event(session)
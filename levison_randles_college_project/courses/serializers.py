@@ -1,20 +1,27 @@
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from django.db import transaction
 from django.contrib.auth import get_user_model
-from .models import Course, Enrollment, LiveSession
-# Assuming UserSerializer is in accounts.serializers
-# Adjust the import path if your UserSerializer is located elsewhere.
-from accounts.serializers import UserSerializer
+from .models import Course, Enrollment, LiveSession, WaitlistEntry, SessionAttendance, SessionAttendanceSummary
+from .enrollment_service import EnrollmentError, EnrollmentService
+# Nested users use the compact public summary, not the full profile UserSerializer.
+from accounts.serializers import UserSummarySerializer
 
 User = get_user_model()
 
 class TeacherField(serializers.PrimaryKeyRelatedField):
+    def use_pk_only_optimization(self):
+        # The full related instance is needed for the representation below. Without this,
+        # DRF hands over a pk-only stub, which forced a query per row to fetch the teacher again.
+        # With it, a teacher loaded by select_related() is reused as is.
+        return False
+
     def to_representation(self, value):
         # Instead of just PK, return a serialized representation of the teacher
-        user = User.objects.get(pk=value.pk)
-        return UserSerializer(user, context=self.context).data
+        return UserSummarySerializer(value, context=self.context).data
 
 class CourseSerializer(serializers.ModelSerializer):
-    # For read operations, use a nested UserSerializer.
+    # For read operations, use a nested UserSummarySerializer.
     # For write operations (create/update), allow setting teacher by primary key.
     # We can achieve this by defining two different fields or using a custom field.
     # A simpler approach for now is to have one field that behaves differently for read/write.
@@ -26,7 +33,7 @@ class CourseSerializer(serializers.ModelSerializer):
     #     help_text="ID of the teacher for this course."
     # )
     # For more detailed teacher info on read:
-    teacher_details = UserSerializer(source='teacher', read_only=True)
+    teacher_details = UserSummarySerializer(source='teacher', read_only=True)
 
     # Alternative for 'teacher' field to allow write by ID and read with details:
     # This is more complex. Using teacher_details for read and teacher (PK) for write is common.
@@ -38,19 +45,35 @@ class CourseSerializer(serializers.ModelSerializer):
     )
 
     enrolled_students_count = serializers.SerializerMethodField()
+    # Whether the requesting user is enrolled, and since when. Annotated by CourseViewSet.
+    is_enrolled = serializers.SerializerMethodField()
+    enrolled_at = serializers.SerializerMethodField()
 
     class Meta:
         model = Course
         fields = (
             'id', 'title', 'description', 'teacher', 'teacher_details',
-            'syllabus', 'is_published',
-            'created_at', 'updated_at', 'enrolled_students_count'
+            'syllabus', 'is_published', 'capacity', 'seats_taken',
+            'created_at', 'updated_at', 'enrolled_students_count',
+            'is_enrolled', 'enrolled_at'
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'teacher_details')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'teacher_details', 'seats_taken')
         # 'teacher' is write_only as defined above.
 
     def get_enrolled_students_count(self, obj):
-        return obj.enrolled_students.count()
+        # CourseViewSet annotates the count in the list query; only instances loaded
+        # elsewhere (e.g. just created) fall back to a COUNT query of their own.
+        count = getattr(obj, 'enrolled_students_count', None)
+        if count is None:
+            count = obj.enrolled_students.count()
+        return count
+
+    def get_is_enrolled(self, obj):
+        return getattr(obj, 'is_enrolled', False)
+
+    def get_enrolled_at(self, obj):
+        enrolled_at = getattr(obj, 'enrolled_at', None)
+        return serializers.DateTimeField().to_representation(enrolled_at) if enrolled_at else None
 
     def validate_teacher(self, value):
         # Ensure the selected user for teacher has the 'teacher' role.
@@ -67,15 +90,25 @@ class CourseBasicInfoSerializer(serializers.ModelSerializer):
         fields = ('id', 'title') # Add other essential fields if needed
 
 
+class EnrollmentConflict(APIException):
+    """An EnrollmentError surfaced from a serializer: already enrolled, or the course is full."""
+    status_code = status.HTTP_409_CONFLICT
+    default_code = 'conflict'
+
+    def __init__(self, error):
+        super().__init__({"detail": error.detail, "code": error.code})
+
+
 class EnrollmentSerializer(serializers.ModelSerializer):
     # For read operations, use nested serializers for student and course.
     # For write, use PrimaryKeyRelatedField.
-    student_details = UserSerializer(source='student', read_only=True)
+    student_details = UserSummarySerializer(source='student', read_only=True)
     course_details = CourseBasicInfoSerializer(source='course', read_only=True)
 
     student = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(role='student'),
         write_only=True, # This field will only be used for write operations
+        required=False, # StudentEnrollmentViewSet enrolls the requesting student
         help_text="Set the student by their User ID. Ensure the user has the 'student' role."
     )
     course = serializers.PrimaryKeyRelatedField(
@@ -91,6 +124,9 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id', 'enrolled_at', 'student_details', 'course_details')
         # 'student' and 'course' are write_only as defined above.
+        # No UniqueTogetherValidator: its SELECT can't stop two concurrent requests from both
+        # passing. The (student, course) unique constraint decides instead; see create().
+        validators = []
 
     def validate_student(self, value):
         # Ensure the selected user for student has the 'student' role.
@@ -98,23 +134,44 @@ class EnrollmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("The enrolling user must have the 'student' role.")
         return value
 
+    def validate_course(self, value):
+        if not value.is_published:
+            raise serializers.ValidationError("Cannot enroll in an unpublished course.")
+        return value
+
     def create(self, validated_data):
-        # Check for unique_together constraint manually before attempting to create,
-        # as by default DRF validation for unique_together happens at DB level.
-        # This provides a cleaner API error.
-        student = validated_data.get('student')
-        course = validated_data.get('course')
-        if Enrollment.objects.filter(student=student, course=course).exists():
-            raise serializers.ValidationError({
-                "detail": "This student is already enrolled in this course.",
-                "code": "already_enrolled"
-            })
-        return super().create(validated_data)
+        # Claims a seat and inserts, letting the (student, course) unique constraint reject
+        # duplicates, so a concurrent request (e.g. a double click) can't slip through as a 500.
+        # A full course is a conflict here; StudentEnrollmentViewSet waitlists instead.
+        try:
+            student = validated_data.get('student') or self.context['request'].user
+            return EnrollmentService().enroll(student, validated_data['course'], waitlist=False)
+        except EnrollmentError as e:
+            raise EnrollmentConflict(e)
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    course_details = CourseBasicInfoSerializer(source='course', read_only=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ('id', 'course', 'course_details', 'position', 'created_at')
+        read_only_fields = fields
+
+
+class EnrollmentPairSerializer(serializers.Serializer):
+    student = serializers.IntegerField(min_value=1)
+    course = serializers.IntegerField(min_value=1)
+
+
+class BulkEnrollmentSerializer(serializers.Serializer):
+    """Input for bulk enrollment: a list of {"student": id, "course": id} pairs."""
+    enrollments = EnrollmentPairSerializer(many=True, allow_empty=False, max_length=10000)
 
 
 class LiveSessionSerializer(serializers.ModelSerializer):
     course_details = CourseBasicInfoSerializer(source='course', read_only=True)
-    created_by_details = UserSerializer(source='created_by', read_only=True)
+    created_by_details = UserSummarySerializer(source='created_by', read_only=True)
 
     # For write operations, allow setting course and created_by by primary key.
     course = serializers.PrimaryKeyRelatedField(
@@ -130,7 +187,7 @@ class LiveSessionSerializer(serializers.ModelSerializer):
         model = LiveSession
         fields = (
             'id', 'course', 'course_details', 'title', 'room_id',
-            'status', 'started_at', 'ended_at',
+            'status', 'scheduled_for', 'duration_minutes', 'started_at', 'ended_at',
             'created_by', 'created_by_details', 'created_at', 'updated_at'
         )
         read_only_fields = (
@@ -151,3 +208,53 @@ class LiveSessionSerializer(serializers.ModelSerializer):
                     "You can only create live sessions for courses you teach."
                 )
         return value
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.check_schedule(validated_data)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.check_schedule(validated_data, instance)
+            return super().update(instance, validated_data)
+
+    def check_schedule(self, validated_data, instance=None):
+        """
+        Rejects a schedule overlapping another pending or live session of the same course.
+        Runs inside the save's transaction with the course row locked, so two sessions
+        scheduled at once can't both pass the check.
+        """
+        def value(field):
+            return validated_data.get(field, getattr(instance, field, None))
+
+        scheduled_for = value('scheduled_for')
+        if scheduled_for is None:
+            return
+        course = value('course')
+        Course.objects.select_for_update().filter(pk=course.pk).values('pk').first()
+        duration_minutes = value('duration_minutes') or LiveSession._meta.get_field('duration_minutes').default
+        clashes = [
+            session for session in LiveSession.objects.overlapping(course.pk, scheduled_for, duration_minutes)
+            if instance is None or session.pk != instance.pk
+        ]
+        if clashes:
+            raise serializers.ValidationError({
+                'scheduled_for': f"Overlaps \"{clashes[0].title}\" scheduled for {clashes[0].scheduled_for:%Y-%m-%d %H:%M}."
+            })
+
+
+class SessionAttendanceSerializer(serializers.ModelSerializer):
+    student = UserSummarySerializer(read_only=True)
+
+    class Meta:
+        model = SessionAttendance
+        fields = ('student', 'join_count', 'total_seconds', 'first_joined_at', 'last_left_at')
+        read_only_fields = fields
+
+
+class SessionAttendanceSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SessionAttendanceSummary
+        fields = ('attendee_count', 'join_count', 'total_seconds', 'updated_at')
+        read_only_fields = fields
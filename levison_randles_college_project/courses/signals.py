@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import LiveSession
+from .live_cache import invalidate_live_sessions
+
+
+@receiver(post_save, sender=LiveSession)
+@receiver(post_delete, sender=LiveSession)
+def invalidate_live_feed_on_session_change(sender, instance, **kwargs):
+    # Covers create/delete as well as start_session/end_session, which save the session.
+    invalidate_live_sessions()
@@ -1,3 +1,821 @@
+import io
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
 from django.test import TestCase
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .attendance import ROLLUP_SETTLE_SECONDS, AttendanceWriter, rollup_attendance
+from .consumers import NotificationConsumer
+from .enrollment_service import DEFAULT_BATCH_SIZE, EnrollmentService
+from .models import (
+    AttendanceEvent, AttendanceRollupCheckpoint, Course, Enrollment, LiveSession, SessionAttendance,
+    SessionAttendanceSummary, WaitlistEntry,
+)
+from .notifications import publish_session_event
+from .scheduler import SessionScheduler
+from .serializers import CourseSerializer, EnrollmentSerializer, LiveSessionSerializer, TeacherField
+from .views import CourseViewSet, StudentEnrollmentViewSet, LiveSessionViewSet
+
+
+class NoLazyLoadsMixin:
+    """
+    Test harness for the "zero lazy loads during serialization" guarantee of the courses app.
+    The queryset is evaluated first (that's where related data is meant to be loaded);
+    serializing the results must then not touch the database at all. Any query issued is
+    listed in the failure message.
+    """
+
+    def view_queryset(self, view_class, user, action='list', **kwargs):
+        """The queryset a view would serialize for `user`, without going through HTTP."""
+        view = view_class()
+        view.request = SimpleNamespace(user=user)
+        view.action = action
+        view.kwargs = kwargs
+        view.format_kwarg = None
+        return view.get_queryset()
+
+    def assertSerializesWithoutQueries(self, serializer_class, queryset, context=None):
+        objects = list(queryset)
+        self.assertTrue(objects, "Nothing to serialize; the test data doesn't exercise the serializer.")
+        with self.assertNumQueries(0):
+            data = serializer_class(objects, many=True, context=context or {}).data
+        return data
+
+
+class CourseSerializationQueryTests(NoLazyLoadsMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher', first_name='Tia')
+        cls.other_teacher = User.objects.create(email='other@example.com', role='teacher', first_name='Oto')
+        cls.student = User.objects.create(email='student@example.com', role='student', first_name='Sam')
+        cls.staff = User.objects.create(email='staff@example.com', role='teacher', is_staff=True)
+
+        courses = [
+            Course.objects.create(title=f'Course {i}', description='...', is_published=True,
+                                  teacher=cls.teacher if i % 2 else cls.other_teacher)
+            for i in range(4)
+        ]
+        Course.objects.create(title='Draft', description='...', teacher=cls.teacher)
+        for course in courses:
+            Enrollment.objects.create(student=cls.student, course=course)
+            LiveSession.objects.create(course=course, title='Lecture', created_by=course.teacher)
+
+    def test_course_list_serializes_without_queries(self):
+        for user in (self.staff, self.teacher, self.student):
+            with self.subTest(user=user.email):
+                data = self.assertSerializesWithoutQueries(
+                    CourseSerializer, self.view_queryset(CourseViewSet, user)
+                )
+                counts = {course['title']: course['enrolled_students_count'] for course in data}
+                self.assertEqual(counts['Course 1'], 1)
+
+    def test_my_courses_serialize_without_queries(self):
+        data = self.assertSerializesWithoutQueries(
+            CourseSerializer, self.view_queryset(CourseViewSet, self.student, action='mine')
+        )
+        self.assertEqual(len(data), 4)
+        self.assertTrue(all(course['is_enrolled'] and course['enrolled_at'] for course in data))
+
+    def test_my_courses_endpoint_is_for_students_only(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        response = client.get('/api/courses/mine/')
+        self.assertEqual(response.status_code, 200)
+        courses = response.json()
+        courses = courses['results'] if isinstance(courses, dict) else courses
+        self.assertEqual({course['title'] for course in courses}, {'Course 0', 'Course 1', 'Course 2', 'Course 3'})
+        client.force_authenticate(self.teacher)
+        self.assertEqual(client.get('/api/courses/mine/').status_code, 403)
+
+    def test_enrollment_list_serializes_without_queries(self):
+        for user in (self.staff, self.teacher, self.student):
+            with self.subTest(user=user.email):
+                self.assertSerializesWithoutQueries(
+                    EnrollmentSerializer, self.view_queryset(StudentEnrollmentViewSet, user)
+                )
+
+    def test_live_session_list_serializes_without_queries(self):
+        for user in (self.staff, self.teacher, self.student):
+            with self.subTest(user=user.email):
+                self.assertSerializesWithoutQueries(
+                    LiveSessionSerializer, self.view_queryset(LiveSessionViewSet, user)
+                )
+
+    def test_teacher_field_reuses_loaded_teacher(self):
+        class CourseWithTeacherSerializer(serializers.ModelSerializer):
+            teacher = TeacherField(queryset=User.objects.filter(role='teacher'))
+
+            class Meta:
+                model = Course
+                fields = ('id', 'teacher')
+
+        data = self.assertSerializesWithoutQueries(
+            CourseWithTeacherSerializer, Course.objects.select_related('teacher')
+        )
+        self.assertEqual(
+            {row['teacher']['first_name'] for row in data},
+            {'Tia', 'Oto'}
+        )
+
+
+class EnrollmentCreateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.student = User.objects.create(email='student@example.com', role='student')
+        cls.course = Course.objects.create(title='Open', description='...', teacher=teacher, is_published=True)
+        cls.draft = Course.objects.create(title='Draft', description='...', teacher=teacher)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_duplicate_enrollment_is_a_conflict_not_a_server_error(self):
+        response = self.client.post('/api/enrollments/', {'course': self.course.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        # No existence check before the insert; the unique constraint rejects the repeat.
+        response = self.client.post('/api/enrollments/', {'course': self.course.pk}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['code'], 'already_enrolled')
+        self.assertEqual(Enrollment.objects.filter(student=self.student).count(), 1)
+
+    def test_unpublished_course_is_rejected_by_the_serializer(self):
+        response = self.client.post('/api/enrollments/', {'course': self.draft.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('course', response.json())
+
+
+class WaitlistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.course = Course.objects.create(
+            title='Small', description='...', teacher=cls.teacher, is_published=True, capacity=1
+        )
+        cls.students = [User.objects.create(email=f's{i}@example.com', role='student') for i in range(4)]
+
+    def enroll(self, student):
+        client = APIClient()
+        client.force_authenticate(student)
+        return client.post('/api/enrollments/', {'course': self.course.pk}, format='json')
+
+    def enrolled(self):
+        return set(Enrollment.objects.filter(course=self.course).values_list('student_id', flat=True))
+
+    def queue(self):
+        return list(WaitlistEntry.objects.filter(course=self.course).values_list('student_id', flat=True))
+
+    def test_full_course_queues_students_in_order(self):
+        first, second, third = self.students[:3]
+        self.assertEqual(self.enroll(first).status_code, 201)
+        response = self.enroll(second)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['position'], 1)
+        self.assertEqual(self.enroll(third).json()['position'], 2)
+        self.assertEqual(self.queue(), [second.pk, third.pk])
+
+    def test_unenrolling_hands_the_seat_to_the_head_of_the_queue(self):
+        first, second, third = self.students[:3]
+        for student in (first, second, third):
+            self.enroll(student)
+        client = APIClient()
+        client.force_authenticate(first)
+        enrollment = Enrollment.objects.get(student=first)
+        self.assertEqual(client.delete(f'/api/enrollments/{enrollment.pk}/').status_code, 204)
+        self.assertEqual(self.enrolled(), {second.pk})
+        self.assertEqual(self.queue(), [third.pk])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 1)
+
+    def test_free_seat_goes_to_the_queue_not_to_a_new_registrant(self):
+        first, second, newcomer = self.students[:3]
+        self.enroll(first)
+        self.enroll(second)
+        # A seat frees up without promoting anyone (e.g. an admin deleted the enrollment).
+        Enrollment.objects.filter(student=first).delete()
+        Course.objects.filter(pk=self.course.pk).update(seats_taken=0)
+
+        response = self.enroll(newcomer)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.enrolled(), {second.pk})
+        self.assertEqual(self.queue(), [newcomer.pk])
+
+    def test_raising_capacity_promotes_from_the_queue(self):
+        for student in self.students:
+            self.enroll(student)
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.patch(f'/api/courses/{self.course.pk}/', {'capacity': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['seats_taken'], 3)
+        self.assertEqual(self.enrolled(), {student.pk for student in self.students[:3]})
+        self.assertEqual(self.queue(), [self.students[3].pk])
+
+    def test_promotion_skips_students_enrolled_meanwhile(self):
+        first, second = self.students[:2]
+        self.enroll(first)
+        self.enroll(second)
+        # Enrolled behind the service's back, so the entry was never removed.
+        Enrollment.objects.create(student=second, course=self.course)
+        Course.objects.filter(pk=self.course.pk).update(capacity=3)
+
+        self.assertEqual(EnrollmentService().promote_waitlist(self.course.pk), [])
+        self.assertEqual(self.queue(), [])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 2)
+
+    def test_waitlist_positions_are_loaded_with_the_entries(self):
+        self.enroll(self.students[0])
+        other = Course.objects.create(title='Other', description='...', teacher=self.teacher, is_published=True, capacity=0)
+        student = self.students[3]
+        for waiting in self.students[1:3]:
+            self.enroll(waiting)
+        self.enroll(student)
+        client = APIClient()
+        client.force_authenticate(student)
+        client.post('/api/enrollments/', {'course': other.pk}, format='json')
+
+        with self.assertNumQueries(1): # The entries with their courses and positions
+            response = client.get('/api/waitlist/')
+        self.assertEqual(
+            {entry['course']: entry['position'] for entry in response.json()}, {self.course.pk: 3, other.pk: 1}
+        )
+
+    def test_serializer_enrolls_the_requesting_student_by_default(self):
+        serializer = EnrollmentSerializer(
+            data={'course': self.course.pk}, context={'request': SimpleNamespace(user=self.students[0])}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().student, self.students[0])
+
+
+class BulkEnrollmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.courses = Course.objects.bulk_create([
+            Course(title=f'Course {i}', description='...', teacher=cls.teacher, is_published=True) for i in range(10)
+        ])
+        cls.students = User.objects.bulk_create([
+            User(email=f'student{i}@example.com', role='student') for i in range(DEFAULT_BATCH_SIZE // 10)
+        ])
+
+    def test_a_full_batch_of_new_pairs_is_enrolled(self):
+        pairs = [(student.pk, course.pk) for student in self.students for course in self.courses]
+        self.assertEqual(len(pairs), DEFAULT_BATCH_SIZE)
+        WaitlistEntry.objects.create(student=self.students[0], course=self.courses[0]) # Enrolled now, so dequeued
+        other_queue = WaitlistEntry.objects.create(
+            student=User.objects.create(email='late@example.com', role='student'), course=self.courses[0]
+        )
+
+        result = EnrollmentService().bulk_enroll(pairs)
+        self.assertEqual(
+            (len(result['created']), result['duplicates'], result['rejected']), (DEFAULT_BATCH_SIZE, [], [])
+        )
+        self.assertEqual(Enrollment.objects.count(), DEFAULT_BATCH_SIZE)
+        self.assertEqual(list(WaitlistEntry.objects.values_list('pk', flat=True)), [other_queue.pk])
+        self.assertEqual(
+            set(Course.objects.values_list('seats_taken', flat=True)), {DEFAULT_BATCH_SIZE // 10}
+        )
+
+    def test_pairs_are_created_or_reported_as_duplicates_or_rejected(self):
+        student, other_student = self.students[:2]
+        course = self.courses[0]
+        Enrollment.objects.create(student=other_student, course=course)
+        inactive = User.objects.create(email='left@example.com', role='student', is_active=False)
+        draft = Course.objects.create(title='Draft', description='...', teacher=self.teacher)
+
+        result = EnrollmentService(batch_size=2).bulk_enroll([
+            (student.pk, course.pk), (student.pk, course.pk), (other_student.pk, course.pk),
+            (self.teacher.pk, course.pk), (inactive.pk, course.pk), (student.pk, 0), (student.pk, draft.pk),
+        ])
+        self.assertEqual(result['created'], [[student.pk, course.pk]])
+        self.assertEqual(result['duplicates'], [[student.pk, course.pk], [other_student.pk, course.pk]])
+        self.assertEqual(
+            [(rejected['student'], rejected['course'], rejected['reason']) for rejected in result['rejected']],
+            [
+                (self.teacher.pk, course.pk, "No active student with this ID."),
+                (inactive.pk, course.pk, "No active student with this ID."),
+                (student.pk, 0, "No course with this ID."),
+                (student.pk, draft.pk, "Cannot enroll in an unpublished course."),
+            ],
+        )
+        self.assertEqual(Course.objects.get(pk=course.pk).seats_taken, 2)
+
+    def test_teachers_only_enroll_into_their_own_courses(self):
+        other_teacher = User.objects.create(email='other@example.com', role='teacher')
+        staff = User.objects.create(email='registrar@example.com', role='teacher', is_staff=True)
+        theirs = Course.objects.create(title='Theirs', description='...', teacher=other_teacher, is_published=True)
+        pairs = [(self.students[0].pk, self.courses[0].pk), (self.students[0].pk, theirs.pk)]
+
+        result = EnrollmentService().bulk_enroll(pairs, by_user=self.teacher)
+        self.assertEqual(result['created'], [[self.students[0].pk, self.courses[0].pk]])
+        self.assertEqual(
+            result['rejected'],
+            [{'student': self.students[0].pk, 'course': theirs.pk,
+              'reason': "You can only enroll students in courses you teach."}],
+        )
+        result = EnrollmentService().bulk_enroll(pairs, by_user=staff)
+        self.assertEqual(result['created'], [[self.students[0].pk, theirs.pk]])
+
+    def test_bulk_endpoint(self):
+        client = APIClient()
+        body = {'enrollments': [{'student': student.pk, 'course': self.courses[0].pk} for student in self.students[:3]]}
+        client.force_authenticate(self.students[0])
+        self.assertEqual(client.post('/api/enrollments/bulk/', body, format='json').status_code, 403)
+
+        client.force_authenticate(self.teacher)
+        response = client.post('/api/enrollments/bulk/', body, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['created']), 3)
+        response = client.post('/api/enrollments/bulk/', body, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['created'], len(response.json()['duplicates'])), ([], 3))
+        self.assertEqual(client.post('/api/enrollments/bulk/', {'enrollments': []}, format='json').status_code, 400)
+
+    def test_enroll_students_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            feed = Path(directory) / 'feed.csv'
+            rows = [f'{student.pk},{self.courses[1].pk}' for student in self.students[:5]] + [f'{self.teacher.pk},0']
+            feed.write_text('student,course\n' + '\n'.join(rows) + '\n')
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('enroll_students', str(feed), '--batch-size', '2', stdout=stdout, stderr=stderr)
+            self.assertIn("Enrolled 5; 0 already enrolled; 1 rejected.", stdout.getvalue())
+            self.assertIn(f"student {self.teacher.pk}, course 0: No active student with this ID.", stderr.getvalue())
+            self.assertEqual(Enrollment.objects.filter(course=self.courses[1]).count(), 5)
+
+            feed.write_text('student,course\nabc,1\n')
+            with self.assertRaises(CommandError):
+                call_command('enroll_students', str(feed))
+
+
+class LiveFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.student = User.objects.create(email='student@example.com', role='student')
+        cls.course = Course.objects.create(title='Open', description='...', teacher=cls.teacher, is_published=True)
+        other = Course.objects.create(
+            title='Other', description='...', is_published=True,
+            teacher=User.objects.create(email='other@example.com', role='teacher'),
+        )
+        Enrollment.objects.create(student=cls.student, course=cls.course)
+        cls.lecture = cls.session('Lecture', cls.course, day=7)
+        cls.session('Last week', cls.course, day=1, status='ended')
+        cls.session('Not enrolled', other, day=7, status='live')
+
+    @classmethod
+    def session(cls, title, course, day, **kwargs):
+        return LiveSession.objects.create(
+            course=course, title=title, created_by=course.teacher,
+            scheduled_for=datetime(2030, 1, day, 9, tzinfo=dt_timezone.utc), **kwargs
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.teacher_client = APIClient()
+        self.teacher_client.force_authenticate(self.teacher)
+
+    def feed(self, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.student)
+        response = client.get('/api/live-sessions/live-now/')
+        self.assertEqual(response.status_code, 200)
+        return [(session['title'], session['status']) for session in response.json()]
+
+    def test_feed_lists_the_active_sessions_of_the_users_courses(self):
+        self.assertEqual(self.feed(), [('Lecture', 'pending')])
+        self.assertEqual(self.feed(self.teacher), [('Lecture', 'pending')])
+
+    def test_feed_is_cached_per_user(self):
+        self.feed()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.feed(), [('Lecture', 'pending')])
+        with self.assertNumQueries(1):
+            self.feed(self.teacher)
+
+    def test_starting_and_ending_a_session_refresh_the_feed(self):
+        self.feed()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher_client.post(f'/api/live-sessions/{self.lecture.pk}/start/')
+        self.assertEqual(self.feed(), [('Lecture', 'live')])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher_client.post(f'/api/live-sessions/{self.lecture.pk}/end/')
+        self.assertEqual(self.feed(), [])
+
+    def test_creating_and_deleting_a_session_refresh_the_feed(self):
+        self.feed()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.teacher_client.post('/api/live-sessions/', {
+                'course': self.course.pk, 'title': 'Lab', 'scheduled_for': '2030-01-08T09:00:00Z',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(sorted(self.feed()), [('Lab', 'pending'), ('Lecture', 'pending')])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.teacher_client.delete(f'/api/live-sessions/{self.lecture.pk}/').status_code, 204)
+        self.assertEqual(self.feed(), [('Lab', 'pending')])
+
+    @skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+    def test_feed_is_read_from_the_active_sessions_index(self):
+        for user in (self.student, self.teacher):
+            with self.subTest(role=user.role):
+                plan = LiveSession.objects.visible_to(user).for_listing().active().explain()
+                self.assertIn('livesession_active_idx', plan)
+                self.assertNotIn('SCAN courses_livesession', plan)
+
+
+class FakeClock:
+    """A clock for SessionScheduler whose sleep() just moves time forward."""
+
+    def __init__(self, now):
+        self.current = now
+        self.sleeps = []
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.current += timedelta(seconds=seconds)
+
+
+class SessionSchedulingTests(TestCase):
+    start = datetime(2030, 1, 7, 9, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.course = Course.objects.create(title='Open', description='...', teacher=cls.teacher, is_published=True)
+
+    def schedule(self, title, minutes_from_start, duration_minutes=60):
+        return LiveSession.objects.create(
+            course=self.course, title=title, created_by=self.teacher, duration_minutes=duration_minutes,
+            scheduled_for=self.start + timedelta(minutes=minutes_from_start),
+        )
+
+    def scheduler(self, **kwargs):
+        clock = FakeClock(self.start - timedelta(minutes=30))
+        return clock, SessionScheduler(clock=clock, **kwargs)
+
+    @mock.patch('courses.scheduler.publish_session_event')
+    def test_sleeps_until_the_next_due_time_and_starts_due_sessions_in_bulk(self, publish):
+        first, second = self.schedule('Lecture', 0), self.schedule('Lab', 0)
+        clock, scheduler = self.scheduler(auto_start=True, refresh_interval=timedelta(hours=2))
+
+        # Nothing due: sleep straight to the reminders, 10 minutes before the start.
+        scheduler.run(iterations=1)
+        self.assertEqual(clock.sleeps, [20 * 60])
+        publish.assert_not_called()
+
+        scheduler.run(iterations=1)
+        self.assertEqual({(call.args[0].pk, call.args[1]) for call in publish.call_args_list},
+                         {(first.pk, 'starting_soon'), (second.pk, 'starting_soon')})
+        self.assertEqual(clock.sleeps[-1], 10 * 60)
+
+        publish.reset_mock()
+        with self.assertNumQueries(3): # Re-check, one UPDATE for both, load the started sessions
+            scheduler.run_pending()
+        for session in (first, second):
+            session.refresh_from_db()
+            self.assertEqual((session.status, session.started_at), ('live', self.start))
+        self.assertEqual(publish.call_count, 2)
+
+    @mock.patch('courses.scheduler.publish_session_event')
+    def test_without_auto_start_due_sessions_are_announced(self, publish):
+        session = self.schedule('Lecture', 0)
+        clock, scheduler = self.scheduler(auto_start=False, refresh_interval=timedelta(hours=2))
+        scheduler.run(iterations=3)
+        self.assertEqual([call.args for call in publish.call_args_list], [(session, 'starting_soon'), (session, 'due')])
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'pending')
+
+    @mock.patch('courses.scheduler.publish_session_event')
+    def test_rescheduled_and_started_sessions_are_skipped(self, publish):
+        moved, started = self.schedule('Moved', 0), self.schedule('Started', 0)
+        clock, scheduler = self.scheduler(auto_start=True, reminder_lead=timedelta(0),
+                                          refresh_interval=timedelta(hours=2))
+        scheduler.run_pending()
+        LiveSession.objects.filter(pk=moved.pk).update(scheduled_for=self.start + timedelta(hours=3))
+        LiveSession.objects.filter(pk=started.pk).update(status='live', started_at=self.start - timedelta(minutes=1))
+        clock.current = self.start
+        scheduler.run_pending()
+        publish.assert_not_called()
+        self.assertEqual(LiveSession.objects.get(pk=moved.pk).status, 'pending')
+
+    def test_overlapping_sessions_of_a_course_are_rejected(self):
+        self.schedule('Lecture', 0, duration_minutes=90)
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+
+        def create(minutes_from_start, duration_minutes=60):
+            return client.post('/api/live-sessions/', {
+                'course': self.course.pk, 'title': 'New',
+                'scheduled_for': (self.start + timedelta(minutes=minutes_from_start)).isoformat(),
+                'duration_minutes': duration_minutes,
+            }, format='json')
+
+        response = create(60)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('scheduled_for', response.json())
+        self.assertEqual(create(-60).status_code, 201) # Ends exactly when the lecture starts
+        self.assertEqual(create(90).status_code, 201) # Starts exactly when the lecture ends
+
+
+class LiveSessionTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.course = Course.objects.create(title='Open', description='...', teacher=cls.teacher)
+
+    def setUp(self):
+        self.session = LiveSession.objects.create(
+            course=self.course, title='Lecture', created_by=self.teacher,
+            scheduled_for=datetime(2030, 1, 7, tzinfo=dt_timezone.utc),
+        )
+        self.machine = LiveSession.status_machine
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def test_apply_updates_the_row_and_the_instance(self):
+        started_at = datetime(2030, 1, 7, 0, 1, tzinfo=dt_timezone.utc)
+        updated_at = self.session.updated_at
+        with self.assertNumQueries(1):
+            self.assertTrue(self.machine.apply(self.session, 'start', started_at=started_at))
+        self.assertEqual((self.session.status, self.session.started_at), ('live', started_at))
+        self.assertGreater(self.session.updated_at, updated_at)
+        row = LiveSession.objects.get(pk=self.session.pk)
+        self.assertEqual((row.status, row.started_at, row.updated_at), ('live', started_at, self.session.updated_at))
+
+    def test_reapplying_or_skipping_a_transition_changes_nothing(self):
+        self.assertTrue(self.machine.apply(self.session, 'start'))
+        self.assertFalse(self.machine.apply(self.session, 'start'))
+        pending = LiveSession.objects.create(
+            course=self.course, title='Lab', created_by=self.teacher,
+            scheduled_for=datetime(2030, 1, 8, tzinfo=dt_timezone.utc),
+        )
+        self.assertFalse(self.machine.apply(pending, 'end'))
+        self.assertEqual(pending.status, 'pending')
+        self.assertEqual(LiveSession.objects.get(pk=pending.pk).status, 'pending')
+
+    def test_apply_to_counts_only_the_rows_it_moved(self):
+        LiveSession.objects.create(
+            course=self.course, title='Lab', created_by=self.teacher, status='ended',
+            scheduled_for=datetime(2030, 1, 8, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(self.machine.apply_to(LiveSession.objects.all(), 'start'), 1)
+        self.assertEqual(self.machine.apply_to(LiveSession.objects.all(), 'start'), 0)
+
+    def test_repeated_requests_succeed_and_illegal_ones_are_rejected(self):
+        end = self.client.post(f'/api/live-sessions/{self.session.pk}/end/')
+        self.assertEqual(end.status_code, 400)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(f'/api/live-sessions/{self.session.pk}/start/')
+        second = self.client.post(f'/api/live-sessions/{self.session.pk}/start/')
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(first.json()['started_at'], second.json()['started_at'])
+
+
+class NotificationConsumerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.student = User.objects.create(email='student@example.com', role='student')
+        cls.course = Course.objects.create(title='Open', description='...', teacher=cls.teacher, is_published=True)
+        cls.session = LiveSession.objects.create(
+            course=cls.course, title='Lecture', created_by=cls.teacher,
+            scheduled_for=datetime(2030, 1, 7, tzinfo=dt_timezone.utc),
+        )
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    @database_sync_to_async
+    def committed(self, func, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args, **kwargs)
+
+    async def publish(self):
+        await self.committed(publish_session_event, self.session, 'due')
+
+    async def test_anonymous_sockets_are_closed(self):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_enrolled_students_and_the_teacher_receive_course_events(self):
+        await database_sync_to_async(Enrollment.objects.create)(student=self.student, course=self.course)
+        sockets = [await self.connect(self.student), await self.connect(self.teacher)]
+        await self.publish()
+        for communicator in sockets:
+            event = await communicator.receive_json_from()
+            self.assertEqual((event['type'], event['session']['id']), ('live_session.due', self.session.pk))
+            await communicator.disconnect()
+
+    async def test_enrolling_while_connected_subscribes_the_socket(self):
+        communicator = await self.connect(self.student)
+        await self.publish()
+        self.assertTrue(await communicator.receive_nothing())
+
+        await self.committed(EnrollmentService().enroll, self.student, self.course)
+        await communicator.receive_nothing() # Let the socket handle the subscription update
+        await self.publish()
+        self.assertEqual((await communicator.receive_json_from())['type'], 'live_session.due')
+        await communicator.disconnect()
+
+    async def test_teachers_follow_the_courses_they_create(self):
+        communicator = await self.connect(self.teacher)
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = await self.committed(
+            client.post, '/api/courses/', {'title': 'New', 'description': '...', 'teacher': self.teacher.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        await communicator.receive_nothing()
+        session = await database_sync_to_async(LiveSession.objects.create)(
+            course_id=response.json()['id'], title='Intro', created_by=self.teacher,
+            scheduled_for=datetime(2030, 1, 7, tzinfo=dt_timezone.utc),
+        )
+        await self.committed(publish_session_event, session)
+        self.assertEqual((await communicator.receive_json_from())['session']['id'], session.pk)
+        await communicator.disconnect()
+
+    def test_a_failing_channel_layer_does_not_fail_the_commit(self):
+        layer = mock.Mock(group_send=mock.AsyncMock(side_effect=ConnectionError("layer down")))
+        with mock.patch('courses.notifications.get_channel_layer', return_value=layer), \
+                self.assertLogs(level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                publish_session_event(self.session, 'due')
+                EnrollmentService().unenroll(Enrollment.objects.create(student=self.student, course=self.course))
+        self.assertEqual(layer.group_send.await_count, 2)
+
+
+class AttendanceTests(TestCase):
+    now = datetime(2030, 1, 7, 10, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.alice = User.objects.create(email='alice@example.com', role='student')
+        cls.bob = User.objects.create(email='bob@example.com', role='student')
+        cls.course = Course.objects.create(title='Open', description='...', teacher=cls.teacher)
+        cls.session = LiveSession.objects.create(
+            course=cls.course, title='Lecture', created_by=cls.teacher, scheduled_for=cls.now - timedelta(hours=1),
+        )
+
+    def event(self, student, kind, seconds_ago, duration_seconds=None):
+        return AttendanceEvent.objects.create(
+            live_session=self.session, student=student, kind=kind,
+            occurred_at=self.now - timedelta(seconds=seconds_ago), duration_seconds=duration_seconds,
+        )
+
+    def rollup(self, now=None, **kwargs):
+        with mock.patch('courses.attendance.timezone.now', return_value=now or self.now):
+            return rollup_attendance(**kwargs)
+
+    def test_rollup_folds_settled_events_and_moves_the_checkpoint(self):
+        self.event(self.alice, 'join', 600)
+        self.event(self.bob, 'join', 590)
+        last = self.event(self.alice, 'leave', 300, duration_seconds=300)
+        self.assertEqual(self.rollup(batch_size=2), 3)
+        self.assertEqual(AttendanceRollupCheckpoint.objects.get().last_event_id, last.pk)
+
+        summary = SessionAttendanceSummary.objects.get(live_session=self.session)
+        self.assertEqual((summary.attendee_count, summary.join_count, summary.total_seconds), (2, 2, 300))
+        alice = SessionAttendance.objects.get(live_session=self.session, student=self.alice)
+        self.assertEqual((alice.join_count, alice.total_seconds), (1, 300))
+        self.assertEqual(self.rollup(), 0) # Nothing is counted twice
+
+    def test_rollup_leaves_events_inside_the_settle_window(self):
+        settled = self.event(self.alice, 'join', ROLLUP_SETTLE_SECONDS + 1)
+        unsettled = self.event(self.bob, 'join', ROLLUP_SETTLE_SECONDS - 1)
+        self.event(self.alice, 'leave', ROLLUP_SETTLE_SECONDS + 1, duration_seconds=30) # Inserted late, ID after it
+        self.assertEqual(self.rollup(), 1)
+        self.assertEqual(AttendanceRollupCheckpoint.objects.get().last_event_id, settled.pk)
+
+        self.assertEqual(self.rollup(now=self.now + timedelta(seconds=2)), 2)
+        self.assertEqual(AttendanceRollupCheckpoint.objects.get().last_event_id, unsettled.pk + 1)
+        summary = SessionAttendanceSummary.objects.get(live_session=self.session)
+        self.assertEqual((summary.attendee_count, summary.join_count, summary.total_seconds), (2, 2, 30))
+
+    async def test_writer_writes_full_batches_at_once_and_the_rest_after_a_delay(self):
+        writer = AttendanceWriter(batch_size=2, flush_delay=0.01)
+        await writer.record(self.session.pk, self.alice.pk, 'join')
+        await writer.record(self.session.pk, self.bob.pk, 'join')
+        self.assertEqual(await AttendanceEvent.objects.acount(), 2)
+        await writer.record(self.session.pk, self.alice.pk, 'leave', duration_seconds=5)
+        self.assertEqual(await AttendanceEvent.objects.acount(), 2)
+        await writer.wait_for_flush()
+        self.assertEqual(await AttendanceEvent.objects.acount(), 3)
+
+    async def test_writer_keeps_events_whose_write_failed(self):
+        writer = AttendanceWriter(batch_size=10, flush_delay=0.01)
+        bulk_create = AttendanceEvent.objects.bulk_create
+        attempts = []
+
+        def fail_once(events):
+            attempts.append(len(events))
+            if len(attempts) == 1:
+                raise DatabaseError("database is locked")
+            return bulk_create(events)
+
+        with mock.patch.object(AttendanceEvent.objects, 'bulk_create', side_effect=fail_once), \
+                self.assertLogs('courses.attendance', 'ERROR'):
+            await writer.record(self.session.pk, self.alice.pk, 'join')
+            await writer.wait_for_flush()
+            self.assertEqual(writer.pending[0].student_id, self.alice.pk)
+            await writer.record(self.session.pk, self.bob.pk, 'join')
+            await writer.wait_for_flush()
+        self.assertEqual(attempts, [1, 2])
+        self.assertEqual(writer.pending, [])
+        self.assertEqual(await AttendanceEvent.objects.acount(), 2)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Asserts SQLite query plans (the development database).")
+class CourseQuerySetPlanTests(TestCase):
+    """EXPLAIN-based checks that the role-scoped course querysets are answered from indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.student = User.objects.create(email='student@example.com', role='student')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('SCAN courses_course\n', plan + '\n') # No full table scan
+        return plan
+
+    def test_catalog_is_read_in_title_order_from_the_partial_index(self):
+        for user in (AnonymousUser(), self.student):
+            with self.subTest(user=str(user)):
+                plan = self.assertUsesIndex(Course.objects.visible_to(user), 'course_published_title_idx')
+                self.assertNotIn('TEMP B-TREE', plan) # Ordering comes from the index, no sort step
+
+    def test_catalog_listing_counts_enrollments_by_index(self):
+        plan = self.assertUsesIndex(Course.objects.visible_to(self.student).for_listing(), 'course_published_title_idx')
+        self.assertRegex(plan, r'SEARCH \S+ USING COVERING INDEX courses_enrollment_course_id')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_teacher_courses_by_publication_state_use_composite_index(self):
+        self.assertUsesIndex(
+            Course.objects.filter(teacher=self.teacher, is_published=True), 'course_teacher_published_idx'
+        )
+
+    def test_teacher_catalog_is_a_union_of_indexed_branches(self):
+        plan = self.assertUsesIndex(Course.objects.visible_to(self.teacher).for_listing(), 'UNION ALL')
+        self.assertIn('SEARCH U0 USING COVERING INDEX course_teacher_published_idx (teacher_id=?)', plan)
+        self.assertRegex(plan, r'SCAN U0 USING (COVERING )?INDEX course_(published_title|teacher_published)_idx')
+        self.assertNotIn('SCAN U0\n', plan + '\n')
+
+    def test_teachers_see_their_drafts_and_published_courses(self):
+        other = User.objects.create(email='other@example.com', role='teacher')
+        Course.objects.bulk_create([
+            Course(title='Own draft', description='...', teacher=self.teacher),
+            Course(title='Own published', description='...', teacher=self.teacher, is_published=True),
+            Course(title='Other draft', description='...', teacher=other),
+            Course(title='Other published', description='...', teacher=other, is_published=True),
+        ])
+        self.assertEqual(
+            list(Course.objects.visible_to(self.teacher).values_list('title', flat=True)),
+            ['Other published', 'Own draft', 'Own published'],
+        )
+
+    def test_schedule_lookups_use_the_schedule_indexes(self):
+        course = Course.objects.create(title='Open', description='...', teacher=self.teacher)
+        start = datetime(2030, 1, 7, 9, 0, tzinfo=dt_timezone.utc)
+        plan = LiveSession.objects.filter(
+            course=course, scheduled_for__lt=start, scheduled_for__gt=start - timedelta(hours=8)
+        ).explain()
+        self.assertIn('livesession_schedule_idx', plan)
+        plan = LiveSession.objects.filter(status='pending', scheduled_for__lte=start).explain()
+        self.assertIn('livesession_due_idx', plan)
 
-# Create your tests here.
+    def test_my_courses_are_read_newest_first_from_the_student_index(self):
+        plan = self.assertUsesIndex(
+            Course.objects.enrolled_by(self.student).for_listing(), 'enrollment_student_recent_idx'
+        )
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CourseViewSet, StudentEnrollmentViewSet, CourseEnrollmentListView, LiveSessionViewSet
+from .views import CourseViewSet, StudentEnrollmentViewSet, CourseEnrollmentListView, LiveSessionViewSet, WaitlistViewSet
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
 router.register(r'enrollments', StudentEnrollmentViewSet, basename='enrollment')
+router.register(r'waitlist', WaitlistViewSet, basename='waitlist')
 router.register(r'live-sessions', LiveSessionViewSet, basename='livesession')
 
 # urlpatterns will be built from the router and any custom paths
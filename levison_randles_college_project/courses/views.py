@@ -1,14 +1,22 @@
-from rest_framework import viewsets, permissions, status, generics
+from rest_framework import viewsets, permissions, status, generics, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.utils import timezone
 
-from .models import Course, Enrollment, LiveSession
-from .serializers import CourseSerializer, EnrollmentSerializer, LiveSessionSerializer
+from .models import Course, Enrollment, LiveSession, WaitlistEntry, SessionAttendance, SessionAttendanceSummary
+from .serializers import (
+    CourseSerializer, EnrollmentSerializer, LiveSessionSerializer, BulkEnrollmentSerializer, WaitlistEntrySerializer,
+    SessionAttendanceSerializer, SessionAttendanceSummarySerializer,
+)
+from .enrollment_service import EnrollmentError, EnrollmentService
+from .live_cache import get_live_feed, invalidate_live_sessions
+from .notifications import publish_session_event, update_course_subscriptions
 from .permissions import (
     IsTeacher, IsStudent, IsCourseOwner,
-    IsEnrollmentOwnerOrCourseTeacher, CanEnroll, IsLiveSessionOwnerAndTeacher # Import new permission
+    IsEnrollmentOwnerOrCourseTeacher, CanEnroll, IsLiveSessionOwnerAndTeacher, # Import new permission
+    IsTeacherOrStaff,
 )
 
 class CourseViewSet(viewsets.ModelViewSet):
@@ -20,17 +28,11 @@ class CourseViewSet(viewsets.ModelViewSet):
     serializer_class = CourseSerializer
 
     def get_queryset(self):
+        # Role scoping and related loading live in CourseQuerySet (see courses.models).
         user = self.request.user
-        if user.is_authenticated:
-            if user.role == 'teacher' or user.is_staff:
-                # Teachers and staff can see all courses (published or not)
-                # Potentially, teachers might only see their own unpublished courses unless staff
-                if user.is_staff:
-                    return Course.objects.all()
-                return Course.objects.filter(teacher=user) | Course.objects.filter(is_published=True) # Own courses + published
-            # Students see only published courses
-            return Course.objects.filter(is_published=True)
-        return Course.objects.filter(is_published=True) # Unauthenticated users see published courses
+        if self.action == 'mine':
+            return Course.objects.enrolled_by(user).for_listing()
+        return Course.objects.visible_to(user).for_listing().with_enrollment_of(user)
 
     def get_permissions(self):
         """
@@ -42,12 +44,32 @@ class CourseViewSet(viewsets.ModelViewSet):
             self.permission_classes = [IsCourseOwner]
         elif self.action in ['list', 'retrieve']:
             self.permission_classes = [permissions.IsAuthenticatedOrReadOnly] # Allow anon read for published
+        elif self.action == 'mine':
+            self.permission_classes = [IsStudent]
         else:
             self.permission_classes = [permissions.IsAdminUser] # Default to admin for other actions
         return [permission() for permission in self.permission_classes]
 
     def perform_create(self, serializer):
-        serializer.save(teacher=self.request.user)
+        course = serializer.save(teacher=self.request.user)
+        # The teacher's open notification sockets start following the new course.
+        update_course_subscriptions(self.request.user.pk, subscribe=[course.pk])
+
+    def perform_update(self, serializer):
+        previous_capacity = serializer.instance.capacity
+        with transaction.atomic():
+            course = serializer.save()
+            # Any seats the change opened go to the waitlist before the new capacity is visible.
+            if course.capacity != previous_capacity and EnrollmentService().promote_waitlist(course.pk):
+                course.refresh_from_db(fields=['seats_taken'])
+
+    @action(detail=False, methods=['get']) # Students only, see get_permissions()
+    def mine(self, request):
+        """
+        The requesting student's courses, most recently enrolled first.
+        Same representation as the course list, with is_enrolled/enrolled_at filled in.
+        """
+        return self.list(request) # get_queryset() scopes the list to the student's enrollments
 
     @action(detail=True, methods=['post'], permission_classes=[IsCourseOwner])
     def publish(self, request, pk=None):
@@ -78,6 +100,9 @@ class StudentEnrollmentViewSet(viewsets.ModelViewSet):
     serializer_class = EnrollmentSerializer
 
     def get_queryset(self):
+        return self.get_visible_enrollments().select_related('student', 'course')
+
+    def get_visible_enrollments(self):
         user = self.request.user
         if not user.is_authenticated:
             return Enrollment.objects.none()
@@ -98,16 +123,59 @@ class StudentEnrollmentViewSet(viewsets.ModelViewSet):
         elif self.action in ['list', 'retrieve']:
             # Basic auth check, actual data visibility is handled by get_queryset
             self.permission_classes = [permissions.IsAuthenticated]
+        elif self.action == 'bulk':
+            self.permission_classes = [IsTeacherOrStaff]
         else: # 'update', 'partial_update' are not typically used for enrollments.
             self.permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in self.permission_classes]
 
-    def perform_create(self, serializer):
-        course = serializer.validated_data.get('course')
-        if not course.is_published:
-            # This check can also be added to EnrollmentSerializer's validate_course
-            raise serializers.ValidationError("Cannot enroll in an unpublished course.")
-        serializer.save(student=self.request.user)
+    def create(self, request, *args, **kwargs):
+        """
+        Enrolls the requesting student (201), or, when the course is full, puts them on its
+        waitlist (202) to be enrolled automatically when a seat frees up.
+        Unpublished courses are rejected by EnrollmentSerializer; already enrolled is a 409.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = EnrollmentService().enroll(request.user, serializer.validated_data['course'])
+        except EnrollmentError as e:
+            return Response({"detail": e.detail, "code": e.code}, status=status.HTTP_409_CONFLICT)
+        if isinstance(result, WaitlistEntry):
+            return Response(WaitlistEntrySerializer(result).data, status=status.HTTP_202_ACCEPTED)
+        return Response(self.get_serializer(result).data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        # Frees the seat and promotes the next waitlisted students.
+        EnrollmentService().unenroll(instance)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsTeacherOrStaff])
+    def bulk(self, request):
+        """
+        Enrolls many students at once, e.g. a registrar feed or a teacher adding a class.
+        Body: {"enrollments": [{"student": id, "course": id}, ...]} (up to 10,000 pairs).
+        Teachers may only enroll into courses they teach; staff into any published course.
+        Responds with the pairs created, the ones that were already enrolled, and the ones
+        rejected with a reason. Rejected pairs don't stop the others from being enrolled.
+        """
+        serializer = BulkEnrollmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pairs = [(pair['student'], pair['course']) for pair in serializer.validated_data['enrollments']]
+        result = EnrollmentService().bulk_enroll(pairs, by_user=request.user)
+        created_status = status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK
+        return Response(result, status=created_status)
+
+
+class WaitlistViewSet(mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    The requesting student's waitlist entries, with their place in each queue.
+    DELETE an entry to leave that waitlist. Joining happens by enrolling in a full course.
+    """
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [IsStudent]
+
+    def get_queryset(self):
+        return WaitlistEntry.objects.filter(student=self.request.user).select_related('course').with_position()
 
 
 class CourseEnrollmentListView(generics.ListAPIView):
@@ -132,7 +200,7 @@ class CourseEnrollmentListView(generics.ListAPIView):
         if not (user.is_staff or (user.role == 'teacher' and course.teacher == user)):
             return Enrollment.objects.none() # Return empty if user is not owner/staff
 
-        return Enrollment.objects.filter(course=course)
+        return Enrollment.objects.filter(course=course).select_related('student', 'course')
 
     def get_permissions(self):
         # For CourseEnrollmentListView, the main permission is about accessing the list.
@@ -203,42 +271,20 @@ class LiveSessionViewSet(viewsets.ModelViewSet):
     serializer_class = LiveSessionSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        if not user.is_authenticated:
-            return LiveSession.objects.none()
-
-        if user.is_staff:
-            return LiveSession.objects.all()
-
-        # Teachers see live sessions for courses they teach
-        if user.role == 'teacher':
-            return LiveSession.objects.filter(course__teacher=user)
-
-        # Students see live sessions for courses they are enrolled in
-        if user.role == 'student':
-            enrolled_course_ids = Enrollment.objects.filter(student=user).values_list('course_id', flat=True)
-            return LiveSession.objects.filter(course_id__in=enrolled_course_ids, status__in=['pending', 'live'])
-            # Optionally, also show recently ended sessions:
-            # from django.utils import timezone
-            # from datetime import timedelta
-            # recently_ended_cutoff = timezone.now() - timedelta(hours=2)
-            # return LiveSession.objects.filter(
-            #    course_id__in=enrolled_course_ids,
-            #    status__in=['pending', 'live', 'ended']
-            # ).filter(
-            #    models.Q(status__in=['pending', 'live']) | models.Q(ended_at__gte=recently_ended_cutoff)
-            # ).distinct()
-
-        return LiveSession.objects.none()
+        # Role scoping and related loading live in LiveSessionQuerySet (see courses.models).
+        queryset = LiveSession.objects.visible_to(self.request.user).for_listing()
+        if self.action == 'live_now' and self.request.user.role != 'student':
+            queryset = queryset.active() # Students only ever see active sessions
+        return queryset
 
     def get_permissions(self):
         if self.action == 'create':
             self.permission_classes = [IsTeacher]
         elif self.action in ['update', 'partial_update', 'destroy']: # Standard ModelViewSet actions
             self.permission_classes = [IsLiveSessionOwnerAndTeacher]
-        elif self.action in ['start_session', 'end_session']: # Custom actions
+        elif self.action in ['start_session', 'end_session', 'attendance']: # Custom actions
             self.permission_classes = [IsLiveSessionOwnerAndTeacher]
-        elif self.action in ['list', 'retrieve']:
+        elif self.action in ['list', 'retrieve', 'live_now']:
             self.permission_classes = [permissions.IsAuthenticated] # Students or Teachers can view
         else:
             self.permission_classes = [permissions.IsAdminUser]
@@ -251,29 +297,66 @@ class LiveSessionViewSet(viewsets.ModelViewSet):
         # `course` is validated in the serializer to ensure teacher owns it.
         serializer.save(created_by=self.request.user)
 
+    @action(detail=False, methods=['get'], url_path='live-now')
+    def live_now(self, request):
+        """
+        Pending and live sessions the user can join: for students, those of the courses they
+        are enrolled in. Built in one query from the active-sessions partial index and cached
+        per user until a session starts, ends, or is created or deleted.
+        """
+        data = get_live_feed(request.user, lambda: self.get_serializer(self.get_queryset(), many=True).data)
+        return Response(data)
+
     @action(detail=True, methods=['post'], url_path='start', permission_classes=[IsLiveSessionOwnerAndTeacher])
     def start_session(self, request, pk=None):
         live_session = self.get_object()
         # Permission class IsLiveSessionOwnerAndTeacher already checks if request.user is obj.created_by
 
-        if live_session.status == 'pending':
-            live_session.status = 'live'
-            live_session.started_at = timezone.now()
-            live_session.save()
-            return Response(LiveSessionSerializer(live_session).data)
-        return Response({'detail': 'Session is not pending or already started.'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.transition(live_session, 'start', started_at=timezone.now())
 
     @action(detail=True, methods=['post'], url_path='end', permission_classes=[IsLiveSessionOwnerAndTeacher])
     def end_session(self, request, pk=None):
         live_session = self.get_object()
         # Permission class IsLiveSessionOwnerAndTeacher already checks if request.user is obj.created_by
 
-        if live_session.status == 'live':
-            live_session.status = 'ended'
-            live_session.ended_at = timezone.now()
-            live_session.save()
+        return self.transition(live_session, 'end', ended_at=timezone.now())
+
+    @action(detail=True, methods=['get'], permission_classes=[IsLiveSessionOwnerAndTeacher])
+    def attendance(self, request, pk=None):
+        """
+        Who attended the session and for how long, read from the attendance rollups
+        (courses.attendance.rollup_attendance), so figures lag the live room slightly.
+        """
+        live_session = self.get_object()
+        summary = SessionAttendanceSummary.objects.filter(live_session=live_session).first()
+        students = SessionAttendance.objects.filter(live_session=live_session).select_related('student').order_by(
+            '-total_seconds'
+        )
+        return Response({
+            'summary': SessionAttendanceSummarySerializer(summary).data if summary else None,
+            'students': SessionAttendanceSerializer(students, many=True, context={'request': request}).data,
+        })
+
+    def transition(self, live_session, name, **changes):
+        """
+        Applies a status transition as one conditional UPDATE. Repeating a transition that
+        has already happened (a double-click, a second tab) returns the session unchanged;
+        only a transition that isn't allowed from the current status is an error.
+        """
+        if LiveSession.status_machine.apply(live_session, name, **changes):
+            # update() sends no post_save, so do what the signal handler would.
+            invalidate_live_sessions()
+            publish_session_event(live_session) # Pushed to the course's notification sockets
+            return Response(LiveSessionSerializer(live_session).data)
+
+        live_session.refresh_from_db(fields=['status', 'started_at', 'ended_at', 'updated_at'])
+        _, target = LiveSession.status_machine.transitions[name]
+        if live_session.status == target:
             return Response(LiveSessionSerializer(live_session).data)
-        return Response({'detail': 'Session is not live or already ended.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'detail': f"Cannot {name} a session that is {live_session.status}."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
 # TODO: Refine LiveSessionViewSet permissions for update/destroy/start/end actions
 # to use a proper object-level permission like:
@@ -1,18 +1,20 @@
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import courses.routing
-import messaging.routing # Import messaging routes
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'levison_randles_college_project.settings')
 
 # Get the default Django ASGI application to handle HTTP requests
+# (initializes Django, so it must run before importing anything that uses models)
 django_asgi_app = get_asgi_application()
 
+from accounts.middleware import TokenAuthMiddlewareStack # Session auth plus DRF token auth for mobile clients
+import courses.routing
+import messaging.routing # Import messaging routes
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
+    "websocket": TokenAuthMiddlewareStack(
         URLRouter(
             # Combine urlpatterns from different apps
             courses.routing.websocket_urlpatterns +
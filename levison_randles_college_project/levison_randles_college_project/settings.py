@@ -99,6 +99,43 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Used for the product catalog and other shared caches. LocMemCache is per-process, so
+# invalidation only reaches the process that made the change; use a shared backend in production.
+
+CACHES = {
+    # 'default': {
+    #     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    #     'LOCATION': 'redis://127.0.0.1:6379', # Replace with your Redis URL
+    # }
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Channel layer for WebSocket groups (chat rooms, live signaling, course notifications).
+# The in-memory layer only reaches sockets served by the same process; use Redis in production.
+# run_session_scheduler runs in its own process, so its notifications need the shared layer.
+CHANNEL_LAYERS = {
+    # 'default': {
+    #     'BACKEND': 'channels_redis.core.RedisChannelLayer', # Requires: pip install channels-redis
+    #     'CONFIG': {'hosts': [('127.0.0.1', 6379)]},
+    # }
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+
+# Whether the session scheduler (run_session_scheduler) starts scheduled live sessions on
+# its own when due. When off, the course is notified and the teacher starts the session.
+LIVE_SESSION_AUTO_START = False
+
+# Full-text backend for chat message search (messaging.search). Defaults to the SQLite FTS5
+# index on SQLite and a substring-matching fallback on other databases.
+# MESSAGE_SEARCH_BACKEND = 'messaging.search.SQLiteFTS5Backend'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -118,6 +155,30 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing. The first hasher hashes new passwords; the others can still verify
+# older hashes, which are upgraded to the first hasher on the user's next login.
+# Run `python manage.py benchmark_password_hashers` to see logins/sec per core for each.
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# PBKDF2 work factor for TunablePBKDF2PasswordHasher. Defaults to Django's own value.
+# PASSWORD_HASH_ITERATIONS = 1000000
+
+# Threads checking login passwords, per process (login spike protection). Defaults to the CPU count.
+# LOGIN_MAX_CONCURRENT_HASHES = 4
+
+# Where user imports started over the API store their upload and results (see accounts.user_import).
+# Not in version control (.gitignore).
+USER_IMPORT_DIR = BASE_DIR / 'user_imports'
+# At most this many imports run at once, each hashing passwords in this many processes.
+USER_IMPORT_MAX_JOBS = 2
+USER_IMPORT_WORKERS = 2
+# An import with no result after this many seconds is reported as failed.
+USER_IMPORT_JOB_TIMEOUT = 6 * 60 * 60
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -144,7 +205,10 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # Token auth with token -> user lookups cached in-process and in the shared cache.
+        'accounts.authentication.CachedTokenAuthentication',
+        # Stateless alternative: signed access tokens ("Bearer") from /api/accounts/token/.
+        'accounts.authentication.SignedTokenAuthentication',
     ],
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.IsAuthenticated', # Optional: Set default permissions
@@ -152,3 +216,23 @@ REST_FRAMEWORK = {
 }
 
 ASGI_APPLICATION = 'levison_randles_college_project.asgi.application'
+
+# Token -> user lookups for CachedTokenAuthentication (seconds / entries).
+# LOCAL_TTL bounds how long another process may keep using a revoked token.
+AUTH_TOKEN_CACHE = {
+    'LOCAL_TTL': 5,
+    'LOCAL_MAXSIZE': 10000,
+    'SHARED_TTL': 60,
+}
+
+# Signed access/refresh tokens for SignedTokenAuthentication (seconds).
+SIGNED_TOKENS = {
+    'ACCESS_TTL': 5 * 60,
+    'REFRESH_TTL': 14 * 24 * 60 * 60,
+}
+
+# How long a checkout stock reservation holds units before the sweeper releases them.
+STORE_RESERVATION_TTL_SECONDS = 10 * 60
+
+# Most units of one product a shopper may hold in reservations at once.
+STORE_RESERVATION_MAX_PER_USER = 10
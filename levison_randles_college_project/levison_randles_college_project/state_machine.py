@@ -0,0 +1,56 @@
+from django.utils import timezone
+
+
+class StateMachine:
+    """
+    Named status transitions applied as single conditional UPDATEs.
+
+        status_machine = StateMachine({'start': (('pending',), 'live'), ...})
+        if LiveSession.status_machine.apply(session, 'start', started_at=timezone.now()):
+            ...  # This call made the transition
+
+    `apply()` issues `UPDATE ... SET status=<target>, ... WHERE id=? AND status IN (<sources>)`
+    and reports whether a row changed. The check and the write are one statement, so of
+    two concurrent requests (a double-click, two tabs) exactly one makes the transition and
+    the other sees 0 rows; only the status and the given columns are written, and no lock
+    is held beyond that statement.
+
+    QuerySet.update() skips save() and its signals, so callers do any follow-up work
+    (cache invalidation, notifications) themselves when a transition applies.
+    """
+
+    def __init__(self, transitions, field='status'):
+        self.transitions = transitions # name -> (source statuses, target status)
+        self.field = field
+
+    def apply(self, instance, name, **changes):
+        """
+        Makes transition `name` on `instance`'s row, also writing `changes`. Returns True if
+        it applied; `instance` is then updated to match the row. Returns False if the row's
+        status wasn't one the transition starts from, leaving `instance` as it was.
+        """
+        changes = self._with_auto_now(type(instance), changes)
+        updated = self.apply_to(type(instance)._default_manager.filter(pk=instance.pk), name, **changes)
+        if updated:
+            _, target = self.transitions[name]
+            changes[self.field] = target
+            for attr, value in changes.items():
+                setattr(instance, attr, value)
+        return bool(updated)
+
+    def apply_to(self, queryset, name, **changes):
+        """Makes transition `name` on every row of `queryset` it applies to; returns how many."""
+        sources, target = self.transitions[name]
+        changes = self._with_auto_now(queryset.model, changes)
+        return queryset.filter(**{f'{self.field}__in': sources}).update(**{self.field: target}, **changes)
+
+    @staticmethod
+    def _with_auto_now(model, changes):
+        # update() doesn't touch auto_now fields (updated_at) the way save() does.
+        changes = dict(changes)
+        now = None
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) and field.name not in changes:
+                now = now or timezone.now()
+                changes[field.name] = now
+        return changes
@@ -4,6 +4,7 @@ from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from .models import ChatRoom, ChatMessage
 from .serializers import ChatMessageSerializer # To serialize messages for broadcast
+from .unread import record_new_message
 from django.utils import timezone
 
 class MessagingConsumer(AsyncWebsocketConsumer):
@@ -25,7 +26,7 @@ class MessagingConsumer(AsyncWebsocketConsumer):
         self.room = room # Store room object for later use
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol=self.scope.get('auth_subprotocol')) # Echo the token subprotocol if used
         print(f"User {self.user} connected to chat room {self.room_id}")
 
     async def disconnect(self, close_code):
@@ -84,4 +85,8 @@ class MessagingConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def save_chat_message(self, user, room, content):
-        return ChatMessage.objects.create(sender=user, room=room, content=content)
+        message = ChatMessage.objects.create(sender=user, room=room, content=content)
+        # Bump the other participants' cached unread counts for the inbox badges.
+        recipient_ids = room.participants.exclude(pk=user.pk).values_list('pk', flat=True)
+        record_new_message(message, recipient_ids)
+        return message
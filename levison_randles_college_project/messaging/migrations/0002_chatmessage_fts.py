@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# SQLite only: an FTS5 index over messaging_chatmessage.content, kept in sync by triggers.
+# room_id is indexed too, so searches can be restricted to rooms inside the MATCH.
+# Other databases use the backend configured in MESSAGE_SEARCH_BACKEND (see messaging.search).
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE messaging_chatmessage_fts USING fts5(
+        content, room_id, content='messaging_chatmessage', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER messaging_chatmessage_fts_insert AFTER INSERT ON messaging_chatmessage BEGIN
+        INSERT INTO messaging_chatmessage_fts(rowid, content, room_id) VALUES (new.id, new.content, new.room_id);
+    END
+    """,
+    """
+    CREATE TRIGGER messaging_chatmessage_fts_delete AFTER DELETE ON messaging_chatmessage BEGIN
+        INSERT INTO messaging_chatmessage_fts(messaging_chatmessage_fts, rowid, content, room_id) VALUES ('delete', old.id, old.content, old.room_id);
+    END
+    """,
+    """
+    CREATE TRIGGER messaging_chatmessage_fts_update AFTER UPDATE OF content, room_id ON messaging_chatmessage BEGIN
+        INSERT INTO messaging_chatmessage_fts(messaging_chatmessage_fts, rowid, content, room_id) VALUES ('delete', old.id, old.content, old.room_id);
+        INSERT INTO messaging_chatmessage_fts(rowid, content, room_id) VALUES (new.id, new.content, new.room_id);
+    END
+    """,
+    # Index the messages that already exist.
+    "INSERT INTO messaging_chatmessage_fts(messaging_chatmessage_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS messaging_chatmessage_fts_insert",
+    "DROP TRIGGER IF EXISTS messaging_chatmessage_fts_delete",
+    "DROP TRIGGER IF EXISTS messaging_chatmessage_fts_update",
+    "DROP TABLE IF EXISTS messaging_chatmessage_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
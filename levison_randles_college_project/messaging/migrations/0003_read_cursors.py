@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_chatmessage_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0, verbose_name='last read message ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='messaging.chatroom')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='room_read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Room Read Cursor',
+                'verbose_name_plural': 'Room Read Cursors',
+                'constraints': [models.UniqueConstraint(fields=('user', 'room'), name='readcursor_unique_user_room')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room', 'id'], name='chatmessage_room_id_idx'),
+        ),
+    ]
@@ -98,3 +98,37 @@ class ChatMessage(models.Model):
         verbose_name = _("Chat Message")
         verbose_name_plural = _("Chat Messages")
         ordering = ['timestamp']
+        indexes = [
+            # A room's messages in ID order: unread counts (IDs above a read cursor) and history.
+            models.Index(fields=['room', 'id'], name='chatmessage_room_id_idx'),
+        ]
+
+
+class RoomReadCursor(models.Model):
+    """
+    How far a participant has read in a chat room: the ID of the last message they have
+    seen. Their unread count is the number of the room's messages with a higher ID.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='room_read_cursors',
+        db_index=False, # Covered by readcursor_unique_user_room, which leads with user
+    )
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='read_cursors',
+    )
+    last_read_message_id = models.BigIntegerField(_("last read message ID"), default=0)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} read {self.room_id} up to message {self.last_read_message_id}"
+
+    class Meta:
+        verbose_name = _("Room Read Cursor")
+        verbose_name_plural = _("Room Read Cursors")
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'room'], name='readcursor_unique_user_room'),
+        ]
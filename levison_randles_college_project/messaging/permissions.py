@@ -12,7 +12,10 @@ class IsRoomParticipantPermission(BasePermission):
         if not request.user.is_authenticated:
             return False
         if isinstance(obj, ChatRoom):
-            return obj.participants.filter(pk=request.user.pk).exists()
+            # Only the participants table's (chatroom, user) index is read, never a users row,
+            # so this needs nothing from request.user but its id: a signed-token user
+            # (see accounts.signed_tokens) is checked without loading the User.
+            return ChatRoom.participants.through.objects.filter(chatroom_id=obj.pk, user_id=request.user.pk).exists()
         return False
 
     # If used for view-level permission where object is not yet fetched,
@@ -0,0 +1,125 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import ChatMessage, ChatRoom
+
+FTS_TABLE = 'messaging_chatmessage_fts'
+
+# Words of a query; everything else (FTS operators, quotes, punctuation) is dropped, so
+# user input can never be a syntax error or an injected FTS expression.
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    return _TERM_RE.findall(query or '')
+
+
+class SearchHit:
+    def __init__(self, message, rank, snippet):
+        self.message = message
+        self.rank = rank
+        self.snippet = snippet
+
+
+class MessageSearchBackend:
+    """
+    Full-text search over ChatMessage.content. Backends only find and rank message IDs,
+    restricted to `room_ids` (the rooms the searching user takes part in) inside their
+    own query.
+    """
+
+    def search(self, query, room_ids, offset=0, limit=20):
+        """Returns [(message_id, rank, snippet)], best match first."""
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(MessageSearchBackend):
+    """
+    SQLite FTS5 index (messaging_chatmessage_fts, see migration 0002) over the messages
+    table as an external-content table: it stores only the inverted index, keyed by
+    message ID. Triggers keep it up to date on every insert, edit and delete, in the
+    same transaction as the message itself, so there is nothing to run or rebuild.
+
+    room_id is indexed alongside content. For a user in a few rooms the restriction is
+    part of the MATCH: FTS5 intersects the terms' and the rooms' posting lists, so only
+    the user's own matches are ranked (bm25, with the room column weighted 0), however
+    common the words are elsewhere. Beyond ROOM_MATCH_MAX rooms, merging that many room
+    lists costs more than it saves, and matches are instead checked against the messages
+    table by primary key.
+    """
+    ROOM_MATCH_MAX = 16
+
+    def search(self, query, room_ids, offset=0, limit=20):
+        terms = query_terms(query)
+        if not terms or not room_ids:
+            return []
+        # Every term must match; the last one as a prefix, for search-as-you-type.
+        words = ' '.join(f'"{term}"' for term in terms) + '*'
+        select = (
+            f"SELECT fts.rowid, bm25({FTS_TABLE}, 1.0, 0.0) AS score, snippet({FTS_TABLE}, 0, '[', ']', '…', 12) "
+            f"FROM {FTS_TABLE} AS fts "
+        )
+        if len(room_ids) <= self.ROOM_MATCH_MAX:
+            rooms = ' OR '.join(f'"{int(room_id)}"' for room_id in room_ids)
+            sql = select + f"WHERE {FTS_TABLE} MATCH %s"
+            params = [f'content : ({words}) AND room_id : ({rooms})']
+        else:
+            sql = select + (
+                f"JOIN {ChatMessage._meta.db_table} AS message ON message.id = fts.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND message.room_id IN ({', '.join(['%s'] * len(room_ids))})"
+            )
+            params = [f'content : ({words})', *room_ids]
+        with connection.cursor() as cursor:
+            cursor.execute(sql + " ORDER BY score LIMIT %s OFFSET %s", [*params, limit, offset])
+            return cursor.fetchall()
+
+
+class BasicSearchBackend(MessageSearchBackend):
+    """
+    Fallback for databases without a configured full-text index: case-insensitive
+    substring match of every term, newest first. Scans the user's rooms' messages, so
+    it suits development data rather than a large history.
+    """
+
+    def search(self, query, room_ids, offset=0, limit=20):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        condition = Q()
+        for term in terms:
+            condition &= Q(content__icontains=term)
+        messages = ChatMessage.objects.filter(condition, room_id__in=room_ids).order_by('-timestamp', '-id')
+        return [(pk, None, None) for pk in messages.values_list('pk', flat=True)[offset:offset + limit]]
+
+
+def get_search_backend():
+    """settings.MESSAGE_SEARCH_BACKEND if set, else FTS5 on SQLite and the basic backend elsewhere."""
+    path = getattr(settings, 'MESSAGE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    return BasicSearchBackend()
+
+
+def search_messages(user, query, room_id=None, offset=0, limit=20):
+    """
+    Messages matching `query` in the rooms `user` takes part in (or in room `room_id`,
+    if they take part in it), best match first, as SearchHits with their sender loaded.
+    """
+    # The participants table alone answers "which rooms is this user in".
+    room_ids = ChatRoom.participants.through.objects.filter(user=user)
+    if room_id is not None:
+        room_ids = room_ids.filter(chatroom_id=room_id)
+    room_ids = list(room_ids.values_list('chatroom_id', flat=True))
+    hits = get_search_backend().search(query, room_ids, offset=offset, limit=limit)
+    messages = ChatMessage.objects.select_related('sender').in_bulk([message_id for message_id, _, _ in hits])
+    return [
+        SearchHit(messages[message_id], rank, snippet)
+        for message_id, rank, snippet in hits
+        if message_id in messages # Deleted since the search ran
+    ]
@@ -1,12 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import ChatRoom, ChatMessage
-from accounts.serializers import UserSerializer # Assuming UserSerializer is in accounts.serializers
+from accounts.serializers import UserSummarySerializer
 
 User = get_user_model()
 
 class ChatMessageSerializer(serializers.ModelSerializer):
-    sender_details = UserSerializer(source='sender', read_only=True)
+    sender_details = UserSummarySerializer(source='sender', read_only=True)
 
     class Meta:
         model = ChatMessage
@@ -23,19 +23,22 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 
 
 class ChatRoomSerializer(serializers.ModelSerializer):
-    participant_details = UserSerializer(source='participants', many=True, read_only=True)
+    participant_details = UserSummarySerializer(source='participants', many=True, read_only=True)
     # `participants` field (default M2M PrimaryKeyRelatedField) is used for write operations (list of user IDs).
 
     last_message = serializers.SerializerMethodField(read_only=True)
+    unread_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = ChatRoom
         fields = (
             'id', 'name', 'room_type',
             'participants', 'participant_details',
-            'created_at', 'updated_at', 'last_message_at', 'last_message'
+            'created_at', 'updated_at', 'last_message_at', 'last_message', 'unread_count'
+        )
+        read_only_fields = (
+            'id', 'created_at', 'updated_at', 'last_message_at', 'participant_details', 'last_message', 'unread_count'
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'last_message_at', 'participant_details', 'last_message')
 
     def get_last_message(self, obj):
         """Returns the last message of the chat room."""
@@ -45,6 +48,10 @@ class ChatRoomSerializer(serializers.ModelSerializer):
             return ChatMessageSerializer(last_msg, context=self.context).data
         return None
 
+    def get_unread_count(self, obj):
+        """The requesting user's unread messages in the room, when the view provides them."""
+        return self.context.get('unread_counts', {}).get(obj.pk)
+
     def validate_participants(self, value):
         if not value: # Ensure participants list is not empty
             raise serializers.ValidationError("A chat room must have at least one participant.")
@@ -90,3 +97,9 @@ class ChatRoomSerializer(serializers.ModelSerializer):
             # and check if a room with that pair already exists. This is often handled in the view.
 
         return super().create(validated_data)
+
+
+class MessageSearchHitSerializer(serializers.Serializer):
+    message = ChatMessageSerializer(read_only=True)
+    rank = serializers.FloatField(read_only=True, allow_null=True) # Lower is better (bm25); null if the backend doesn't rank
+    snippet = serializers.CharField(read_only=True, allow_null=True) # Matched words in [brackets]
@@ -1,3 +1,149 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .models import ChatMessage, ChatRoom, RoomReadCursor
+from .search import BasicSearchBackend, SQLiteFTS5Backend, search_messages
+from .unread import mark_read, record_new_message, unread_counts, unread_key
+
+
+class UnreadCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(email='alice@example.com', role='student')
+        cls.bob = User.objects.create(email='bob@example.com', role='student')
+        cls.room = ChatRoom.objects.create(room_type='dm')
+        cls.room.participants.add(cls.alice, cls.bob)
+        cls.other_room = ChatRoom.objects.create(room_type='group', name='Other')
+        cls.other_room.participants.add(cls.alice, cls.bob)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def send(self, sender, content='hi', room=None):
+        room = room or self.room
+        message = ChatMessage.objects.create(sender=sender, room=room, content=content)
+        record_new_message(message, room.participants.exclude(pk=sender.pk).values_list('pk', flat=True))
+        return message
+
+    def cursor(self, user):
+        return RoomReadCursor.objects.get(user=user, room=self.room).last_read_message_id
+
+    def test_counts_are_computed_on_a_miss_and_cached(self):
+        for _ in range(3):
+            self.send(self.alice)
+        self.assertIsNone(cache.get(unread_key(self.bob.pk, self.room.pk)))
+        with self.assertNumQueries(1):
+            counts = unread_counts(self.bob, [self.room.pk, self.other_room.pk])
+        self.assertEqual(counts, {self.room.pk: 3, self.other_room.pk: 0})
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_counts(self.bob, [self.room.pk]), {self.room.pk: 3})
+
+    def test_new_messages_increment_cached_counts(self):
+        self.send(self.alice)
+        unread_counts(self.bob, [self.room.pk])
+        self.send(self.alice)
+        self.assertEqual(cache.get(unread_key(self.bob.pk, self.room.pk)), 2)
+        # The sender has read their own message.
+        self.assertEqual(unread_counts(self.alice, [self.room.pk]), {self.room.pk: 0})
+
+    def test_cursor_only_moves_forward(self):
+        first = self.send(self.alice)
+        second = self.send(self.alice)
+        self.assertEqual(mark_read(self.bob, self.room.pk, second.pk), second.pk)
+        self.assertEqual(mark_read(self.bob, self.room.pk, first.pk), second.pk)
+        self.assertEqual(self.cursor(self.bob), second.pk)
+        self.assertEqual(unread_counts(self.bob, [self.room.pk]), {self.room.pk: 0})
+
+    def test_read_endpoint_moves_the_cursor_and_resets_the_count(self):
+        first = self.send(self.alice)
+        self.send(self.alice)
+        response = self.client.post(f'/api/messaging/rooms/{self.room.pk}/read/', {'message_id': first.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'last_read_message_id': first.pk, 'unread_count': 1})
+
+        response = self.client.post(f'/api/messaging/rooms/{self.room.pk}/read/', {}, format='json')
+        self.assertEqual(response.json()['unread_count'], 0)
+        self.assertEqual(self.cursor(self.bob), ChatMessage.objects.latest('id').pk)
+
+    def test_read_endpoint_rejects_ids_outside_the_room(self):
+        elsewhere = self.send(self.alice, room=self.other_room)
+        for message_id in (10 ** 12, 10 ** 20, elsewhere.pk, 'latest'):
+            response = self.client.post(
+                f'/api/messaging/rooms/{self.room.pk}/read/', {'message_id': message_id}, format='json'
+            )
+            self.assertEqual(response.status_code, 400, message_id)
+        self.assertFalse(RoomReadCursor.objects.filter(user=self.bob, room=self.room).exists())
+        # Messages sent afterwards still count as unread.
+        self.send(self.alice)
+        self.assertEqual(unread_counts(self.bob, [self.room.pk]), {self.room.pk: 1})
+
+    def test_room_list_includes_unread_counts(self):
+        self.send(self.alice)
+        response = self.client.get('/api/messaging/rooms/')
+        rooms = response.json()
+        rooms = rooms['results'] if isinstance(rooms, dict) else rooms
+        self.assertEqual({room['id']: room['unread_count'] for room in rooms}, {self.room.pk: 1, self.other_room.pk: 0})
+
+
+class MessageSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(email='alice@example.com', role='student')
+        cls.bob = User.objects.create(email='bob@example.com', role='student')
+        cls.shared = ChatRoom.objects.create(room_type='dm')
+        cls.shared.participants.add(cls.alice, cls.bob)
+        cls.private = ChatRoom.objects.create(room_type='group', name='Private')
+        cls.private.participants.add(cls.bob)
+        cls.homework = ChatMessage.objects.create(sender=cls.bob, room=cls.shared, content='Homework is due Friday')
+        cls.secret = ChatMessage.objects.create(sender=cls.bob, room=cls.private, content='Homework answers')
+        ChatMessage.objects.create(sender=cls.alice, room=cls.shared, content='See you tomorrow')
+
+    def found(self, user, query, **kwargs):
+        return [hit.message.pk for hit in search_messages(user, query, **kwargs)]
+
+    @skipUnless(connection.vendor == 'sqlite', "FTS5 index is SQLite-only")
+    def test_fts_index_finds_only_the_users_rooms(self):
+        with self.settings(MESSAGE_SEARCH_BACKEND='messaging.search.SQLiteFTS5Backend'):
+            self.assertEqual(self.found(self.alice, 'homework'), [self.homework.pk])
+            self.assertEqual(set(self.found(self.bob, 'homew')), {self.homework.pk, self.secret.pk})
+            self.assertEqual(self.found(self.bob, 'homework', room_id=self.private.pk), [self.secret.pk])
+            self.assertEqual(self.found(self.bob, 'homework OR "tomorrow'), [])
+
+    @skipUnless(connection.vendor == 'sqlite', "FTS5 index is SQLite-only")
+    def test_fts_index_follows_edits_and_deletes(self):
+        self.homework.content = 'Essay is due Friday'
+        self.homework.save()
+        self.assertEqual(self.found(self.alice, 'essay'), [self.homework.pk])
+        self.assertEqual(self.found(self.alice, 'homework'), [])
+        self.homework.delete()
+        self.assertEqual(self.found(self.alice, 'essay'), [])
+
+    @skipUnless(connection.vendor == 'sqlite', "FTS5 index is SQLite-only")
+    def test_many_rooms_are_checked_against_the_messages_table(self):
+        backend = SQLiteFTS5Backend()
+        backend.ROOM_MATCH_MAX = 1
+        room_ids = [self.shared.pk, self.private.pk]
+        self.assertEqual({row[0] for row in backend.search('homework', room_ids)}, {self.homework.pk, self.secret.pk})
+
+    def test_basic_backend_matches_every_term(self):
+        backend = BasicSearchBackend()
+        self.assertEqual([row[0] for row in backend.search('due homework', [self.shared.pk])], [self.homework.pk])
+        self.assertEqual(backend.search('homework', []), [])
 
-# Create your tests here.
+    def test_search_endpoint_pages_results(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        self.assertEqual(client.get('/api/messaging/search/').status_code, 400)
+        response = client.get('/api/messaging/search/', {'q': 'homework', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(response.json()['next_offset'], 1)
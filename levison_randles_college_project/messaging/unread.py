@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ChatMessage, ChatRoom, RoomReadCursor
+
+# Unread counts are cached per (user, room). A new message increments the other
+# participants' cached counts; reading deletes the reader's entry. A missing entry is
+# recomputed from the read cursor, so the cache is never the source of truth and the
+# timeout bounds any drift from an increment racing a recomputation.
+UNREAD_CACHE_TIMEOUT = 5 * 60
+
+
+def unread_key(user_id, room_id):
+    return f'messaging:unread:{user_id}:{room_id}'
+
+
+def unread_counts(user, room_ids):
+    """
+    {room_id: unread count} for `user` in each of `room_ids`: from the cache, with every
+    miss computed in a single query. Each count is a range scan of chatmessage_room_id_idx
+    (the room's message IDs above the user's cursor).
+    """
+    room_ids = list(room_ids)
+    cached = cache.get_many([unread_key(user.pk, room_id) for room_id in room_ids])
+    counts = {}
+    missing = []
+    for room_id in room_ids:
+        count = cached.get(unread_key(user.pk, room_id))
+        if count is None:
+            missing.append(room_id)
+        else:
+            counts[room_id] = count
+
+    if missing:
+        read_upto = RoomReadCursor.objects.filter(user=user, room=OuterRef('pk')).values('last_read_message_id')[:1]
+        unread = ChatMessage.objects.filter(room=OuterRef('pk'), id__gt=OuterRef('read_upto')).order_by().values(
+            'room'
+        ).annotate(total=Count('*')).values('total')
+        computed = dict(
+            ChatRoom.objects.filter(pk__in=missing).order_by().annotate(
+                read_upto=Coalesce(Subquery(read_upto), 0),
+                unread=Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+            ).values_list('pk', 'unread')
+        )
+        cache.set_many(
+            {unread_key(user.pk, room_id): count for room_id, count in computed.items()}, UNREAD_CACHE_TIMEOUT
+        )
+        counts.update(computed)
+    return counts
+
+
+def record_new_message(message, recipient_ids):
+    """Counts `message` as unread for `recipient_ids`, and as read by its sender."""
+    for user_id in recipient_ids:
+        try:
+            cache.incr(unread_key(user_id, message.room_id))
+        except ValueError:
+            pass # Not cached; the next read computes it, including this message
+    mark_read(message.sender, message.room_id, message.pk)
+
+
+def mark_read(user, room_id, message_id=None):
+    """
+    Moves the user's read cursor in the room forward to `message_id` (default: the room's
+    newest message) and resets their cached unread count. Never moves a cursor backwards.
+    Returns the cursor position.
+    """
+    if message_id is None:
+        message_id = ChatMessage.objects.filter(room_id=room_id).order_by('-id').values_list('id', flat=True).first() or 0
+    updated = RoomReadCursor.objects.filter(
+        user=user, room_id=room_id, last_read_message_id__lt=message_id
+    ).update(last_read_message_id=message_id, updated_at=timezone.now())
+    if not updated:
+        cursor, _ = RoomReadCursor.objects.get_or_create(
+            user=user, room_id=room_id, defaults={'last_read_message_id': message_id}
+        )
+        message_id = cursor.last_read_message_id
+    cache.delete(unread_key(user.pk, room_id))
+    return message_id
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ChatRoomViewSet, ChatMessageListView
+from .views import ChatRoomViewSet, ChatMessageListView, MessageSearchView
 
 router = DefaultRouter()
 router.register(r'rooms', ChatRoomViewSet, basename='chatroom')
@@ -9,4 +9,6 @@ urlpatterns = [
     path('', include(router.urls)),
     # Path for listing messages for a specific chat room
     path('rooms/<str:room_id>/messages/', ChatMessageListView.as_view(), name='chatroom-messages-list'),
+    # Full-text search across the user's rooms
+    path('search/', MessageSearchView.as_view(), name='message-search'),
 ]
@@ -1,9 +1,13 @@
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.decorators import action
 from django.db.models import Q, Prefetch
 from django.shortcuts import get_object_or_404
+from django.contrib.auth import get_user_model
 from .models import ChatRoom, ChatMessage
-from .serializers import ChatRoomSerializer, ChatMessageSerializer
+from .serializers import ChatRoomSerializer, ChatMessageSerializer, MessageSearchHitSerializer
+from .search import search_messages
+from .unread import mark_read, unread_counts
 from .permissions import IsRoomParticipantPermission # Will create this next
 
 class ChatRoomViewSet(viewsets.ModelViewSet):
@@ -20,10 +24,47 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         # Note: Fetching last message here can be N+1 if not careful.
         # The serializer method `get_last_message` handles fetching it.
         return self.request.user.chat_rooms.all().prefetch_related(
-            Prefetch('participants', queryset=get_user_model().objects.only('id', 'email', 'first_name', 'last_name', 'role'))
+            Prefetch('participants', queryset=get_user_model().objects.only('id', 'first_name', 'last_name', 'role'))
         ).order_by('-last_message_at')
 
 
+    def list(self, request, *args, **kwargs):
+        # Unread badges for every listed room: cached counts, misses computed in one query.
+        rooms = list(self.filter_queryset(self.get_queryset()))
+        context = self.get_serializer_context()
+        context['unread_counts'] = unread_counts(request.user, [room.pk for room in rooms])
+        return Response(self.get_serializer_class()(rooms, many=True, context=context).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        room = self.get_object()
+        context = self.get_serializer_context()
+        context['unread_counts'] = unread_counts(request.user, [room.pk])
+        return Response(self.get_serializer_class()(room, context=context).data)
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """
+        Marks the room read up to message_id, a message of this room (default: its newest
+        message), and resets the unread count. Cursors only move forward.
+        """
+        room = self.get_object()
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return Response({"detail": "message_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+            # Any other ID could park the cursor past messages not sent yet.
+            if not ChatMessage.objects.filter(pk=message_id, room=room).exists():
+                return Response(
+                    {"detail": "message_id is not a message in this room."}, status=status.HTTP_400_BAD_REQUEST
+                )
+        last_read = mark_read(request.user, room.pk, message_id)
+        return Response({
+            'last_read_message_id': last_read,
+            'unread_count': unread_counts(request.user, [room.pk])[room.pk],
+        })
+
     def perform_create(self, serializer):
         # The creating user is automatically added to participants in the serializer's create method.
         # Room type and participant validation is largely handled in the serializer.
@@ -32,7 +73,7 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
 
     def get_permissions(self):
         # Apply IsRoomParticipantPermission for object-level actions
-        if self.action in ['retrieve', 'update', 'partial_update', 'destroy', 'add_participant', 'remove_participant']:
+        if self.action in ['retrieve', 'update', 'partial_update', 'destroy', 'read', 'add_participant', 'remove_participant']:
             return [permissions.IsAuthenticated(), IsRoomParticipantPermission()]
         return super().get_permissions()
 
@@ -83,3 +124,32 @@ class ChatMessageListView(generics.ListAPIView):
         context = super().get_serializer_context()
         context['room_id'] = self.kwargs.get('room_id')
         return context
+
+
+class MessageSearchView(generics.GenericAPIView):
+    """
+    Full-text search of the messages in the user's chat rooms, best match first.
+    Query parameters: q (required), room (optional room ID), limit (max 50) and offset.
+    Responds with {"results": [...], "next_offset": <offset of the next page, or null>}.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = MessageSearchHitSerializer
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "The q parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            room_id = int(request.query_params['room']) if request.query_params.get('room') else None
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.MAX_LIMIT)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({"detail": "room, limit and offset must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One extra hit tells whether there is a next page without counting every match.
+        hits = search_messages(request.user, query, room_id=room_id, offset=offset, limit=limit + 1)
+        return Response({
+            'results': self.get_serializer(hits[:limit], many=True).data,
+            'next_offset': offset + limit if len(hits) > limit else None,
+        })
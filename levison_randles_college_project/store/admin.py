@@ -1,20 +1,22 @@
 from django.contrib import admin
-from .models import Product
+from .models import Product, StockReservation
 import json # For pretty printing JSON in admin if needed
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'item_type', 'price', 'is_active', 'stock_quantity_display', 'created_at')
+    list_display = ('name', 'item_type', 'price', 'is_active', 'stock_quantity_display', 'held_quantity_display', 'created_at')
     list_filter = ('item_type', 'is_active', 'created_at')
-    search_fields = ('name', 'description', 'item_type', 'meta_data__icontains') # Search in JSON field
+    # meta_data's hot keys are searched through their indexed columns rather than scanning the JSON text.
+    search_fields = ('name', 'description', 'item_type', '=meta_course_id', '=meta_event_id')
     ordering = ('name',)
+    readonly_fields = ('meta_course_id', 'meta_event_id', 'meta_credit_amount') # Derived from meta_data
 
     fieldsets = (
         (None, {
             'fields': ('name', 'description', 'item_type', 'price', 'is_active')
         }),
         ('Stock & Meta Data', {
-            'fields': ('stock_quantity', 'meta_data'),
+            'fields': ('stock_quantity', 'meta_data', 'meta_course_id', 'meta_event_id', 'meta_credit_amount'),
             'classes': ('collapse',), # Collapsible section
         }),
     )
@@ -25,6 +27,10 @@ class ProductAdmin(admin.ModelAdmin):
         return obj.stock_quantity
     stock_quantity_display.short_description = "Stock"
 
+    def held_quantity_display(self, obj):
+        return obj.held_quantity if obj.stock_quantity is not None else "-"
+    held_quantity_display.short_description = "Held"
+
     # Optionally, to pretty print JSONField in admin (requires Django 3.1+)
     # This is more for readonly display in admin; editing JSON is usually direct.
     # def display_meta_data(self, obj):
@@ -35,9 +41,27 @@ class ProductAdmin(admin.ModelAdmin):
     # readonly_fields = ('display_meta_data',) # If you add the above method
 
     def get_queryset(self, request):
-        # Optimize by prefetching related data if any ForeignKeys were present
-        return super().get_queryset(request)
+        # Units held by live reservations, summed in the list query itself.
+        return super().get_queryset(request).with_held_quantity()
 
     # Add validation or custom forms here if meta_data needs more structured input in admin
     # For example, based on item_type, you might want different form fields for meta_data.
     # This would involve overriding get_form method.
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'user', 'quantity', 'expires_at', 'created_at')
+    list_filter = ('product',)
+    raw_id_fields = ('product', 'user')
+    ordering = ('expires_at',)
+
+    # Reservations are placed and released by the reservation service, which enforces stock and hold limits.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Product
+
+# Every cached catalog page is keyed by the current catalog version. Invalidation just
+# moves the version on, so stale entries are never read again and simply age out.
+# Pages change only when a product is edited; stock levels, which every purchase and
+# hold changes, are cached on their own for STOCK_LEVELS_CACHE_TIMEOUT and laid over them.
+CATALOG_VERSION_KEY = 'store:catalog:version'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+STOCK_LEVELS_KEY = 'store:catalog:stock-levels'
+STOCK_LEVELS_CACHE_TIMEOUT = 5
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Cold or evicted: start a fresh version rather than reviving old entries.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    """
+    Marks every cached catalog page stale, for product edits. Deferred until the surrounding
+    transaction commits, so a request racing the write cannot re-cache the old rows under
+    the new version.
+    """
+    transaction.on_commit(lambda: cache.set(CATALOG_VERSION_KEY, time.time_ns(), None))
+
+
+def _filters_key(filters):
+    return hashlib.md5(json.dumps(filters, cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def get_cached_catalog(filters, build):
+    """
+    Returns (data, etag) for a catalog request, calling `build()` to serialize the
+    catalog only on a cache miss for this combination of `filters`. `filters` must be the
+    request's validated, normalized filters, never the raw query string: every distinct
+    key is another cache entry and another full build.
+    """
+    version = catalog_version()
+    key = f'store:catalog:{version}:{_filters_key(filters)}'
+    entry = cache.get(key)
+    if entry is None:
+        data = build()
+        entry = {'data': data, 'etag': content_etag(data)}
+        cache.set(key, entry, CATALOG_CACHE_TIMEOUT)
+    return entry['data'], entry['etag']
+
+
+def get_stock_levels():
+    """
+    {product_id: (stock_quantity, available_quantity)} for every active limited-stock
+    product, at most STOCK_LEVELS_CACHE_TIMEOUT seconds old; one query when it isn't cached.
+    """
+    levels = cache.get(STOCK_LEVELS_KEY)
+    if levels is None:
+        levels = {
+            product.pk: (product.stock_quantity, product.available_quantity)
+            for product in Product.objects.filter(is_active=True, stock_quantity__isnull=False)
+            .with_held_quantity().only('pk', 'stock_quantity')
+        }
+        cache.set(STOCK_LEVELS_KEY, levels, STOCK_LEVELS_CACHE_TIMEOUT)
+    return levels
+
+
+def content_etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return f'"{hashlib.md5(body).hexdigest()}"'
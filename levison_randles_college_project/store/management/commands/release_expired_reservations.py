@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.reservation_service import ReservationService
+
+
+class Command(BaseCommand):
+    help = (
+        "Releases expired stock reservations in bulk, returning their units to sale. "
+        "Run once from cron, or with --loop as a long-running background sweeper."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping until interrupted.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between sweeps with --loop.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        service = ReservationService()
+        while True:
+            released = self.sweep(service, options['batch_size'])
+            if released:
+                self.stdout.write(f"Released {released} expired reservation(s).")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, service, batch_size):
+        # Drain in batches so a large backlog doesn't hold one huge transaction open.
+        total = 0
+        while True:
+            released = service.release_expired(batch_size=batch_size)
+            total += released
+            if released < batch_size:
+                return total
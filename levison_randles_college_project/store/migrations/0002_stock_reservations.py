@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, help_text='Units currently held by unexpired checkout reservations. Maintained by the reservation service.', verbose_name='reserved quantity'),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='quantity')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='After this time the hold no longer guarantees stock and will be released.', verbose_name='expires at')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('product', models.ForeignKey(help_text='The product being held.', on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='store.product')),
+                ('user', models.ForeignKey(help_text='The shopper holding the units.', on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Stock Reservation',
+                'verbose_name_plural': 'Stock Reservations',
+                'ordering': ['expires_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:18
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+def backfill_meta_columns(apps, schema_editor):
+    # Mirrors Product.sync_meta_columns for rows saved before the columns existed.
+    Product = apps.get_model('store', 'Product')
+
+    def as_int(value):
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def as_decimal(value):
+        try:
+            return Decimal(str(value)).quantize(Decimal('0.01')) if value is not None else None
+        except (InvalidOperation, ValueError):
+            return None
+
+    products = []
+    for product in Product.objects.exclude(meta_data=None).only('id', 'meta_data').iterator():
+        meta_data = product.meta_data if isinstance(product.meta_data, dict) else {}
+        product.meta_course_id = as_int(meta_data.get('course_id'))
+        product.meta_event_id = as_int(meta_data.get('event_id'))
+        product.meta_credit_amount = as_decimal(meta_data.get('credit_amount'))
+        products.append(product)
+    Product.objects.bulk_update(
+        products, ['meta_course_id', 'meta_event_id', 'meta_credit_amount'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='meta_course_id',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='course ID (from meta data)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='meta_credit_amount',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='credit amount (from meta data)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='meta_event_id',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='event ID (from meta data)'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['item_type', 'price'], name='product_active_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price'], name='product_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name'], name='product_active_name_idx'),
+        ),
+        migrations.RunPython(backfill_meta_columns, migrations.RunPython.noop),
+    ]
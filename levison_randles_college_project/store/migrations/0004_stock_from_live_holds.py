@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_product_meta_columns_and_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='product',
+            name='reserved_quantity',
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(fields=['product', 'expires_at', 'quantity'], name='reservation_product_live_idx'),
+        ),
+        # After reservation_product_live_idx exists, which makes the FK's own index redundant.
+        migrations.AlterField(
+            model_name='stockreservation',
+            name='product',
+            field=models.ForeignKey(db_index=False, help_text='The product being held.', on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='store.product'),
+        ),
+    ]
@@ -1,8 +1,60 @@
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal, InvalidOperation # Import InvalidOperation
 from django.core.exceptions import ValidationError
 
+class ProductQuerySet(models.QuerySet):
+    def with_held_quantity(self, now=None):
+        """
+        Annotates held_quantity, the units held by unexpired reservations (see
+        Product.available_quantity), in the same query: one range of
+        reservation_product_live_idx per product.
+        """
+        held = StockReservation.objects.live(now).filter(product=OuterRef('pk')).order_by().values(
+            'product'
+        ).annotate(total=Sum('quantity')).values('total')
+        return self.annotate(held_quantity=Coalesce(Subquery(held), 0))
+
+    def available(self):
+        """
+        Products with stock left outside live holds (or unlimited stock). Needs
+        with_held_quantity(); each product's holds are summed from reservation_product_live_idx.
+        """
+        return self.filter(models.Q(stock_quantity__isnull=True) | models.Q(stock_quantity__gt=F('held_quantity')))
+
+    # The meta_* columns are copies of meta_data (see Product.sync_meta_columns). save() keeps
+    # them in step; these keep the bulk writes, which bypass save(), in step too.
+
+    def update(self, **kwargs):
+        # Unless the meta_* columns are being set as well, as bulk_update() below does.
+        if 'meta_data' in kwargs and not kwargs.keys() & set(Product.META_COLUMNS):
+            if hasattr(kwargs['meta_data'], 'resolve_expression'):
+                raise TypeError(
+                    "Product.meta_data can't be updated with an expression, as its meta_* columns are "
+                    "derived from it in Python. Save the products instead."
+                )
+            kwargs.update(Product.meta_columns(kwargs['meta_data']))
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.sync_meta_columns()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if 'meta_data' in fields:
+            for obj in objs:
+                obj.sync_meta_columns()
+            fields = [*fields, *self.model.META_COLUMNS]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class Product(models.Model):
     PRODUCT_ITEM_TYPES = [
         ('digital_good', _('Digital Good')),
@@ -47,12 +99,60 @@ class Product(models.Model):
         blank=True,
         help_text=_("To store item_type specific data, e.g., course_id, event_id, credit_amount.")
     )
+    # Hot meta_data keys copied into real, indexed columns on save, so lookups such as
+    # "products that grant access to course X" are index lookups instead of JSON scans.
+    # Always derived from meta_data; never set these directly.
+    meta_course_id = models.IntegerField(_("course ID (from meta data)"), null=True, blank=True, db_index=True, editable=False)
+    meta_event_id = models.IntegerField(_("event ID (from meta data)"), null=True, blank=True, db_index=True, editable=False)
+    meta_credit_amount = models.DecimalField(
+        _("credit amount (from meta data)"), max_digits=10, decimal_places=2,
+        null=True, blank=True, db_index=True, editable=False
+    )
     created_at = models.DateTimeField(_("created at"), auto_now_add=True)
     updated_at = models.DateTimeField(_("updated at"), auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    META_COLUMNS = ('meta_course_id', 'meta_event_id', 'meta_credit_amount')
+
+    @staticmethod
+    def meta_columns(meta_data):
+        """The values of the indexed meta_* columns for `meta_data`."""
+        meta_data = meta_data if isinstance(meta_data, dict) else {}
+        return {
+            'meta_course_id': _as_int(meta_data.get('course_id')),
+            'meta_event_id': _as_int(meta_data.get('event_id')),
+            'meta_credit_amount': _as_decimal(meta_data.get('credit_amount')),
+        }
+
+    def sync_meta_columns(self):
+        """Copies course_id, event_id and credit_amount out of meta_data into their indexed columns."""
+        for name, value in self.meta_columns(self.meta_data).items():
+            setattr(self, name, value)
+
+    def save(self, *args, **kwargs):
+        self.sync_meta_columns()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'meta_data' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | set(self.META_COLUMNS)
+        super().save(*args, **kwargs)
+
+    @property
+    def available_quantity(self):
+        """
+        Stock not held by anyone's unexpired reservation. None means unlimited.
+        Uses held_quantity when loaded with Product.objects.with_held_quantity().
+        """
+        if self.stock_quantity is None:
+            return None
+        held = getattr(self, 'held_quantity', None)
+        if held is None:
+            held = StockReservation.objects.live().filter(product=self).aggregate(total=Sum('quantity'))['total'] or 0
+        return max(self.stock_quantity - held, 0)
+
     def clean(self):
         super().clean()
         if self.price is not None and self.price < Decimal('0.00'): # Price should not be negative
@@ -95,3 +195,75 @@ class Product(models.Model):
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
         ordering = ['name']
+        indexes = [
+            # The storefront only ever lists active products; these cover its item_type and price filters
+            # and the default name ordering without indexing inactive rows.
+            models.Index(fields=['item_type', 'price'], condition=models.Q(is_active=True), name='product_active_type_price_idx'),
+            models.Index(fields=['price'], condition=models.Q(is_active=True), name='product_active_price_idx'),
+            models.Index(fields=['name'], condition=models.Q(is_active=True), name='product_active_name_idx'),
+        ]
+
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_decimal(value):
+    try:
+        number = Decimal(str(value)).quantize(Decimal('0.01')) if value is not None else None
+    except (InvalidOperation, ValueError):
+        return None
+    return number if number is None or number.is_finite() else None # NaN quantizes without error
+
+
+class StockReservationQuerySet(models.QuerySet):
+    def live(self, now=None):
+        """Holds that still count against stock. Expired ones stop counting the moment they expire."""
+        return self.filter(expires_at__gt=now or timezone.now())
+
+
+class StockReservation(models.Model):
+    """
+    A short-lived hold on units of a limited-stock product, placed when a shopper
+    starts checkout. Until it expires its quantity is not available to anyone else:
+    availability is the product's stock minus the sum of its live holds, so placing or
+    releasing a hold never writes to the product row. Expired rows are deleted in bulk
+    by the `release_expired_reservations` command.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservations',
+        db_index=False, # Covered by reservation_product_live_idx, which leads with product
+        help_text=_("The product being held.")
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations',
+        help_text=_("The shopper holding the units.")
+    )
+    quantity = models.PositiveIntegerField(_("quantity"), default=1)
+    expires_at = models.DateTimeField(
+        _("expires at"),
+        db_index=True, # The sweeper scans by expiry
+        help_text=_("After this time the hold no longer guarantees stock and will be released.")
+    )
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+
+    objects = StockReservationQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product} held by {self.user} until {self.expires_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = _("Stock Reservation")
+        verbose_name_plural = _("Stock Reservations")
+        ordering = ['expires_at']
+        indexes = [
+            # A product's live holds and their quantities: summing them never reads the table.
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='reservation_product_live_idx'),
+        ]
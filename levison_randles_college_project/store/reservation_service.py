@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+DEFAULT_RESERVATION_TTL_SECONDS = 10 * 60
+DEFAULT_MAX_HELD_PER_USER = 10
+
+
+class ReservationError(Exception):
+    """
+    Raised when a hold cannot be placed. `code` identifies the reason
+    so views can map it to a response status.
+    """
+    def __init__(self, detail, code):
+        super().__init__(detail)
+        self.detail = detail
+        self.code = code
+
+
+class ReservationService:
+    """
+    Places and releases short-lived holds on limited-stock products.
+
+    A product's availability is its stock minus the sum of its live holds, read off
+    reservation_product_live_idx. Placing a hold locks the product row, inserts the hold
+    and then checks that sum, including the new hold, before committing; releasing one
+    deletes its row. The row lock serializes holds on the same product, so two shoppers
+    racing for the last units can never both get a hold (and then a 409 at checkout).
+    Holds on different products don't wait for each other, the product row itself is never
+    written, and expiry needs no write at all: an expired hold just stops counting.
+
+    Each shopper may hold at most `max_per_user` units of a product at once
+    (settings.STORE_RESERVATION_MAX_PER_USER), so no single account can hold a drop back
+    from everyone else.
+    """
+
+    def __init__(self, ttl_seconds=None, max_per_user=None):
+        if ttl_seconds is None:
+            ttl_seconds = getattr(settings, 'STORE_RESERVATION_TTL_SECONDS', DEFAULT_RESERVATION_TTL_SECONDS)
+        self.ttl = timedelta(seconds=ttl_seconds)
+        if max_per_user is None:
+            max_per_user = getattr(settings, 'STORE_RESERVATION_MAX_PER_USER', DEFAULT_MAX_HELD_PER_USER)
+        self.max_per_user = max_per_user
+
+    def reserve(self, user, product_id, quantity=1):
+        with transaction.atomic():
+            try:
+                # Holds on this product queue here until the one ahead has committed or rolled back.
+                product = Product.objects.select_for_update().get(pk=product_id, is_active=True)
+            except Product.DoesNotExist:
+                raise ReservationError("This product does not exist or is not available for purchase.", 'unavailable')
+
+            if product.stock_quantity is None:
+                raise ReservationError("This product has unlimited stock and does not need a reservation.", 'not_limited')
+
+            now = timezone.now()
+            # Insert first, then count: SQLite has no row locks, but the insert takes its
+            # write lock before the sums are read. Raising rolls the insert back.
+            reservation = StockReservation.objects.create(
+                product=product,
+                user=user,
+                quantity=quantity,
+                expires_at=now + self.ttl,
+            )
+            holds = StockReservation.objects.live(now).filter(product=product)
+            held = holds.aggregate(
+                total=Sum('quantity'),
+                by_user=Sum('quantity', filter=Q(user=user)),
+            )
+            if held['total'] > product.stock_quantity:
+                raise ReservationError("Not enough stock left to reserve.", 'out_of_stock')
+            if held['by_user'] > self.max_per_user:
+                raise ReservationError(
+                    f"You can hold at most {self.max_per_user} units of this product at a time.", 'hold_limit'
+                )
+
+        return reservation
+
+    def release(self, reservation):
+        """Releases a single hold early, e.g. when the shopper abandons checkout."""
+        deleted, _ = StockReservation.objects.filter(pk=reservation.pk).delete()
+        return bool(deleted)
+
+    def release_expired(self, now=None, batch_size=1000):
+        """
+        Deletes up to `batch_size` expired holds in one DELETE. They stopped counting against
+        stock when they expired; this only keeps the table small. Returns the number deleted.
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            # skip_locked lets several sweepers run side by side and skips holds a
+            # checkout is consuming right now (no-op on SQLite).
+            expired = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not expired:
+                return 0
+            StockReservation.objects.filter(id__in=expired).delete()
+        return len(expired)
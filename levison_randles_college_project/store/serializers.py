@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Product
+from .models import Product, StockReservation
 
 class ProductSerializer(serializers.ModelSerializer):
     availability = serializers.SerializerMethodField()
@@ -26,13 +26,35 @@ class ProductSerializer(serializers.ModelSerializer):
         )
 
     def get_availability(self, obj):
-        if obj.stock_quantity is None:
+        # Units held by live checkout reservations are not available to other shoppers.
+        # The catalog loads held_quantity with the products, so this costs no extra query.
+        return self.availability_label(obj.available_quantity)
+
+    OUT_OF_STOCK = "Out of Stock"
+
+    @classmethod
+    def availability_label(cls, available):
+        """The availability shown for `available` units (None: unlimited)."""
+        if available is None:
             return "Unlimited"
-        elif obj.stock_quantity > 0:
+        elif available > 0:
             return "In Stock"
         else:
-            return "Out of Stock"
+            return cls.OUT_OF_STOCK
 
     # If stock_quantity should not be exposed directly to clients, remove it from 'fields'
     # and rely solely on 'availability'. For now, keeping it for completeness.
     # If meta_data contains sensitive info, consider a custom representation or exclude it.
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(help_text="The ID of the product to reserve.")
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = StockReservation
+        fields = ('id', 'product_id', 'product_name', 'quantity', 'expires_at', 'created_at')
+        read_only_fields = ('id', 'product_name', 'expires_at', 'created_at')
+        extra_kwargs = {
+            'quantity': {'min_value': 1, 'max_value': 100},
+        }
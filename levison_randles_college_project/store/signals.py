@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product
+from .catalog_cache import invalidate_catalog
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_on_product_change(sender, instance, **kwargs):
+    # Edits to a product. Stock changes by checkouts and holds don't need this: the catalog
+    # reads stock levels from their own short-lived cache (see catalog_cache).
+    invalidate_catalog()
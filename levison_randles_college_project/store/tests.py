@@ -1,3 +1,285 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from transactions.checkout_service import CheckoutError, CheckoutService
+from .catalog_cache import STOCK_LEVELS_KEY
+from .models import Product, ProductQuerySet, StockReservation
+from .reservation_service import ReservationError, ReservationService
+
+
+class ReservationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ticket = Product.objects.create(
+            name='Gala ticket', description='...', price=Decimal('5.00'), item_type='event_ticket', stock_quantity=5
+        )
+        cls.alice = User.objects.create(email='alice@example.com', role='student', balance=Decimal('100.00'))
+        cls.bob = User.objects.create(email='bob@example.com', role='student', balance=Decimal('100.00'))
+
+    def setUp(self):
+        self.service = ReservationService(max_per_user=3)
+
+    def available(self):
+        return Product.objects.get(pk=self.ticket.pk).available_quantity
+
+    def assertReservationError(self, code, *args):
+        with self.assertRaises(ReservationError) as raised:
+            self.service.reserve(*args)
+        self.assertEqual(raised.exception.code, code)
+
+    def test_holds_reduce_availability_without_touching_the_product(self):
+        updated_at = self.ticket.updated_at
+        self.service.reserve(self.alice, self.ticket.pk, 2)
+        self.assertEqual(self.available(), 3)
+        self.assertEqual(Product.objects.get(pk=self.ticket.pk).updated_at, updated_at)
+
+    def test_holds_never_exceed_stock(self):
+        self.service.reserve(self.alice, self.ticket.pk, 3)
+        self.assertReservationError('out_of_stock', self.bob, self.ticket.pk, 3)
+        self.service.reserve(self.bob, self.ticket.pk, 2)
+        self.assertEqual(self.available(), 0)
+        self.assertEqual(StockReservation.objects.count(), 2) # The rejected hold was rolled back
+
+    def test_holds_on_a_product_are_serialized_by_its_row_lock(self):
+        locked = []
+        select_for_update = ProductQuerySet.select_for_update
+
+        def recording_lock(queryset, *args, **kwargs):
+            locked.append(StockReservation.objects.count())
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(ProductQuerySet, 'select_for_update', recording_lock):
+            self.service.reserve(self.alice, self.ticket.pk, 1)
+        self.assertEqual(locked, [0]) # Locked before the hold was inserted
+
+    def test_each_shopper_can_hold_only_so_many_units(self):
+        self.service.reserve(self.alice, self.ticket.pk, 2)
+        self.assertReservationError('hold_limit', self.alice, self.ticket.pk, 2)
+        self.service.reserve(self.alice, self.ticket.pk, 1)
+        self.service.reserve(self.bob, self.ticket.pk, 2)
+
+    def test_expired_holds_stop_counting_and_are_swept(self):
+        expired = self.service.reserve(self.alice, self.ticket.pk, 3)
+        StockReservation.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.available(), 5)
+        self.service.reserve(self.alice, self.ticket.pk, 3) # The expired units don't count against the limit either
+        self.assertEqual(self.service.release_expired(), 1)
+        self.assertEqual(self.available(), 2)
+
+    def test_release_returns_units(self):
+        reservation = self.service.reserve(self.alice, self.ticket.pk, 3)
+        self.assertTrue(self.service.release(reservation))
+        self.assertFalse(self.service.release(reservation))
+        self.assertEqual(self.available(), 5)
+
+    def test_checkout_of_a_hold_consumes_it(self):
+        reservation = self.service.reserve(self.alice, self.ticket.pk, 3)
+        CheckoutService().checkout(self.alice, reservation_id=reservation.pk)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.ticket.pk).stock_quantity, 2)
+        self.assertEqual(self.available(), 2)
+
+    def test_held_units_are_not_for_sale(self):
+        self.service.reserve(self.alice, self.ticket.pk, 3)
+        with self.assertRaises(CheckoutError) as raised:
+            CheckoutService().checkout(self.bob, product_id=self.ticket.pk, quantity=3)
+        self.assertEqual(raised.exception.code, 'out_of_stock')
+        CheckoutService().checkout(self.bob, product_id=self.ticket.pk, quantity=2)
+        self.assertEqual(self.available(), 0)
+
+    def test_reserve_endpoint_maps_the_hold_limit_to_a_conflict(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        with self.settings(STORE_RESERVATION_MAX_PER_USER=1):
+            response = client.post('/api/store/reservations/', {'product_id': self.ticket.pk, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['code'], 'hold_limit')
+
+    def test_catalog_loads_availability_with_the_products(self):
+        self.service.reserve(self.alice, self.ticket.pk, 3)
+        self.service.reserve(self.bob, self.ticket.pk, 2)
+        Product.objects.create(name='Notes', description='...', price=Decimal('1.00'), item_type='digital_good')
+        with self.assertNumQueries(1):
+            availability = {product.name: product.available_quantity for product in Product.objects.with_held_quantity()}
+        self.assertEqual(availability, {'Gala ticket': 0, 'Notes': None})
+
+    @skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+    def test_held_units_are_summed_from_the_covering_index(self):
+        sql, params = Product.objects.with_held_quantity().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING COVERING INDEX reservation_product_live_idx', plan)
+
+
+class CatalogCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ticket = Product.objects.create(
+            name='Gala ticket', description='...', price=Decimal('5.00'), item_type='event_ticket', stock_quantity=2
+        )
+        Product.objects.create(name='Notes', description='...', price=Decimal('1.00'), item_type='digital_good')
+        cls.alice = User.objects.create(email='alice@example.com', role='student')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/store/products/', params, **headers)
+
+    def test_unchanged_catalog_is_a_304_without_queries(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.get(etag=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_alone_never_answers_304(self):
+        self.get()
+        response = self.client.get('/api/store/products/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_holds_show_up_once_stock_levels_expire_without_rebuilding_the_catalog(self):
+        etag = self.get()['ETag']
+        ReservationService().reserve(self.alice, self.ticket.pk, 2)
+        self.assertEqual(self.get(etag=etag).status_code, 304) # Stock levels are cached briefly
+
+        cache.delete(STOCK_LEVELS_KEY) # As if STOCK_LEVELS_CACHE_TIMEOUT had passed
+        with self.assertNumQueries(1): # Stock levels only; the products come from the cache
+            response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(
+            {product['name']: product['availability'] for product in response.json()},
+            {'Gala ticket': 'Out of Stock', 'Notes': 'Unlimited'},
+        )
+        self.assertEqual([product['name'] for product in self.get(available='true').json()], ['Notes'])
+
+    def test_editing_a_product_rebuilds_the_catalog(self):
+        etag = self.get()['ETag']
+        self.ticket.price = Decimal('6.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.save()
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('6.00', {product['price'] for product in response.json()})
+
+    def test_catalog_is_cached_per_normalized_filters_only(self):
+        self.get(item_type='digital_good,event_ticket', max_price='5')
+        with self.assertNumQueries(0):
+            response = self.get(item_type='event_ticket, digital_good', max_price='5.00', junk='1', page_size='9')
+        self.assertEqual(len(response.json()), 2)
+        with self.assertNumQueries(1):
+            self.get(item_type='event_ticket')
+
+    def test_searches_are_not_cached(self):
+        self.get() # Caches the stock levels
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                response = self.get(search='gala')
+            self.assertEqual([product['name'] for product in response.json()], ['Gala ticket'])
+        etag = response['ETag']
+        self.assertEqual(self.get(etag=etag, search='gala').status_code, 304)
+
+    def test_price_bounds_must_be_finite_numbers(self):
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf', 'cheap'):
+            response = self.get(min_price=value)
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('min_price', response.json())
+        self.assertEqual([product['name'] for product in self.get(max_price='2').json()], ['Notes'])
+
+
+class ProductFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ticket = Product.objects.create(
+            name='Gala ticket', description='Evening event', price=Decimal('5.00'), item_type='event_ticket',
+            stock_quantity=1, meta_data={'event_id': 7},
+        )
+        cls.access = Product.objects.create(
+            name='Algebra notes', description='Access to the course notes', price=Decimal('3.00'),
+            item_type='course_material_access', meta_data={'course_id': 12},
+        )
+        cls.credit = Product.objects.create(
+            name='Credit pack', description='...', price=Decimal('10.00'), item_type='internal_credit_purchase',
+            meta_data={'credit_amount': '10'},
+        )
+        Product.objects.create(
+            name='Retired', description='...', price=Decimal('1.00'), item_type='digital_good', is_active=False
+        )
+        cls.alice = User.objects.create(email='alice@example.com', role='student')
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, **params):
+        response = APIClient().get('/api/store/products/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [product['name'] for product in response.json()]
+
+    def test_item_type_filter(self):
+        self.assertEqual(self.names(item_type='event_ticket,internal_credit_purchase'), ['Credit pack', 'Gala ticket'])
+        self.assertEqual(APIClient().get('/api/store/products/', {'item_type': 'ticket'}).status_code, 400)
+
+    def test_course_and_event_filters_use_the_meta_columns(self):
+        self.assertEqual(self.names(course_id='12'), ['Algebra notes'])
+        self.assertEqual(self.names(event_id='7'), ['Gala ticket'])
+        self.assertEqual(self.names(event_id='12'), [])
+        self.assertEqual(APIClient().get('/api/store/products/', {'course_id': 'x'}).status_code, 400)
+
+    def test_ordering(self):
+        self.assertEqual(self.names(), ['Algebra notes', 'Credit pack', 'Gala ticket'])
+        self.assertEqual(self.names(ordering='-price'), ['Credit pack', 'Gala ticket', 'Algebra notes'])
+        self.assertEqual(APIClient().get('/api/store/products/', {'ordering': 'stock'}).status_code, 400)
+
+    def test_search_matches_name_or_description(self):
+        self.assertEqual(self.names(search='EVENT'), ['Gala ticket'])
+        self.assertEqual(self.names(search='notes'), ['Algebra notes'])
+
+    def test_available_is_filtered_by_the_query_against_current_holds(self):
+        self.assertEqual(self.names(available='true'), ['Algebra notes', 'Credit pack', 'Gala ticket'])
+        ReservationService().reserve(self.alice, self.ticket.pk, 1)
+        self.assertEqual(self.names(available='true'), ['Algebra notes', 'Credit pack'])
+
+    @skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+    def test_available_filter_is_an_index_query(self):
+        queryset = Product.objects.filter(is_active=True, item_type='event_ticket').with_held_quantity().available()
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX product_active_type_price_idx', plan)
+        self.assertNotIn('SCAN U0', plan)
+        self.assertIn('USING COVERING INDEX reservation_product_live_idx', plan)
+
+    def test_meta_columns_follow_meta_data_through_bulk_writes(self):
+        Product.objects.filter(pk=self.access.pk).update(meta_data={'course_id': 13, 'event_id': '8'})
+        self.assertEqual(self.names(course_id='13'), ['Algebra notes'])
+        self.assertEqual(self.names(event_id='8'), ['Algebra notes'])
+
+        self.credit.meta_data = {'credit_amount': 'NaN'}
+        Product.objects.bulk_update([self.credit], ['meta_data'])
+        self.assertIsNone(Product.objects.get(pk=self.credit.pk).meta_credit_amount)
+
+        [created] = Product.objects.bulk_create([Product(
+            name='Workshop', description='...', price=Decimal('2.00'), item_type='event_ticket', meta_data={'event_id': 9}
+        )])
+        self.assertEqual(Product.objects.get(pk=created.pk).meta_event_id, 9)
 
-# Create your tests here.
+        with self.assertRaises(TypeError):
+            Product.objects.update(meta_data=F('meta_data'))
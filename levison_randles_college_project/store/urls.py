@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import ProductListView
+from .views import ProductListView, StockReservationListCreateView, StockReservationDetailView
 
 urlpatterns = [
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('reservations/', StockReservationListCreateView.as_view(), name='reservation-list'),
+    path('reservations/<int:pk>/', StockReservationDetailView.as_view(), name='reservation-detail'),
     # Future: Add endpoint for product detail if needed
     # path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
 ]
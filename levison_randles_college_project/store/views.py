@@ -1,21 +1,189 @@
-from rest_framework import generics, permissions
-from .models import Product
-from .serializers import ProductSerializer
-# For filtering, if added later:
-# from django_filters.rest_framework import DjangoFilterBackend
-# from rest_framework import filters
+from django.utils import timezone
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from .models import Product, StockReservation
+from .serializers import ProductSerializer, StockReservationSerializer
+from .reservation_service import ReservationService, ReservationError
+from .catalog_cache import content_etag, get_cached_catalog, get_stock_levels
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.db.models import Q
+from decimal import Decimal, InvalidOperation
+from rest_framework.exceptions import ValidationError
 
 class ProductListView(generics.ListAPIView):
     """
     API endpoint to list all active, purchasable products.
+    Optional query params:
+    - item_type: one or more comma-separated item types
+    - min_price / max_price: inclusive price bounds
+    - available: 'true' to hide sold-out products
+    - course_id / event_id: products linked to that course or event via meta_data
+    - search: case-insensitive match on name or description
+    - ordering: name (default), price, -price, created_at or -created_at
     """
-    queryset = Product.objects.filter(is_active=True).order_by('name')
+    queryset = Product.objects.filter(is_active=True).with_held_quantity().order_by('name')
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny] # Products are publicly viewable
 
-    # Optional: Add filtering backends if more complex filtering is needed later
-    # filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    # filterset_fields = ['item_type'] # Example if Product model had more filterable direct fields
-    # search_fields = ['name', 'description', 'meta_data__icontains'] # Search in name, desc, and JSON
-    # ordering_fields = ['price', 'name', 'created_at']
-    # ordering = ['name'] # Default ordering (already in queryset)
+    ORDERING_FIELDS = ('name', 'price', '-price', 'created_at', '-created_at')
+
+    def get_queryset(self):
+        # Filters map onto the partial (is_active) indexes on item_type/price/name and the
+        # indexed meta_course_id / meta_event_id columns, never onto the meta_data JSON itself.
+        queryset = super().get_queryset()
+        filters = self.get_filters()
+
+        if filters['item_type']:
+            queryset = queryset.filter(item_type__in=filters['item_type'])
+        if filters['min_price'] is not None:
+            queryset = queryset.filter(price__gte=filters['min_price'])
+        if filters['max_price'] is not None:
+            queryset = queryset.filter(price__lte=filters['max_price'])
+        if filters['course_id'] is not None:
+            queryset = queryset.filter(meta_course_id=filters['course_id'])
+        if filters['event_id'] is not None:
+            queryset = queryset.filter(meta_event_id=filters['event_id'])
+        if filters['search']:
+            queryset = queryset.filter(Q(name__icontains=filters['search']) | Q(description__icontains=filters['search']))
+        if filters['available']:
+            queryset = queryset.available()
+        return queryset.order_by(filters['ordering'], 'pk')
+
+    def get_filters(self):
+        """
+        The recognized query params, validated and normalized, so that equivalent requests
+        (?item_type=a,b or b,a, ?max_price=5 or 5.00) look the same. Any other param is ignored.
+        """
+        if hasattr(self, '_filters'):
+            return self._filters
+        params = self.request.query_params
+
+        item_types = sorted({t.strip() for t in params.get('item_type', '').split(',') if t.strip()})
+        valid_types = {choice[0] for choice in Product.PRODUCT_ITEM_TYPES}
+        invalid = [t for t in item_types if t not in valid_types]
+        if invalid:
+            raise ValidationError({'item_type': f"Invalid item type(s) {invalid}. Must be among {sorted(valid_types)}."})
+
+        ordering = params.get('ordering') or 'name'
+        if ordering not in self.ORDERING_FIELDS:
+            raise ValidationError({'ordering': f"Must be one of {list(self.ORDERING_FIELDS)}."})
+
+        self._filters = {
+            'item_type': item_types,
+            'min_price': self._decimal_param('min_price'),
+            'max_price': self._decimal_param('max_price'),
+            'course_id': self._int_param('course_id'),
+            'event_id': self._int_param('event_id'),
+            'search': params.get('search', '').strip(),
+            'available': params.get('available', '').lower() in ('true', '1'),
+            'ordering': ordering,
+        }
+        return self._filters
+
+    def _decimal_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({name: "Must be a decimal number."})
+        if not number.is_finite(): # 'NaN' and 'Infinity' parse, but can't be compared with prices
+            raise ValidationError({name: "Must be a decimal number."})
+        return number.normalize()
+
+    def _int_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: "Must be an integer."})
+
+    def list(self, request, *args, **kwargs):
+        # The catalog is the same for every visitor, so the serialized products are cached per
+        # combination of filters (see get_filters) until a product is edited. Stock levels change
+        # with every purchase and hold, so they come from their own short-lived cache and are
+        # laid over the cached products. Two kinds of request always query instead: free-text
+        # searches, which are too varied to be worth caching and would only crowd out the filter
+        # pages, and `available`, whose result depends on the current holds.
+        filters = self.get_filters()
+        build = lambda: super(ProductListView, self).list(request, *args, **kwargs).data
+        if filters['search'] or filters['available']:
+            products = build()
+            etag = content_etag(products)
+        else:
+            data, etag = get_cached_catalog(filters, build)
+            levels = get_stock_levels()
+            products = []
+            for product in data:
+                if product['id'] in levels:
+                    stock_quantity, available = levels[product['id']]
+                    product = {
+                        **product,
+                        'stock_quantity': stock_quantity,
+                        'availability': ProductSerializer.availability_label(available),
+                    }
+                products.append(product)
+            etag = content_etag([etag, [levels.get(product['id']) for product in data]])
+
+        # Answers If-None-Match with a 304 when the client's copy is current. No Last-Modified:
+        # its one-second resolution could call a copy current that misses a change made in
+        # the same second.
+        not_modified = get_conditional_response(request, etag=etag)
+        response = not_modified if not_modified is not None else Response(products)
+        response['ETag'] = etag
+        # Let browsers and CDNs keep a copy but revalidate it each time, which is a cheap 304.
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+
+class StockReservationListCreateView(generics.ListCreateAPIView):
+    """
+    API endpoint for placing a short-lived hold on a limited-stock product before checkout.
+    GET: Lists the user's unexpired reservations.
+    POST: Reserves `quantity` units of `product_id`. Check out with the returned reservation ID.
+    """
+    serializer_class = StockReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    ERROR_STATUSES = {
+        'unavailable': status.HTTP_404_NOT_FOUND,
+        'not_limited': status.HTTP_400_BAD_REQUEST,
+        'out_of_stock': status.HTTP_409_CONFLICT,
+        'hold_limit': status.HTTP_409_CONFLICT,
+    }
+
+    def get_queryset(self):
+        return StockReservation.objects.filter(
+            user=self.request.user, expires_at__gt=timezone.now()
+        ).select_related('product')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            reservation = ReservationService().reserve(
+                request.user,
+                serializer.validated_data['product_id'],
+                serializer.validated_data.get('quantity', 1),
+            )
+        except ReservationError as e:
+            return Response({"detail": e.detail, "code": e.code}, status=self.ERROR_STATUSES[e.code])
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+
+class StockReservationDetailView(generics.RetrieveDestroyAPIView):
+    """
+    API endpoint for a single reservation of the current user.
+    DELETE releases the hold early so the units go back on sale.
+    """
+    serializer_class = StockReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return StockReservation.objects.filter(user=self.request.user).select_related('product')
+
+    def perform_destroy(self, instance):
+        ReservationService().release(instance)
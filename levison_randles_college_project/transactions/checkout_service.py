@@ -0,0 +1,161 @@
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from store.models import Product, StockReservation
+from courses.models import Course, Enrollment
+from courses.enrollment_service import sync_seat_counts
+from courses.notifications import update_course_subscriptions
+from .models import PurchaseOrder
+
+User = get_user_model()
+
+
+class CheckoutError(Exception):
+    """
+    Raised when a checkout cannot be completed. `code` identifies the reason
+    so views can map it to a response status.
+    """
+    def __init__(self, detail, code):
+        super().__init__(detail)
+        self.detail = detail
+        self.code = code
+
+
+class CheckoutService:
+    """
+    Buys a product with the user's internal balance.
+
+    Every balance and stock change is a single conditional UPDATE
+    (e.g. `SET stock_quantity = stock_quantity - q WHERE stock_quantity >= q`),
+    so there is no read-modify-write. The database re-checks the WHERE clause
+    against the committed row, which is what prevents overselling when many
+    buyers race for the last tickets. Units held by other shoppers' live
+    reservations are not for sale: without a reservation, the product row is
+    locked just before the stock UPDATE, as ReservationService does for a new
+    hold, so a hold being placed at the same moment is counted.
+
+    All writes happen in one transaction and always touch rows in the same
+    order (reservation, user, then product), so concurrent checkouts cannot
+    deadlock. The contended product row is updated last, keeping its lock held
+    as briefly as possible.
+    """
+
+    def checkout(self, user, product_id=None, quantity=1, reservation_id=None):
+        """
+        Places an order. With `reservation_id` the product and quantity come from the
+        shopper's stock hold, which is consumed; otherwise only unreserved stock can be bought.
+        """
+        reservation = None
+        if reservation_id is not None:
+            reservation = StockReservation.objects.filter(pk=reservation_id, user=user).first()
+            if reservation is None or reservation.expires_at <= timezone.now():
+                raise CheckoutError("Your reservation has expired. Please reserve the item again.", 'reservation_expired')
+            product_id, quantity = reservation.product_id, reservation.quantity
+
+        try:
+            product = Product.objects.with_held_quantity().get(pk=product_id, is_active=True)
+        except Product.DoesNotExist:
+            raise CheckoutError("This product does not exist or is not available for purchase.", 'unavailable')
+
+        # Cheap, non-authoritative pre-check so a sold-out drop fails before doing any writes.
+        # The conditional UPDATE below is the real guard.
+        if reservation is None and product.available_quantity is not None and product.available_quantity < quantity:
+            raise CheckoutError("Not enough stock left for this product.", 'out_of_stock')
+
+        # A product whose meta_data can't be fulfilled is refused before any money moves.
+        grant = self.fulfilment(product, quantity)
+        total_amount = product.price * quantity
+
+        with transaction.atomic():
+            if reservation is not None:
+                # Deleting the hold claims it; if the sweeper got there first nothing is deleted.
+                claimed, _ = StockReservation.objects.filter(
+                    pk=reservation.pk, expires_at__gt=timezone.now()
+                ).delete()
+                if not claimed:
+                    raise CheckoutError("Your reservation has expired. Please reserve the item again.", 'reservation_expired')
+
+            debited = User.objects.filter(pk=user.pk, balance__gte=total_amount).update(
+                balance=F('balance') - total_amount
+            )
+            if not debited:
+                raise CheckoutError("Insufficient balance.", 'insufficient_balance')
+
+            self.fulfil(user, product, grant)
+
+            order = PurchaseOrder.objects.create(
+                user=user,
+                product=product,
+                quantity=quantity,
+                unit_price=product.price,
+                status='completed',
+                transaction_id=self.new_transaction_id(),
+                payment_method_details={'method': 'paid_with_internal_balance'},
+            )
+
+            if product.stock_quantity is not None:
+                stock = Product.objects.filter(pk=product.pk)
+                if reservation is None:
+                    # Only units outside everyone's live holds; the claimed hold above is gone already.
+                    list(stock.select_for_update().values_list('pk'))
+                    stock = stock.with_held_quantity().filter(stock_quantity__gte=F('held_quantity') + quantity)
+                else:
+                    stock = stock.filter(stock_quantity__gte=quantity)
+                if not stock.update(stock_quantity=F('stock_quantity') - quantity):
+                    # Raising rolls back the balance debit, fulfilment and order above.
+                    raise CheckoutError("Not enough stock left for this product.", 'out_of_stock')
+
+        return order
+
+    def fulfilment(self, product, quantity):
+        """
+        What buying `quantity` of the product grants, read from its meta_data: a credit amount,
+        a question count or a course ID (None for item types that grant nothing extra).
+        Raises CheckoutError('misconfigured') if the meta_data doesn't hold a valid value.
+        """
+        meta_data = product.meta_data or {}
+        try:
+            if product.item_type == 'internal_credit_purchase':
+                credit = Decimal(str(meta_data['credit_amount']))
+                if not credit.is_finite() or credit <= 0:
+                    raise ValueError
+                return credit * quantity
+            if product.item_type == 'question_allowance':
+                count = int(meta_data['count'])
+                if count <= 0:
+                    raise ValueError
+                return count * quantity
+            if product.item_type == 'course_material_access':
+                course_id = int(meta_data['course_id'])
+                if not Course.objects.filter(pk=course_id).exists():
+                    raise ValueError
+                return course_id
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise CheckoutError("This product is misconfigured and can't be bought right now.", 'misconfigured')
+        return None
+
+    def fulfil(self, user, product, grant):
+        """Grants whatever the product's item_type entitles the buyer to; `grant` comes from fulfilment()."""
+        if product.item_type == 'internal_credit_purchase':
+            User.objects.filter(pk=user.pk).update(balance=F('balance') + grant)
+
+        elif product.item_type == 'question_allowance':
+            User.objects.filter(pk=user.pk).update(question_allowance=F('question_allowance') + grant)
+
+        elif product.item_type == 'course_material_access':
+            # Paid access is granted even to a full course; the seat count is kept accurate.
+            _, created = Enrollment.objects.get_or_create(student=user, course_id=grant)
+            if created:
+                sync_seat_counts([grant])
+                update_course_subscriptions(user.pk, subscribe=[grant])
+
+        # digital_good, service_booking and event_ticket need nothing beyond the order record itself.
+
+    @staticmethod
+    def new_transaction_id():
+        return f"ord_{uuid.uuid4().hex}"
@@ -0,0 +1,202 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Tip, PurchaseOrder
+
+# Rows are pulled from the database in chunks of this size. Only one chunk of
+# tuples (and its formatted text) is held in memory at a time, however large the export is.
+DEFAULT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# Each export is described by its model, the indexed date column used for
+# range filtering and ordering, and the columns pulled with values_list().
+# Joined columns (e.g. tipper__email) are resolved in the same query.
+EXPORT_SPECS = {
+    'tips': {
+        'model': Tip,
+        'date_field': 'timestamp',
+        'columns': (
+            'id', 'tipper_id', 'tipper__email', 'tippee_id', 'tippee__email',
+            'amount', 'message', 'timestamp',
+        ),
+    },
+    'orders': {
+        'model': PurchaseOrder,
+        'date_field': 'created_at',
+        'columns': (
+            'id', 'user_id', 'user__email', 'product_id', 'product__name',
+            'quantity', 'unit_price', 'total_amount', 'status',
+            'transaction_id', 'created_at', 'updated_at',
+        ),
+    },
+}
+
+
+class ExportError(ValueError):
+    """Raised for an unknown export kind, format, or an unparseable date bound."""
+
+
+def parse_bound(value, is_end=False):
+    """
+    Parses an ISO date or datetime string into an aware datetime.
+    A plain date used as an end bound covers the whole day, so the returned
+    value is midnight of the following day (end bounds are exclusive).
+    """
+    if not value:
+        return None
+    # A plain date is tried first: parse_datetime() also accepts one (as midnight), which
+    # would make a date end bound exclude the very day it names.
+    try:
+        day = parse_date(value)
+        parsed = None if day is not None else parse_datetime(value)
+    except ValueError: # Well-formed but impossible, e.g. 2025-02-30
+        day = parsed = None
+    if day is not None:
+        if is_end:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    elif parsed is None:
+        raise ExportError(f"Invalid date or datetime: '{value}'. Use ISO 8601, e.g. 2025-01-31.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+def export_queryset(kind, start=None, end=None):
+    """
+    The export's rows as a values_list() queryset ordered by its date column, then ID.
+    `start` is inclusive and `end` exclusive; both filter on the indexed date column.
+    """
+    spec = EXPORT_SPECS.get(kind)
+    if spec is None:
+        raise ExportError(f"Unknown export '{kind}'. Must be one of {list(EXPORT_SPECS)}.")
+
+    date_field = spec['date_field']
+    queryset = spec['model'].objects.all()
+    if start is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+    # values_list() skips model instantiation.
+    return queryset.order_by(date_field, 'pk').values_list(*spec['columns'])
+
+
+def fetch_chunk(kind, queryset, after=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    The next `chunk_size` rows of `queryset` after the row `after` (None for the first
+    chunk), as a list. Keyset pagination: each chunk is its own short query that seeks
+    into the date column's index, so no cursor or transaction stays open between chunks.
+    """
+    if after is not None:
+        date_field = EXPORT_SPECS[kind]['date_field']
+        last_date, last_id = _row_key(kind, after)
+        queryset = queryset.filter(**{f'{date_field}__gte': last_date}).exclude(
+            **{date_field: last_date, 'pk__lte': last_id}
+        )
+    return list(queryset[:chunk_size])
+
+
+def _row_key(kind, row):
+    spec = EXPORT_SPECS[kind]
+    return row[spec['columns'].index(spec['date_field'])], row[spec['columns'].index('id')]
+
+
+def export_chunks(kind, start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the export's rows a list of at most `chunk_size` at a time."""
+    queryset = export_queryset(kind, start=start, end=end)
+
+    def chunks():
+        rows = fetch_chunk(kind, queryset, chunk_size=chunk_size)
+        while rows:
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            rows = fetch_chunk(kind, queryset, after=rows[-1], chunk_size=chunk_size)
+    return chunks()
+
+
+def aexport_chunks(kind, start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """export_chunks() as an async generator: each chunk is fetched in a worker thread."""
+    queryset = export_queryset(kind, start=start, end=end)
+    fetch = sync_to_async(fetch_chunk)
+
+    async def chunks():
+        rows = await fetch(kind, queryset, chunk_size=chunk_size)
+        while rows:
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            rows = await fetch(kind, queryset, after=rows[-1], chunk_size=chunk_size)
+    return chunks()
+
+
+class Echo:
+    """A file-like object whose write() returns the value, so csv.writer can feed a generator."""
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def format_csv(columns, rows):
+    writer = csv.writer(Echo())
+    return ''.join(writer.writerow([_csv_value(value) for value in row]) for row in rows)
+
+
+def format_ndjson(columns, rows):
+    encoder = DjangoJSONEncoder()
+    return ''.join(encoder.encode(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def _formatter(kind, export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown format '{export_format}'. Must be one of {list(EXPORT_FORMATS)}.")
+    if kind not in EXPORT_SPECS:
+        raise ExportError(f"Unknown export '{kind}'. Must be one of {list(EXPORT_SPECS)}.")
+    columns = EXPORT_SPECS[kind]['columns']
+    if export_format == 'ndjson':
+        return '', lambda rows: format_ndjson(columns, rows)
+    return format_csv(columns, [columns]), lambda rows: format_csv(columns, rows)
+
+
+def iter_export(kind, export_format='csv', start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Returns a generator of text chunks (a header, then one string per chunk of rows) for the
+    export. Suitable for writing to a file; see aiter_export() for responses.
+    """
+    header, format_rows = _formatter(kind, export_format)
+    chunks = export_chunks(kind, start=start, end=end, chunk_size=chunk_size)
+
+    def text():
+        if header:
+            yield header
+        for rows in chunks:
+            yield format_rows(rows)
+    return text()
+
+
+def aiter_export(kind, export_format='csv', start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    iter_export() as an async generator, for StreamingHttpResponse under ASGI: Django
+    would consume a sync generator in one sync_to_async(list) call, buffering the whole
+    export in memory, while this one is sent to the client a chunk at a time.
+    """
+    header, format_rows = _formatter(kind, export_format)
+    chunks = aexport_chunks(kind, start=start, end=end, chunk_size=chunk_size)
+
+    async def text():
+        if header:
+            yield header
+        async for rows in chunks:
+            yield format_rows(rows)
+    return text()
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.exports import (
+    DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, EXPORT_SPECS, ExportError, iter_export, parse_bound
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a full export of tips or purchase orders as CSV or NDJSON. "
+        "Rows are read in chunks, so multi-million row exports run in bounded memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORT_SPECS), help="What to export: 'tips' or 'orders'.")
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--start', help="Inclusive lower bound (ISO date or datetime).")
+        parser.add_argument('--end', help="Upper bound (ISO date or datetime). A date includes that whole day.")
+        parser.add_argument('--output', '-o', help="File to write to. Defaults to stdout.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_bound(options['start'])
+            end = parse_bound(options['end'], is_end=True)
+            chunks = iter_export(
+                options['kind'], options['export_format'],
+                start=start, end=end, chunk_size=options['chunk_size']
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            # newline='' so the csv module's \r\n line endings are written untouched.
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['kind']} to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_purchaseorder'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchaseorder',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created at'),
+        ),
+        migrations.AlterField(
+            model_name='tip',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='timestamp'),
+        ),
+    ]
@@ -23,7 +23,7 @@ class Tip(models.Model):
         decimal_places=2,
         help_text=_("Amount of the tip.")
     )
-    timestamp = models.DateTimeField(_("timestamp"), auto_now_add=True)
+    timestamp = models.DateTimeField(_("timestamp"), auto_now_add=True, db_index=True) # Indexed for date-range exports
     message = models.TextField(
         _("message"),
         blank=True,
@@ -114,7 +114,7 @@ class PurchaseOrder(models.Model):
         null=True,
         help_text=_("Details about the payment method used, e.g., 'paid_with_internal_balance', simulated Stripe charge ID.")
     )
-    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True, db_index=True) # Indexed for date-range exports
     updated_at = models.DateTimeField(_("updated at"), auto_now=True)
 
     def __str__(self):
@@ -1,8 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from .models import Tip # Assuming Tip model is in the same app
-from accounts.serializers import UserSerializer # For TipDetailSerializer
+from .models import Tip, PurchaseOrder # Assuming Tip model is in the same app
+from accounts.serializers import UserSummarySerializer # For TipDetailSerializer
 
 User = get_user_model()
 
@@ -54,10 +54,50 @@ class TipDetailSerializer(serializers.ModelSerializer):
     """
     Serializer for displaying Tip details, including nested tipper and tippee info.
     """
-    tipper = UserSerializer(read_only=True)
-    tippee = UserSerializer(read_only=True)
+    tipper = UserSummarySerializer(read_only=True)
+    tippee = UserSummarySerializer(read_only=True)
 
     class Meta:
         model = Tip
         fields = ('id', 'tipper', 'tippee', 'amount', 'timestamp', 'message')
         read_only_fields = fields # All fields are read-only for detail display via this serializer
+
+
+class CheckoutSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(
+        required=False,
+        help_text="The ID of the product to buy. Not needed when checking out a reservation."
+    )
+    reservation_id = serializers.IntegerField(
+        required=False,
+        help_text="ID of a stock reservation to check out. Its product and quantity are used."
+    )
+    quantity = serializers.IntegerField(
+        min_value=1,
+        max_value=100,
+        default=1,
+        help_text="How many units to buy."
+    )
+    # Product existence, stock and balance are checked inside the checkout transaction,
+    # not here, since any check made outside it could be stale by the time the order is placed.
+
+    def validate(self, attrs):
+        if attrs.get('product_id') is None and attrs.get('reservation_id') is None:
+            raise serializers.ValidationError("Provide either a product_id or a reservation_id.")
+        return attrs
+
+
+class PurchaseOrderSerializer(serializers.ModelSerializer):
+    """
+    Serializer for displaying a purchase order to its buyer.
+    """
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    item_type = serializers.CharField(source='product.item_type', read_only=True)
+
+    class Meta:
+        model = PurchaseOrder
+        fields = (
+            'id', 'product', 'product_name', 'item_type', 'quantity', 'unit_price',
+            'total_amount', 'status', 'transaction_id', 'created_at'
+        )
+        read_only_fields = fields
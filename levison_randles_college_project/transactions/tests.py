@@ -1,3 +1,203 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import warnings
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from django.core.management import CommandError, call_command
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from courses.models import Course, Enrollment
+from store.models import Product
+from .checkout_service import CheckoutError, CheckoutService
+from .exports import ExportError, aiter_export, iter_export, parse_bound
+from .models import PurchaseOrder, Tip
+
+
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create(email='buyer@example.com', role='student', balance=Decimal('20.00'))
+        cls.teacher = User.objects.create(email='teacher@example.com', role='teacher')
+        cls.course = Course.objects.create(title='Algebra', description='...', teacher=cls.teacher)
+
+    def product(self, item_type, meta_data=None, **kwargs):
+        return Product.objects.create(
+            name=item_type, description='...', price=Decimal('5.00'), item_type=item_type, meta_data=meta_data, **kwargs
+        )
+
+    def buyer_row(self):
+        return User.objects.get(pk=self.buyer.pk)
+
+    def assertCheckoutError(self, code, product, quantity=1):
+        with self.assertRaises(CheckoutError) as raised:
+            CheckoutService().checkout(self.buyer, product_id=product.pk, quantity=quantity)
+        self.assertEqual(raised.exception.code, code)
+
+    def test_credit_purchase_debits_the_price_and_adds_the_credit(self):
+        credit = self.product('internal_credit_purchase', {'credit_amount': '6.50'})
+        CheckoutService().checkout(self.buyer, product_id=credit.pk, quantity=2)
+        self.assertEqual(self.buyer_row().balance, Decimal('23.00'))
+
+    def test_question_allowance_and_course_access_are_granted(self):
+        questions = self.product('question_allowance', {'count': 3})
+        access = self.product('course_material_access', {'course_id': self.course.pk})
+        CheckoutService().checkout(self.buyer, product_id=questions.pk, quantity=2)
+        CheckoutService().checkout(self.buyer, product_id=access.pk)
+        self.assertEqual(self.buyer_row().question_allowance, 6)
+        self.assertTrue(Enrollment.objects.filter(student=self.buyer, course=self.course).exists())
+        self.assertEqual(Course.objects.get(pk=self.course.pk).seats_taken, 1)
+
+    def test_misconfigured_products_are_refused_before_the_debit(self):
+        products = [
+            self.product('internal_credit_purchase', {}),
+            self.product('internal_credit_purchase', {'credit_amount': '-1'}),
+            self.product('question_allowance', {'count': 'three'}),
+            self.product('course_material_access', {'course_id': self.course.pk + 1000}),
+        ]
+        for product in products:
+            with self.assertNumQueries(1 if product.item_type != 'course_material_access' else 2):
+                self.assertCheckoutError('misconfigured', product)
+        self.assertEqual(self.buyer_row().balance, Decimal('20.00'))
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+    def test_misconfigured_product_is_a_bad_request(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        product = self.product('question_allowance', {})
+        response = client.post('/api/transactions/checkout/', {'product_id': product.pk, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], 'misconfigured')
+
+    def test_insufficient_balance_changes_nothing(self):
+        ticket = self.product('event_ticket', stock_quantity=10)
+        self.assertCheckoutError('insufficient_balance', ticket, quantity=5)
+        self.assertEqual(Product.objects.get(pk=ticket.pk).stock_quantity, 10)
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+    def test_running_out_of_stock_rolls_back_the_debit_and_fulfilment(self):
+        questions = self.product('question_allowance', {'count': 3}, stock_quantity=2)
+        # Another buyer takes the stock after the pre-check but before the conditional UPDATE.
+        service = CheckoutService()
+        fulfil = service.fulfil
+
+        def fulfil_then_sell_out(*args):
+            fulfil(*args)
+            Product.objects.filter(pk=questions.pk).update(stock_quantity=0)
+
+        service.fulfil = fulfil_then_sell_out
+        with self.assertRaises(CheckoutError) as raised:
+            service.checkout(self.buyer, product_id=questions.pk, quantity=2)
+        self.assertEqual(raised.exception.code, 'out_of_stock')
+        buyer = self.buyer_row()
+        self.assertEqual((buyer.balance, buyer.question_allowance), (Decimal('20.00'), 0))
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+    def test_stock_is_decremented_with_the_order(self):
+        ticket = self.product('event_ticket', stock_quantity=3)
+        order = CheckoutService().checkout(self.buyer, product_id=ticket.pk, quantity=2)
+        self.assertEqual((order.status, order.quantity), ('completed', 2))
+        self.assertEqual(Product.objects.get(pk=ticket.pk).stock_quantity, 1)
+        self.assertEqual(self.buyer_row().balance, Decimal('10.00'))
+
+
+class TransactionExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(email='alice@example.com', role='student')
+        cls.bob = User.objects.create(email='bob@example.com', role='teacher')
+        cls.staff = User.objects.create(email='staff@example.com', role='teacher', is_staff=True)
+        for day, amount in ((3, '3.00'), (1, '1.00'), (2, '2.00')):
+            tip = Tip.objects.create(tipper=cls.alice, tippee=cls.bob, amount=Decimal(amount), message=f'Day {day}')
+            # timestamp is auto_now_add; backdate it for the range filters.
+            Tip.objects.filter(pk=tip.pk).update(timestamp=datetime(2025, 1, day, 12, tzinfo=dt_timezone.utc))
+
+    def export(self, *args, **kwargs):
+        return ''.join(iter_export('tips', *args, chunk_size=2, **kwargs))
+
+    def test_date_end_bound_covers_the_whole_day(self):
+        self.assertEqual(parse_bound('2025-01-02', is_end=True), datetime(2025, 1, 3, tzinfo=dt_timezone.utc))
+        self.assertEqual(parse_bound('2025-01-02T06:00:00Z', is_end=True), datetime(2025, 1, 2, 6, tzinfo=dt_timezone.utc))
+        self.assertIsNone(parse_bound(''))
+        for value in ('yesterday', '2025-02-30'):
+            with self.assertRaises(ExportError):
+                parse_bound(value)
+
+    def test_csv_rows_come_in_date_order_across_chunks(self):
+        lines = self.export().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'tipper_id', 'tipper__email'])
+        self.assertEqual([line.split(',')[6] for line in lines[1:]], ['Day 1', 'Day 2', 'Day 3'])
+
+    def test_ndjson_export_is_filtered_by_date(self):
+        records = [json.loads(line) for line in self.export(
+            'ndjson', start=parse_bound('2025-01-02'), end=parse_bound('2025-01-02', is_end=True)
+        ).splitlines()]
+        self.assertEqual([(record['message'], record['amount']) for record in records], [('Day 2', '2.00')])
+        self.assertEqual(records[0]['tippee__email'], 'bob@example.com')
+
+    def test_unknown_kind_or_format_is_an_error(self):
+        with self.assertRaises(ExportError):
+            iter_export('refunds')
+        with self.assertRaises(ExportError):
+            iter_export('tips', 'xml')
+
+    def test_export_endpoint_is_for_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        self.assertEqual(client.get('/api/transactions/tips/export/').status_code, 403)
+
+        client.force_authenticate(self.staff)
+        self.assertEqual(client.get('/api/transactions/orders/export/', {'end': 'soon'}).status_code, 400)
+
+    async def test_async_export_pages_through_equal_timestamps(self):
+        await Tip.objects.all().aupdate(timestamp=datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        chunks = [chunk async for chunk in aiter_export('tips', 'ndjson', chunk_size=2)]
+        self.assertEqual(len(chunks), 2)
+        ids = [json.loads(line)['id'] for line in ''.join(chunks).splitlines()]
+        self.assertEqual(ids, sorted(await database_sync_to_async(list)(Tip.objects.values_list('pk', flat=True))))
+
+    def test_command_writes_to_stdout_or_a_file(self):
+        stdout = io.StringIO()
+        call_command('export_transactions', 'tips', '--format', 'ndjson', '--end', '2025-01-01', stdout=stdout)
+        self.assertEqual([json.loads(line)['message'] for line in stdout.getvalue().splitlines()], ['Day 1'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'tips.csv'
+            call_command('export_transactions', 'tips', '--output', str(output), stderr=io.StringIO())
+            self.assertEqual(len(output.read_text().splitlines()), 4)
+
+        with self.assertRaises(CommandError):
+            call_command('export_transactions', 'tips', '--start', 'soon')
+
+
+class TransactionExportAsgiTests(TransactionTestCase):
+    # Under ASGI the view runs in a worker thread with its own connection, so the data has
+    # to be committed.
+
+    async def test_export_endpoint_streams_asynchronously_under_asgi(self):
+        staff = await User.objects.acreate(email='staff@example.com', role='teacher', is_staff=True)
+        tippee = await User.objects.acreate(email='bob@example.com', role='teacher')
+        for day in (1, 2, 3):
+            tip = await Tip.objects.acreate(tipper=staff, tippee=tippee, amount=Decimal('1.00'), message=f'Day {day}')
+            await Tip.objects.filter(pk=tip.pk).aupdate(timestamp=datetime(2025, 1, day, 12, tzinfo=dt_timezone.utc))
+        token = await Token.objects.acreate(user=staff)
+        client = AsyncClient()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            response = await client.get(
+                '/api/transactions/tips/export/', {'start': '2025-01-02'}, headers={'Authorization': f'Token {token.key}'}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/csv')
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual([line.split(',')[6] for line in body.splitlines()[1:]], ['Day 2', 'Day 3'])
+        self.assertFalse([w for w in caught if 'synchronous iterators' in str(w.message)])
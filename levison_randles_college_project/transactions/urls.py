@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import GiveTipView, SentTipsListView, ReceivedTipsListView
+from .views import GiveTipView, SentTipsListView, ReceivedTipsListView, TransactionExportView, CheckoutView
 
 urlpatterns = [
     path('tips/give/', GiveTipView.as_view(), name='give_tip'),
     path('tips/sent/', SentTipsListView.as_view(), name='list_sent_tips'),
     path('tips/received/', ReceivedTipsListView.as_view(), name='list_received_tips'),
+    path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('tips/export/', TransactionExportView.as_view(export_kind='tips'), name='export_tips'),
+    path('orders/export/', TransactionExportView.as_view(export_kind='orders'), name='export_orders'),
 ]
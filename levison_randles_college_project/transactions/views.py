@@ -1,10 +1,14 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.db import transaction, IntegrityError
 from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404 # Not strictly needed here due to serializer validation
-from .serializers import TipCreateSerializer, TipDetailSerializer
+from .serializers import TipCreateSerializer, TipDetailSerializer, CheckoutSerializer, PurchaseOrderSerializer
 from .models import Tip
+from .checkout_service import CheckoutService, CheckoutError
+from .exports import ExportError, aiter_export, parse_bound
 from decimal import Decimal
 
 User = get_user_model()
@@ -109,3 +113,67 @@ class ReceivedTipsListView(generics.ListAPIView):
     def get_queryset(self):
         # Prefetch related tipper and tippee.
         return Tip.objects.filter(tippee=self.request.user).select_related('tipper', 'tippee').order_by('-timestamp')
+
+
+class CheckoutView(generics.CreateAPIView):
+    """
+    API endpoint for buying a store product with the user's internal balance.
+    Debits the balance, decrements stock (if limited), fulfils the item and records a PurchaseOrder.
+    """
+    serializer_class = CheckoutSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    ERROR_STATUSES = {
+        'unavailable': status.HTTP_404_NOT_FOUND,
+        'out_of_stock': status.HTTP_409_CONFLICT,
+        'insufficient_balance': status.HTTP_400_BAD_REQUEST,
+        'reservation_expired': status.HTTP_409_CONFLICT,
+        'misconfigured': status.HTTP_400_BAD_REQUEST,
+    }
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            order = CheckoutService().checkout(
+                request.user,
+                product_id=serializer.validated_data.get('product_id'),
+                quantity=serializer.validated_data['quantity'],
+                reservation_id=serializer.validated_data.get('reservation_id'),
+            )
+        except CheckoutError as e:
+            return Response({"detail": e.detail, "code": e.code}, status=self.ERROR_STATUSES[e.code])
+
+        return Response(PurchaseOrderSerializer(order, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
+class TransactionExportView(APIView):
+    """
+    Streams a full export of tips or purchase orders as CSV or NDJSON.
+    Staff only. Query params:
+    - export_format: 'csv' (default) or 'ndjson'. (Not 'format', which DRF reserves for renderer selection.)
+    - start / end: ISO date or datetime bounds (start inclusive, end inclusive for dates)
+    Rows are read from the database in chunks and sent as an async iterator, so under ASGI
+    memory stays bounded regardless of export size.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    export_kind = None # Set per URL: 'tips' or 'orders'
+
+    CONTENT_TYPES = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'csv')
+        try:
+            start = parse_bound(request.query_params.get('start'))
+            end = parse_bound(request.query_params.get('end'), is_end=True)
+            chunks = aiter_export(self.export_kind, export_format, start=start, end=end)
+        except ExportError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(chunks, content_type=self.CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{self.export_kind}.{export_format}"'
+        return response